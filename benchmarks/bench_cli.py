@@ -0,0 +1,90 @@
+# Cold start of the command-line tool: the wall time of a fresh `python -m pygmentation ...` process for each
+# subcommand, including interpreter start-up and imports. The catalog index and feature table are built beforehand,
+# so find, similar, dedupe and list --where load them from the cache as they would after the first use. Commands that
+# read files or stdin are given small fixed inputs, written to a temporary directory before the first run.
+#
+#   python benchmarks/bench_cli.py
+
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from pygmentation.catalog import load_catalog, load_features
+
+from common import measure
+
+_directory = tempfile.TemporaryDirectory(prefix="pygmentation-bench-")
+OUTPUT = Path(_directory.name)
+
+COMMANDS = {
+    "help": ["--help"],
+    "show": ["show", "nord"],
+    "save": ["save", "-f", str(OUTPUT / "nord.svg"), "nord"],
+    "write": ["write", "-f", str(OUTPUT / "nord.css"), "nord"],
+    "list": ["list", "--names-only"],
+    "list_where": ["list", "--names-only", "-w", "contrast>=7", "--sort", "hue-coverage"],
+    "mplstyle": ["mplstyle", "-d", str(OUTPUT), "nord"],
+    "find": ["find", "#5E81AC"],
+    "similar": ["similar", "nord"],
+    "dedupe": ["dedupe"],
+    "recolor": ["recolor", str(OUTPUT / "image.png"), str(OUTPUT / "recolored.png"), "nord"],
+    "rewrite": ["rewrite", "nord", "light", str(OUTPUT / "style.css"), "-o", str(OUTPUT / "rewritten")],
+    "dump": ["dump", "gruvbox*"],
+    "convert": ["convert", "--from", "hex", "--to", "Lab"],
+    "snap": ["snap", "nord", "dark"],
+}
+
+# the file given on stdin, for commands that read colours from it
+INPUTS = {
+    "convert": OUTPUT / "colours.txt",
+    "snap": OUTPUT / "colours.txt",
+}
+
+
+def write_inputs():
+    # a 128x128 image of random colours, for recolor
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)).save(OUTPUT / "image.png")
+    # a stylesheet of 2000 rules, each with two of 500 colours, for rewrite
+    colors = [f"#{c:06x}" for c in rng.integers(0, 1 << 24, 500)]
+    rules = [
+        f".rule-{i} {{ color: {colors[i % 500]}; border: 1px solid {colors[(i * 7) % 500]}; }}\n" for i in range(2000)
+    ]
+    (OUTPUT / "style.css").write_text("".join(rules))
+    # 10000 hex codes, one per line, for convert and snap
+    (OUTPUT / "colours.txt").write_text("".join(f"#{c:06x}\n" for c in rng.integers(0, 1 << 24, 10000)))
+
+
+def run_command(args: list, stdin: Path = None):
+    subprocess.run(
+        [sys.executable, "-m", "pygmentation", *args],
+        input=stdin.read_bytes() if stdin is not None else None,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+
+
+def benchmarks() -> dict:
+    load_catalog()
+    load_features()
+    write_inputs()
+    return {
+        f"cli.{name}": {
+            "fn": lambda args=args, stdin=INPUTS.get(name): run_command(args, stdin),
+            "repeat": 3,
+            "number": 1,
+        }
+        for name, args in COMMANDS.items()
+    }
+
+
+if __name__ == "__main__":
+    for name, case in benchmarks().items():
+        result = measure(case.pop("fn"), **case)
+        print(f"{name:<32}{result['seconds'] * 1000:>10.3f}ms")
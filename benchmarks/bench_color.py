@@ -0,0 +1,41 @@
+# Colour maths: conversions between the colour models, Color.distance_to (CIEDE2000) and ColorFamily construction,
+# over a fixed spread of colours from the catalog. Times are per call of the whole batch.
+#
+#   python benchmarks/bench_color.py
+
+from pygmentation.color_scheme import RGB, Color, ColorFamily, SchemeType
+
+from common import catalog_hexes, measure
+
+MODELS = ["hsl", "hsv", "xyz", "lab"]
+
+
+def benchmarks() -> dict:
+    hexes = catalog_hexes(256)
+    rgbs = [RGB.from_hex(h) for h in hexes]
+    models = {m: [rgb.convert_to(m) for rgb in rgbs] for m in MODELS}
+    # colours with their Lab values already cached, so that distance_to measures only the colour difference
+    colors = [Color(h) for h in hexes]
+    for c in colors:
+        c.lab
+    pairs = list(zip(colors, colors[1:] + colors[:1]))
+    # foreground and background of twilight (light), as used for every family of that scheme
+    foreground, background = Color("24213E"), Color("E9EAEF")
+    family_hexes = hexes[::4]
+
+    cases = {"color.rgb_from_hex": lambda: [RGB.from_hex(h) for h in hexes]}
+    for m in MODELS:
+        cases[f"color.rgb_to_{m}"] = lambda m=m: [rgb.convert_to(m) for rgb in rgbs]
+        cases[f"color.{m}_to_rgb"] = lambda m=m: [c.convert_to("rgb") for c in models[m]]
+    cases["color.rgb_to_hex"] = lambda: [rgb.convert_to("hex") for rgb in rgbs]
+    cases["color.distance_to"] = lambda: [a.distance_to(b) for a, b in pairs]
+    for scheme_type in (SchemeType.LIGHT, SchemeType.DARK):
+        cases[f"family.construct_{scheme_type.name.lower()}"] = lambda scheme_type=scheme_type: [
+            ColorFamily(h, foreground, background, scheme_type) for h in family_hexes
+        ]
+    return cases
+
+
+if __name__ == "__main__":
+    for name, fn in benchmarks().items():
+        print(f"{name:<32}{measure(fn)['seconds'] * 1000:>10.3f}ms")
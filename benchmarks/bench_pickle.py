@@ -0,0 +1,107 @@
+# Payload size and round-trip time for pickling every resolved scheme in the catalog (light and dark).
+# Compares the compact pickling of ColorScheme with the default pickling of the same objects (every Color with its
+# cached colour models), which is what was sent to worker processes before.
+#
+#   python benchmarks/bench_pickle.py [--repeat N]
+
+import argparse
+import copyreg
+import io
+import pickle
+import time
+
+from pygmentation.color_scheme import Color, ColorFamily, ColorScheme
+from pygmentation.pygmentation import all_schemes, resolve_scheme
+
+
+class DefaultPickler(pickle.Pickler):
+    # pickles Color, ColorFamily and ColorScheme as plain objects, ignoring their __reduce__
+    def reducer_override(self, obj):
+        if type(obj) in (Color, ColorFamily, ColorScheme):
+            state = {k: v for k, v in vars(obj).items() if k != "_lock"}
+            return (copyreg.__newobj__, (type(obj),), state)
+        return NotImplemented
+
+
+def default_dumps(obj) -> bytes:
+    buffer = io.BytesIO()
+    DefaultPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+
+def compact_dumps(obj) -> bytes:
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+def resolve_all(frozen: bool = False):
+    schemes = [resolve_scheme(name, t) for name in all_schemes for t in ("light", "dark")]
+    for scheme in schemes:
+        # fill the lazy fields (and colour model caches) as a scheme would have after being used
+        scheme.distinct
+        scheme.red
+        for family in scheme.colors:
+            family.base.lab
+        if frozen:
+            scheme.freeze()
+    return schemes
+
+
+def measure(schemes, dumps, repeat: int) -> dict:
+    # best of `repeat` runs, pickling each scheme separately (as when submitting one task per scheme)
+    best_dumps = best_loads = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payloads = [dumps(s) for s in schemes]
+        best_dumps = min(best_dumps, time.perf_counter() - start)
+        start = time.perf_counter()
+        for p in payloads:
+            pickle.loads(p)
+        best_loads = min(best_loads, time.perf_counter() - start)
+    return {
+        "bytes": sum(len(p) for p in payloads),
+        "dumps_s": best_dumps,
+        "loads_s": best_loads,
+    }
+
+
+def run(repeat: int = 3) -> dict:
+    schemes = resolve_all()
+    results = {
+        "schemes": len(schemes),
+        "default": measure(schemes, default_dumps, repeat),
+        "compact": measure(schemes, compact_dumps, repeat),
+        "compact_frozen": measure(resolve_all(frozen=True), compact_dumps, repeat),
+    }
+    return results
+
+
+def benchmarks() -> dict:
+    # the compact round trip, as cases for run.py (the default pickling is only reported by this script)
+    cases = {}
+    for name, frozen in (("pickle.compact", False), ("pickle.compact_frozen", True)):
+        schemes = resolve_all(frozen)
+        payloads = [compact_dumps(s) for s in schemes]
+        cases[f"{name}.dumps"] = {"fn": lambda schemes=schemes: [compact_dumps(s) for s in schemes], "repeat": 3}
+        cases[f"{name}.loads"] = {"fn": lambda payloads=payloads: [pickle.loads(p) for p in payloads], "repeat": 3}
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pickling every resolved scheme in the catalog")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs; the best is reported (default: 3)")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print(f"{results['schemes']} schemes")
+    print(f"{'':<16}{'payload':>12}{'dumps':>10}{'loads':>10}{'round trip':>12}")
+    for name in ("default", "compact", "compact_frozen"):
+        r = results[name]
+        print(
+            f"{name:<16}{r['bytes'] / 1024:>10.0f}kB"
+            f"{r['dumps_s'] * 1000:>8.0f}ms{r['loads_s'] * 1000:>8.0f}ms"
+            f"{(r['dumps_s'] + r['loads_s']) * 1000:>10.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
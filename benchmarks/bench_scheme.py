@@ -0,0 +1,72 @@
+# Scheme resolution, the exporters and init(): resolving every scheme in the catalog (light and dark), each to_*
+# exporter of ColorScheme (and to_mplstyle) over a fixed set of schemes, and building and applying rcParams.
+#
+#   python benchmarks/bench_scheme.py
+
+from pygmentation.color_scheme import ColorScheme
+from pygmentation.pygmentation import (
+    DocType,
+    _build_rcparams,
+    _mplstyle,
+    all_schemes,
+    clear_style_cache,
+    init,
+    resolve_scheme,
+)
+
+from common import EXPORT_SCHEMES, SCHEME_TYPES, measure
+
+EXPORTERS = sorted(name for name in vars(ColorScheme) if name.startswith("to_"))
+
+
+def _has_matplotlib() -> bool:
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_all() -> list:
+    return [resolve_scheme(name, t) for name in all_schemes for t in SCHEME_TYPES]
+
+
+def _init_all():
+    for name in EXPORT_SCHEMES:
+        for t in SCHEME_TYPES:
+            init(name, t)
+
+
+def _init_cold():
+    clear_style_cache()
+    _init_all()
+
+
+def benchmarks() -> dict:
+    # the lazy parts of each scheme (distinct colours, aliases) are filled here, so the exporters are timed on their own
+    schemes = [resolve_scheme(name, t) for name in EXPORT_SCHEMES for t in SCHEME_TYPES]
+    for scheme in schemes:
+        scheme.distinct
+        scheme.red
+
+    cases = {"scheme.resolve_all": {"fn": resolve_all, "repeat": 3, "number": 1}}
+    cases["scheme.resolve_sample"] = lambda: [resolve_scheme(name, t) for name in EXPORT_SCHEMES for t in SCHEME_TYPES]
+    matplotlib = _has_matplotlib()
+    for exporter in EXPORTERS:
+        if exporter == "to_colormap" and not matplotlib:
+            continue
+        cases[f"export.{exporter}"] = lambda exporter=exporter: [getattr(s, exporter)() for s in schemes]
+    if matplotlib:
+        cases["export.to_mplstyle"] = lambda: [_mplstyle(_build_rcparams(s, DocType.REPORT), "") for s in schemes]
+        cases["init.build_rcparams"] = lambda: [_build_rcparams(s, d) for s in schemes for d in DocType]
+        # init() with an empty style cache resolves, builds and validates; afterwards it only applies the cached style
+        cases["init.cold"] = _init_cold
+        cases["init.cached"] = _init_all
+    return cases
+
+
+if __name__ == "__main__":
+    for name, case in benchmarks().items():
+        case = case if isinstance(case, dict) else {"fn": case}
+        result = measure(case.pop("fn"), **case)
+        print(f"{name:<32}{result['seconds'] * 1000:>10.3f}ms")
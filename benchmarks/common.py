@@ -0,0 +1,83 @@
+# Fixed inputs and timing shared by the benchmark modules. Inputs are drawn from color_schemes.json in a fixed order,
+# so that results are comparable between runs (and against baseline.json) as long as the catalog doesn't change.
+
+import gc
+import re
+import statistics
+import time
+
+from pygmentation.pygmentation import all_schemes
+
+# a spread of scheme layouts: plain accents (twilight, dracula), separate light and dark definitions (nord, gruvbox)
+# and explicit surfaces (catppuccin)
+EXPORT_SCHEMES = ["twilight", "nord", "dracula", "gruvbox", "catppuccin"]
+SCHEME_TYPES = ["light", "dark"]
+
+
+def _hexes(value, out):
+    if isinstance(value, str):
+        if re.fullmatch(r"#?[0-9a-fA-F]{6}", value):
+            out.add(value.lstrip("#").upper())
+    elif isinstance(value, dict):
+        for v in value.values():
+            _hexes(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _hexes(v, out)
+
+
+def catalog_hexes(n: int = 256) -> list:
+    # n colours spread evenly over the sorted, distinct colours of the catalog
+    hexes = set()
+    _hexes(all_schemes, hexes)
+    hexes = sorted(hexes)
+    step = max(len(hexes) // n, 1)
+    return hexes[::step][:n]
+
+
+def _reference_workload():
+    total = 0
+    for i in range(20000):
+        total += i * i % 7
+    return total
+
+
+def _time(fn, number: int) -> float:
+    # with garbage collection off, as in timeit, so that collections triggered by earlier cases don't land in this one
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return (time.perf_counter() - start) / number
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(fn, repeat: int = 7, min_time: float = 0.1, number: int = None) -> dict:
+    # best time per call over `repeat` runs. Each run calls fn `number` times; if not given, `number` is chosen (as in
+    # timeit.Timer.autorange) so that a run takes at least `min_time` seconds.
+    # Each run is preceded by a run of a fixed pure-Python workload, and "relative" is the best time divided by the best
+    # time of the workload. This is much less affected than the time itself by the machine running faster or slower
+    # overall (frequency scaling, other load), so it is what runs are compared by. Taking the best of each separately,
+    # rather than the best ratio of a pair of runs, means one unusually fast run of the workload can't skew it. The
+    # median time is recorded too, as a measure of how noisy the runs were.
+    if number is None:
+        number = 1
+        while _time(fn, number) * number < min_time:
+            number *= 2
+    times = []
+    reference = float("inf")
+    for _ in range(repeat):
+        reference = min(reference, _time(_reference_workload, 5))
+        times.append(_time(fn, number))
+    best = min(times)
+    return {
+        "seconds": best,
+        "median": statistics.median(times),
+        "relative": best / reference,
+        "number": number,
+        "repeat": repeat,
+    }
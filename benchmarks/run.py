@@ -0,0 +1,172 @@
+# Runs the benchmark suite, writes the results as JSON, and compares them against a stored baseline.
+#
+#   python benchmarks/run.py [-k PATTERN] [-o results.json] [--baseline FILE] [--threshold 0.25] [--small-threshold 1.0]
+#                            [--save-baseline]
+#
+# Each bench_*.py module has a benchmarks() function returning {name: case}, where a case is a function to time or a
+# dict of the function ("fn") and arguments for common.measure. The reported time is the best time per call.
+# Each run of a case is paired with a run of a fixed reference workload, and cases are compared by their time relative
+# to the reference (see common.measure), which allows for the machine being faster or slower overall than when the
+# baseline was recorded. A case is a regression if both this ratio and its best time are larger than the baseline's by
+# more than the threshold, even after re-measuring it to rule out a noisy run; the exit status is then 1. Cases that
+# took under a millisecond in the baseline are noisier relative to their time, so they have a larger threshold
+# (--small-threshold, a 2x slowdown by default). Even so, timings are only
+# really comparable on the same machine, so the baseline should be regenerated (--save-baseline) on a new one.
+
+import argparse
+import fnmatch
+import hashlib
+import importlib
+import json
+import platform
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from pygmentation.pygmentation import schemes_json
+
+from common import measure
+
+MODULES = ["bench_color", "bench_scheme", "bench_pickle", "bench_cli"]
+BASELINE = Path(__file__).parent / "baseline.json"
+# cases faster than this (in seconds) in the baseline are compared with the small threshold
+SMALL_CASE = 1e-3
+
+
+def environment() -> dict:
+    with open(schemes_json, "rb") as f:
+        catalog = hashlib.sha1(f.read()).hexdigest()[:16]
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "catalog": catalog,
+    }
+
+
+def collect(pattern: str = "*", repeat: int = None) -> dict:
+    # {name: case} for every case matching the pattern, with each case as a dict of arguments for measure
+    cases = {}
+    for module in MODULES:
+        for name, case in importlib.import_module(module).benchmarks().items():
+            if not fnmatch.fnmatch(name, pattern):
+                continue
+            case = dict(case) if isinstance(case, dict) else {"fn": case}
+            if repeat is not None:
+                case["repeat"] = repeat
+            cases[name] = case
+    return cases
+
+
+def run(cases: dict) -> dict:
+    results = {}
+    for name, case in cases.items():
+        results[name] = measure(**case)
+        print(f"{name:<36}{results[name]['seconds'] * 1000:>12.3f}ms", file=sys.stderr)
+    return {"environment": environment(), "results": results}
+
+
+def confirm(cases: dict, results: dict, baseline: dict, threshold: float, small_threshold: float, attempts: int = 2):
+    # re-measures the cases that look like regressions, keeping the best, so that a single noisy run isn't
+    # reported as a regression
+    for _ in range(attempts):
+        suspects = _regressions(results, baseline, threshold, small_threshold)
+        if not suspects:
+            return
+        print(f"Re-measuring {len(suspects)} possible regressions", file=sys.stderr)
+        for name in suspects:
+            result = measure(**cases[name])
+            if result["relative"] < results["results"][name]["relative"]:
+                results["results"][name] = result
+
+
+def _regressed(result: dict, before: dict, threshold: float, small_threshold: float) -> bool:
+    # slower by more than the threshold both relative to the reference workload and in absolute time
+    if before["seconds"] < SMALL_CASE:
+        threshold = max(threshold, small_threshold)
+    return (
+        result["relative"] / before["relative"] - 1 > threshold
+        and result["seconds"] / before["seconds"] - 1 > threshold
+    )
+
+
+def _regressions(results: dict, baseline: dict, threshold: float, small_threshold: float) -> list:
+    return [
+        name
+        for name, result in results["results"].items()
+        if name in baseline["results"] and _regressed(result, baseline["results"][name], threshold, small_threshold)
+    ]
+
+
+def compare(results: dict, baseline: dict, threshold: float, small_threshold: float) -> list:
+    # returns the names of the cases that regressed, printing a comparison of every case
+    if baseline["environment"] != results["environment"]:
+        print("Warning: the baseline was recorded in a different environment:", file=sys.stderr)
+        for key, value in baseline["environment"].items():
+            if results["environment"].get(key) != value:
+                print(f"  {key}: {value} (now {results['environment'].get(key)})", file=sys.stderr)
+    regressions = _regressions(results, baseline, threshold, small_threshold)
+    print(f"{'':<36}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, result in results["results"].items():
+        now = result["seconds"]
+        if name not in baseline["results"]:
+            print(f"{name:<36}{'':>12}{now * 1000:>10.3f}ms{'new':>10}")
+            continue
+        before = baseline["results"][name]["seconds"]
+        change = result["relative"] / baseline["results"][name]["relative"] - 1
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<36}{before * 1000:>10.3f}ms{now * 1000:>10.3f}ms{change:>+10.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pygmentation benchmarks and compare them against a baseline")
+    parser.add_argument("-k", "--pattern", default="*", help="Only run the cases matching this pattern, e.g. 'export.*' (default: all)")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=str(BASELINE), help=f"The baseline to compare against (default: {BASELINE.name})")
+    parser.add_argument("--threshold", type=float, default=0.25, help="The slowdown, as a fraction of the baseline time, above which a case is a regression (default: 0.25)")
+    parser.add_argument("--small-threshold", type=float, default=1.0, help=f"The threshold for cases that took under {SMALL_CASE * 1000:g}ms in the baseline (default: 1.0)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to the baseline file instead of comparing against it")
+    parser.add_argument("--repeat", type=int, help="Override the number of runs of every case")
+    args = parser.parse_args()
+
+    cases = collect(args.pattern, args.repeat)
+    results = run(cases)
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        if args.pattern != "*" and baseline_path.exists():
+            # only replace the cases that were run
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            baseline["environment"] = results["environment"]
+            baseline["results"].update(results["results"])
+            results = baseline
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Wrote baseline to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    confirm(cases, results, baseline, args.threshold, args.small_threshold)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    regressions = compare(results, baseline, args.threshold, args.small_threshold)
+    if regressions:
+        print(f"{len(regressions)} cases are more than {args.threshold:.0%} slower than the baseline ({args.small_threshold:.0%} for cases under {SMALL_CASE * 1000:g}ms): {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"No cases are more than {args.threshold:.0%} slower than the baseline ({args.small_threshold:.0%} for cases under {SMALL_CASE * 1000:g}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-from .pygmentation import list_schemes, get_available_schemes
\ No newline at end of file
+from .pygmentation import list_schemes, get_available_schemes, find_schemes
+from .instrumentation import stats
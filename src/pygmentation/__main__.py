@@ -1,16 +1,36 @@
 import argparse
+import json
+import re
+import sys
+import time
 from pathlib import Path
-from rich.console import Console
-from rich.prompt import IntPrompt
-from .pygmentation import show_scheme, set_scheme, get_scheme, get_available_schemes, handle_unknown_scheme, show, save, write, list_schemes
+from . import instrumentation
+from .catalog import FEATURES, export_catalog, load_features, parse_condition
+from .convert import BATCH_SIZE, convert_stream
+from .rewrite import ColorSnapper, rewrite_files, rewrite_stream
+from .snap import CACHE_SIZE, StreamSnapper
+from .pygmentation import show_scheme, set_scheme, get_scheme, get_available_schemes, handle_unknown_scheme, show, save, write, list_schemes, write_mplstyles, recolor, resolve_scheme, dump_schemes
 
 def parse_args():
     # pygmentation show [--show-codes|-s] [--code-type-c <hex|rgb|hsl|hsv|Lab>] <scheme> [variant] -- Show a scheme in the terminal, optionally only showing the light or dark variant (default: both)
     # pygmentation save -f <filename> <scheme> [variant] -- Save a .svg file of a scheme, optionally only saving the light or dark variant (default: both)
     # pygmentation write -f <filename> -t <latex|css> <scheme> [variant] -- Write a .tex or .css file of a scheme, optionally only saving the light or dark variant (default: both). -t is optional, inferred from filename extension if not provided.
+    # pygmentation recolor [--base-only] [--accents-only] [-j <jobs>] <input> <output> <scheme> [variant] -- Recolour an image to the closest colours of a scheme
+    # pygmentation rewrite [--css-vars] [--base-only] [--accents-only] [-o <dir>|--in-place] [-j <jobs>] <scheme> <variant> <files...|-> -- Rewrite the hex colours in SVG and CSS files to the closest colours of a scheme
+    # pygmentation dump [--format <ndjson|json|npz>] [-o <filename>] [-j <jobs>] [pattern] [variant] -- Write every resolved scheme as JSON, one per line, or as NumPy arrays
+    # pygmentation convert --from <hex|rgb|hsl|hsv|Lab|ansi> --to <hex|rgb|hsl|hsv|Lab> [--ndjson] -- Convert colours from stdin, one per line, writing them to stdout
+    # pygmentation snap [--from <hex|rgb|hsl|hsv|Lab|ansi>] [--output <both|role|hex>] [--base-only] [--accents-only] [--cache-size <n>] <scheme> [variant] -- Snap colours from stdin to the closest colours of a scheme
+    # pygmentation find [--top|-n <n>] [--variants] [--accents-only] <color> [variant] -- Find the schemes with a colour closest to <color>
+    # pygmentation similar [--top|-n <n>] <scheme> [variant] -- Find the schemes most similar to <scheme>
+    # pygmentation dedupe [--tolerance|-t <ΔE>] [variant] -- Find groups of near-duplicate schemes
+    # pygmentation [--timings] [--timings-format <text|json>] [--profile <file>] <command> ... -- Print the time spent in each phase, or save a cProfile profile, of any command
     # pygmentation list --names-only <pattern> [variant] -- List all available schemes, with a sample of each. If pattern is provided, only schemes matching the pattern are listed (accepts standard shell wildcards). If --names-nly, just prints the names with no sample
 
     parser = argparse.ArgumentParser(prog = "pygmentation", description = "A command-line tool for generating color schemes for quantum optics plots.")
+    parser.add_argument("--best-match", action = "store_true", help = "If the scheme name is not recognised, use the closest match instead of asking")
+    parser.add_argument("--timings", action = "store_true", help = "Print the time spent in each phase of the command (loading the catalog, resolving schemes, rendering and exporting, and file I/O) to stderr")
+    parser.add_argument("--timings-format", choices = ["text", "json"], help = "Print the timings as a table or as a single line of JSON (default: text). Implies --timings")
+    parser.add_argument("--profile", metavar = "FILE", help = "Run the command under cProfile, and save the profile to FILE (e.g. for snakeviz or pstats)")
     subparsers = parser.add_subparsers(dest = "command", required = True)
 
     show_parser = subparsers.add_parser("show", help = "Show a scheme in the terminal, optionally only showing the light or dark variant (default: both)")
@@ -18,6 +38,7 @@ def parse_args():
     show_parser.add_argument("variant", nargs = "?", default = "both", choices = ["both", "light", "dark"], help = "The variant of the scheme to show (default: both)")
     show_parser.add_argument("-s", "--show-codes", action = "store_true", help = "Show the color codes for the scheme")
     show_parser.add_argument("-c", "--code-type", choices = ["hex", "rgb", "hsl", "hsv", "Lab"], help = "The type of color codes to show (default: hex)")
+    show_parser.add_argument("-r", "--renderer", choices = ["rich", "ansi"], default = "rich", help = "Render with rich, or write raw truecolor escape sequences directly (default: rich)")
 
     save_parser = subparsers.add_parser("save", help = "Save a .svg file of a scheme, optionally only saving the light or dark variant (default: both)")
     save_parser.add_argument("-f", "--filename", required = True, help = "The name of the file to save")
@@ -30,24 +51,172 @@ def parse_args():
     write_parser.add_argument("scheme", help = "The name of the scheme to write")
     write_parser.add_argument("variant", nargs = "?", default = "both", choices = ["both", "light", "dark"], help = "The variant of the scheme to write (default: both)")
 
+    recolor_parser = subparsers.add_parser("recolor", help = "Recolour an image, replacing every pixel with the closest colour of a scheme (by CIEDE2000). Requires Pillow")
+    recolor_parser.add_argument("input", help = "The image to recolour")
+    recolor_parser.add_argument("output", help = "The file to save the recoloured image to (the format is inferred from the extension)")
+    recolor_parser.add_argument("scheme", help = "The name of the scheme to recolour to")
+    recolor_parser.add_argument("variant", nargs = "?", default = "light", choices = ["light", "dark"], help = "The variant of the scheme to use (default: light)")
+    recolor_parser.add_argument("--base-only", action = "store_true", help = "Only use the base colours of the scheme, not their variants")
+    recolor_parser.add_argument("--accents-only", action = "store_true", help = "Only use the accent colours of the scheme")
+    recolor_parser.add_argument("-j", "--jobs", type = int, help = "The number of threads to use (default: one per CPU)")
+
+    rewrite_parser = subparsers.add_parser("rewrite", help = "Rewrite every hex colour in SVG and CSS files to the closest colour of a scheme (by CIEDE2000)")
+    rewrite_parser.add_argument("scheme", help = "The name of the scheme to rewrite to")
+    rewrite_parser.add_argument("variant", choices = ["light", "dark"], help = "The variant of the scheme to use")
+    rewrite_parser.add_argument("files", nargs = "+", help = "The files to rewrite, or - to read from stdin and write to stdout")
+    rewrite_parser.add_argument("--css-vars", action = "store_true", help = "In CSS files, use the --clr-* variables written by `pygmentation write` instead of hex codes")
+    rewrite_parser.add_argument("--base-only", action = "store_true", help = "Only use the base colours of the scheme, not their variants")
+    rewrite_parser.add_argument("--accents-only", action = "store_true", help = "Only use the accent colours of the scheme")
+    rewrite_output = rewrite_parser.add_mutually_exclusive_group()
+    rewrite_output.add_argument("-o", "--output-dir", help = "The directory to write the rewritten files to, keeping their paths relative to one another")
+    rewrite_output.add_argument("--in-place", action = "store_true", help = "Overwrite the files")
+    rewrite_parser.add_argument("-j", "--jobs", type = int, help = "The number of processes to use (default: one per CPU)")
+
     list_parser = subparsers.add_parser("list", help = "List all available schemes, with a sample of each. If pattern is provided, only schemes matching the pattern are listed (accepts standard shell wildcards)")
     list_parser.add_argument("--names-only", action = "store_true", help = "Just print the names of the schemes with no sample")
+    list_parser.add_argument("-r", "--renderer", choices = ["rich", "ansi"], default = "rich", help = "Render with rich, or write raw truecolor escape sequences directly (default: rich)")
+    list_parser.add_argument("--min-contrast", type = float, help = "Only list schemes whose foreground and background have at least this WCAG contrast ratio")
+    list_parser.add_argument("-w", "--where", action = "append", default = [], metavar = "CONDITION", help = f"Only list schemes matching a condition on a feature, e.g. 'min-accent-delta-e>=10' (may be repeated). Features: {', '.join(FEATURES)}")
+    list_parser.add_argument("--sort", choices = list(FEATURES), help = "Sort the schemes by a feature, largest first")
+    list_parser.add_argument("--ascending", action = "store_true", help = "Sort smallest first instead")
     list_parser.add_argument("pattern", nargs = "?", default = "*", help = "A pattern to match against scheme names (default: *)")
     list_parser.add_argument("variant", nargs = "?", default = "light", choices = ["light", "dark"], help = "The variant of the schemes to list (default: light)")
 
+    mplstyle_parser = subparsers.add_parser("mplstyle", help = "Write a matplotlib .mplstyle file for every scheme, type and document type, named <scheme>-<type>-<doc_type>")
+    mplstyle_parser.add_argument("-d", "--directory", help = "The directory to write the style files to (default: matplotlib's user style library, so they can be used by name)")
+    mplstyle_parser.add_argument("--transparent", action = "store_true", help = "Write transparent styles instead, named <scheme>-<type>-<doc_type>-transparent")
+    mplstyle_parser.add_argument("pattern", nargs = "?", default = "*", help = "A pattern to match against scheme names (default: *)")
+    mplstyle_parser.add_argument("variant", nargs = "?", default = "both", choices = ["both", "light", "dark"], help = "The variant of the schemes to write (default: both)")
+
+    dump_parser = subparsers.add_parser("dump", help = "Write every resolved scheme (all colour families and their variants, aliases and distinct colours) as JSON, one scheme per line, as each is resolved")
+    dump_parser.add_argument("--format", choices = ["ndjson", "json", "npz"], default = "ndjson", help = "Write one scheme per line, a single JSON array, or a .npz file of NumPy arrays of every colour (default: ndjson)")
+    dump_parser.add_argument("-o", "--output", help = "The file to write to (default: stdout; required for npz)")
+    dump_parser.add_argument("-j", "--jobs", type = int, help = "For npz, the number of processes used to resolve the catalog if it isn't cached yet (default: one per CPU)")
+    dump_parser.add_argument("pattern", nargs = "?", default = "*", help = "A pattern to match against scheme names (default: *)")
+    dump_parser.add_argument("variant", nargs = "?", default = "both", choices = ["both", "light", "dark"], help = "The variant of the schemes to write (default: both)")
+
+    convert_parser = subparsers.add_parser("convert", help = "Convert colours read from stdin (one per line) from one colour space to another, writing them to stdout in the format used by show --code-type")
+    convert_parser.add_argument("--from", dest = "source", required = True, choices = ["hex", "rgb", "hsl", "hsv", "Lab", "ansi"], help = "The colour space of the input (ansi reads the first truecolor escape sequence, 38;2;R;G;B or 48;2;R;G;B, on each line)")
+    convert_parser.add_argument("--to", dest = "target", required = True, choices = ["hex", "rgb", "hsl", "hsv", "Lab"], help = "The colour space of the output")
+    convert_parser.add_argument("--ndjson", action = "store_true", help = "Read and write one JSON value per line: a string, or a list of three numbers")
+    convert_parser.add_argument("--batch-size", type = int, default = BATCH_SIZE, help = f"The number of lines converted at a time (default: {BATCH_SIZE})")
+
+    snap_parser = subparsers.add_parser("snap", help = "Read colours from stdin, one per line, and write the role and hex code of the closest colour of a scheme (by CIEDE2000) for each to stdout")
+    snap_parser.add_argument("scheme", help = "The name of the scheme to snap to")
+    snap_parser.add_argument("variant", nargs = "?", default = "light", choices = ["light", "dark"], help = "The variant of the scheme to use (default: light)")
+    snap_parser.add_argument("--from", dest = "source", default = "hex", choices = ["hex", "rgb", "hsl", "hsv", "Lab", "ansi"], help = "The colour space of the input, as for convert (default: hex)")
+    snap_parser.add_argument("--output", choices = ["both", "role", "hex"], default = "both", help = "Write the role (named as in the CSS output, e.g. accent3-2), the hex code, or both (default: both)")
+    snap_parser.add_argument("--base-only", action = "store_true", help = "Only use the base colours of the scheme, not their variants")
+    snap_parser.add_argument("--accents-only", action = "store_true", help = "Only use the accent colours of the scheme")
+    snap_parser.add_argument("--cache-size", type = int, default = CACHE_SIZE, help = f"The number of distinct lines whose results are remembered (default: {CACHE_SIZE})")
+
+    find_parser = subparsers.add_parser("find", help = "Find the schemes with a colour closest to the given colour, using a precomputed index of the whole catalog")
+    find_parser.add_argument("color", help = "The colour to search for, as a hex code (e.g. '#1E66F5')")
+    find_parser.add_argument("variant", nargs = "?", default = "both", choices = ["both", "light", "dark"], help = "The variant of the schemes to search (default: both)")
+    find_parser.add_argument("-n", "--top", type = int, default = 10, help = "The number of schemes to show (default: 10)")
+    find_parser.add_argument("--variants", action = "store_true", help = "Also match the variants of each colour, not just the base colours")
+    find_parser.add_argument("--accents-only", action = "store_true", help = "Only match accent colours")
+    find_parser.add_argument("--rebuild", action = "store_true", help = "Rebuild the catalog index, even if a cached copy exists")
+    find_parser.add_argument("-j", "--jobs", type = int, help = "The number of processes used to build the catalog index (default: one per CPU)")
+
+    similar_parser = subparsers.add_parser("similar", help = "Find the schemes most similar to a given scheme")
+    similar_parser.add_argument("scheme", help = "The name of the scheme to compare against")
+    similar_parser.add_argument("variant", nargs = "?", default = "light", choices = ["light", "dark"], help = "The variant of the schemes to compare (default: light)")
+    similar_parser.add_argument("-n", "--top", type = int, default = 5, help = "The number of schemes to show (default: 5)")
+
+    dedupe_parser = subparsers.add_parser("dedupe", help = "Find groups of schemes whose colours are all within a tolerance of one another")
+    dedupe_parser.add_argument("variant", nargs = "?", default = "light", choices = ["light", "dark"], help = "The variant of the schemes to compare (default: light)")
+    dedupe_parser.add_argument("-t", "--tolerance", type = float, default = 2.0, help = "The largest ΔE (CIEDE2000) between matching colours (default: 2.0)")
+
     return parser.parse_args()
 
 
+def pattern_to_regex(pattern: str) -> str:
+    if pattern.startswith("re:"):
+        return pattern[3:]
+    return pattern.replace("*", ".*").replace("?", ".")
+
+
+# the phases shown by --timings, in order. Each is shown with its self time (excluding the phases within it), so that
+# the times add up to the total
+TIMING_PHASES = instrumentation.PHASES
+
+
+def timings(command: str, total: float) -> dict:
+    stats = instrumentation.stats()
+    phases = {name: stats["phases"].pop(name) for name in TIMING_PHASES if name in stats["phases"]}
+    # any other phases (e.g. timed by a plugin) go after the standard ones
+    phases.update(stats["phases"])
+    return {
+        "command": command,
+        "total_seconds": total,
+        "other_seconds": total - sum(p["self_seconds"] for p in phases.values()),
+        "phases": phases,
+        "conversions": stats["conversions"],
+        "delta_e": stats["delta_e"],
+        "families": stats["families"],
+        "caches": stats["caches"],
+    }
+
+
+def print_timings(result: dict, format: str = "text", file = None):
+    if file is None:
+        file = sys.stderr
+    if format == "json":
+        print(json.dumps(result), file = file)
+        return
+    print(f"{result['command']}: {result['total_seconds'] * 1000:.1f}ms", file = file)
+    print(f"  {'phase':<16}{'calls':>8}{'self':>12}{'total':>12}", file = file)
+    for name, phase in result["phases"].items():
+        print(f"  {name:<16}{phase['calls']:>8}{phase['self_seconds'] * 1000:>10.1f}ms{phase['seconds'] * 1000:>10.1f}ms", file = file)
+    print(f"  {'other':<16}{'':>8}{result['other_seconds'] * 1000:>10.1f}ms", file = file)
+
+
+def input_error(error: ValueError):
+    # bad input to a command reading stdin: the message (which gives the line) rather than a traceback
+    sys.stdout.flush()
+    print(f"Error: {error}", file = sys.stderr)
+    quit(1)
+
+
 def main():
 
     args = parse_args()
+    if args.timings_format is not None:
+        args.timings = True
+    if not args.timings and args.profile is None:
+        run(args)
+        return
+
+    if args.timings:
+        instrumentation.reset()
+        instrumentation.enable()
+    profiler = None
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.runcall(run, args)
+        else:
+            run(args)
+    finally:
+        total = time.perf_counter() - started
+        if profiler is not None:
+            profiler.dump_stats(args.profile)
+        if args.timings:
+            print_timings(timings(args.command, total), args.timings_format or "text")
+
+
+def run(args):
     available = get_available_schemes()
 
-    if args.command != "list" and args.scheme not in available:
-        args.scheme = handle_unknown_scheme(args.scheme)
+    if getattr(args, "scheme", None) is not None and args.scheme not in available:
+        args.scheme = handle_unknown_scheme(args.scheme, not args.best_match)
 
     if args.command == "show":
-        show(args.scheme, args.variant, args.show_codes, args.code_type)
+        show(args.scheme, args.variant, args.show_codes, args.code_type, args.renderer)
         return
     
     if args.command == "save":
@@ -71,16 +240,97 @@ def main():
             raise ValueError(f"Filename must have {', '.join(list(format_map.keys())[:-1])}, or {list(format_map.keys())[-1]} extension, or type must be specified with -t/--type")
         write(args.filename, args.scheme, args.variant, filetype)
         
+    elif args.command == "recolor":
+        recolor(args.input, args.output, args.scheme, args.variant, not args.base_only, args.accents_only, args.jobs)
+
+    elif args.command == "rewrite":
+        if args.files == ["-"]:
+            snapper = ColorSnapper(resolve_scheme(args.scheme, args.variant), not args.base_only, args.accents_only)
+            try:
+                rewrite_stream(sys.stdin, sys.stdout, snapper, args.css_vars)
+            except ValueError as error:
+                input_error(error)
+            return
+        if args.output_dir is None and not args.in_place:
+            raise ValueError("Either an output directory (-o/--output-dir) or --in-place must be given when rewriting files")
+        rewrite_files(args.files, args.scheme, args.variant, args.output_dir, args.css_vars, not args.base_only, args.accents_only, args.jobs)
+
     elif args.command == "list":
         # sort available schemes alphabetically
         available.sort()
         names_only = args.names_only
-        pattern = args.pattern
-        if pattern.startswith("re:"):
-            pattern = pattern[3:]
+        pattern = pattern_to_regex(args.pattern)
+        conditions = [parse_condition(c) for c in args.where]
+        if args.min_contrast is not None:
+            conditions.append(("contrast", ">=", args.min_contrast))
+        if conditions or args.sort is not None:
+            # filter and sort using the precomputed feature table, rather than resolving every scheme
+            features = load_features()
+            entries = features.query(conditions, args.sort, not args.ascending, args.variant)
+            # with no sort key, keep the alphabetical order
+            available = [features.catalog.describe(e)[0] for e in entries]
+            if len(available) == 0:
+                print("No schemes match the given conditions")
+                quit(1)
+            if args.sort is None:
+                available.sort()
+        list_schemes(names_only, pattern, available, True, args.variant.lower() == "dark", args.renderer)
+
+    elif args.command == "mplstyle":
+        available.sort()
+        schemes = list_schemes(True, pattern_to_regex(args.pattern), available, False)
+        scheme_types = ["light", "dark"] if args.variant == "both" else [args.variant]
+        written = write_mplstyles(args.directory, schemes, scheme_types, transparent = args.transparent)
+        print(f"Wrote {len(written)} style files to {written[0].parent}")
+
+    elif args.command == "dump":
+        available.sort()
+        schemes = list_schemes(True, pattern_to_regex(args.pattern), available, False)
+        scheme_types = ["light", "dark"] if args.variant == "both" else [args.variant]
+        if args.format != "npz":
+            dump_schemes(args.output, schemes, scheme_types, args.format)
+        elif args.output is None:
+            raise ValueError("An output file (-o/--output) must be given for npz")
         else:
-            pattern = pattern.replace("*", ".*").replace("?", ".")
-        list_schemes(names_only, pattern, available, True, args.variant.lower() == "dark")
+            export_catalog(args.output, schemes, scheme_types, jobs = args.jobs)
+
+    elif args.command == "convert":
+        try:
+            convert_stream(sys.stdin, sys.stdout, args.source, args.target, args.ndjson, args.batch_size)
+        except ValueError as error:
+            input_error(error)
+
+    elif args.command == "snap":
+        snapper = ColorSnapper(resolve_scheme(args.scheme, args.variant), not args.base_only, args.accents_only)
+        try:
+            StreamSnapper(snapper, args.source, args.output, args.cache_size).snap_stream(sys.stdin, sys.stdout)
+        except ValueError as error:
+            input_error(error)
+
+    elif args.command == "find":
+        from .catalog import load_catalog
+        if re.fullmatch(r"#?[0-9a-fA-F]{6}", args.color) is None:
+            raise ValueError(f"Colour must be a 6-digit hex code, not {args.color}")
+        catalog = load_catalog(args.rebuild, args.jobs)
+        scheme_type = None if args.variant == "both" else args.variant
+        results = catalog.find(args.color, args.top, args.variants, args.accents_only, scheme_type)
+        width = max([len(r["scheme"]) for r in results], default = 0)
+        for r in results:
+            print(f"{r['scheme']:<{width}}  {r['type']:<5}  {r['role']:<16}  #{r['hex']}  ΔE {r['distance']:.2f}")
+
+    elif args.command == "similar":
+        from .catalog import load_catalog
+        results = load_catalog().similar(args.scheme, args.variant, args.top)
+        width = max([len(r["scheme"]) for r in results], default = 0)
+        for r in results:
+            print(f"{r['scheme']:<{width}}  ΔE {r['distance']:.2f}")
+
+    elif args.command == "dedupe":
+        from .catalog import load_catalog
+        clusters = load_catalog().duplicates(args.tolerance, args.variant)
+        for cluster in clusters:
+            print(f"{', '.join(cluster['schemes'])}  (ΔE ≤ {cluster['distance']:.2f})")
+        print(f"{len(clusters)} groups of near-duplicate schemes")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,918 @@
+from __future__ import annotations
+
+# The resolved catalog: every scheme in every type, resolved once and stored as flat NumPy arrays.
+# Resolving all of the schemes takes a couple of seconds, so the arrays are cached on disk (keyed by the contents of
+# the catalog) and only rebuilt when the catalog changes.
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from . import instrumentation as _instr
+from .color_scheme import (
+    ColorScheme,
+    SchemeType,
+    _unpack_scheme,
+    delta_e_array,
+    hex_to_rgb_array,
+    rgb_to_lab_array,
+)
+
+# bump this whenever the layout of the arrays changes, so that old cache files are ignored
+CATALOG_VERSION = 3
+
+ROLES = ["foreground", "background", "accent", "surface", "auto-surface"]
+ALIASES = ["red", "orange", "yellow", "green", "cyan", "blue", "purple", "magenta"]
+TYPES = {SchemeType.LIGHT.value: "light", SchemeType.DARK.value: "dark"}
+
+
+def cache_dir() -> Path:
+    # $PYGMENTATION_CACHE_DIR, or pygmentation/ inside $XDG_CACHE_HOME (default: ~/.cache)
+    if "PYGMENTATION_CACHE_DIR" in os.environ:
+        return Path(os.environ["PYGMENTATION_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(base) / "pygmentation"
+
+
+def catalog_key(schemes: dict) -> str:
+    # identifies the contents of the catalog, so cached arrays can be matched to the catalog they were built from
+    hasher = hashlib.sha1(f"{CATALOG_VERSION}".encode())
+    hasher.update(json.dumps(schemes, sort_keys=True).encode())
+    return hasher.hexdigest()[:16]
+
+
+def scheme_arrays(scheme: ColorScheme) -> dict:
+    # The colours of a resolved scheme as arrays, with families in the order foreground, background, accents,
+    # surfaces, auto surfaces. Aliases and distinct colours are stored as indices into the families.
+    families = [scheme.foreground, scheme.background, *scheme.accents, *scheme.surfaces, *scheme.auto_surfaces]
+    roles = (
+        [0, 1]
+        + [2] * len(scheme.accents)
+        + [3] * len(scheme.surfaces)
+        + [4] * len(scheme.auto_surfaces)
+    )
+    role_index = (
+        [0, 0]
+        + list(range(len(scheme.accents)))
+        + list(range(len(scheme.surfaces)))
+        + list(range(len(scheme.auto_surfaces)))
+    )
+
+    def index_of(family):
+        # aliases may be accents or surfaces, so find the exact object rather than comparing colours
+        return next(i for i, f in enumerate(families) if f is family)
+
+    return {
+        "rgb": hex_to_rgb_array([f[i].hex for f in families for i in range(6)]).reshape(-1, 6, 3),
+        "bounds": hex_to_rgb_array([c.hex for f in families for c in (f._light, f._dark)]).reshape(-1, 2, 3),
+        # which of the 8 colours of each family (as in ColorFamily._colors) were given in lower case
+        "lowercase": np.array(
+            [sum(1 << i for i, c in enumerate(f._colors()) if c.hex.islower()) for f in families], dtype=np.uint8
+        ),
+        "roles": np.array(roles, dtype=np.uint8),
+        "role_index": np.array(role_index, dtype=np.uint16),
+        "aliases": np.array([index_of(getattr(scheme, a)) for a in ALIASES], dtype=np.int32),
+        "distinct": np.array([index_of(f) for f in scheme.distinct], dtype=np.int32),
+    }
+
+
+def _resolve_entries(names: List[str]) -> List[dict]:
+    # runs in worker processes, so imports the catalog itself
+    from .pygmentation import resolve_scheme
+
+    return [
+        scheme_arrays(resolve_scheme(name, scheme_type))
+        for name in names
+        for scheme_type in ("light", "dark")
+    ]
+
+
+def build_catalog(names: List[str] = None, jobs: Optional[int] = None) -> dict:
+    # Resolves every scheme (light and dark) and packs the results into flat arrays.
+    # Schemes are resolved in `jobs` worker processes (default: one per CPU); jobs=1 resolves them in this process.
+    from .pygmentation import all_schemes
+
+    if names is None:
+        names = list(all_schemes.keys())
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs > 1 and len(names) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunk_size = max(1, len(names) // (jobs * 4))
+        chunks = [names[i : i + chunk_size] for i in range(0, len(names), chunk_size)]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            entries = [entry for result in executor.map(_resolve_entries, chunks) for entry in result]
+    else:
+        entries = _resolve_entries(names)
+
+    counts = [len(e["roles"]) for e in entries]
+    distinct_counts = [len(e["distinct"]) for e in entries]
+    rgb = np.concatenate([e["rgb"] for e in entries])
+    return {
+        "key": np.array(catalog_key(all_schemes)),
+        "names": np.array(names),
+        "entry_scheme": np.repeat(np.arange(len(names), dtype=np.int32), 2),
+        "entry_type": np.tile(
+            np.array([SchemeType.LIGHT.value, SchemeType.DARK.value], dtype=np.uint8), len(names)
+        ),
+        "family_offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        "roles": np.concatenate([e["roles"] for e in entries]),
+        "role_index": np.concatenate([e["role_index"] for e in entries]),
+        "rgb": rgb,
+        "bounds": np.concatenate([e["bounds"] for e in entries]),
+        "lowercase": np.concatenate([e["lowercase"] for e in entries]),
+        # one vectorised conversion for the whole catalog
+        "lab": rgb_to_lab_array(rgb / 255).astype(np.float32),
+        "aliases": np.stack([e["aliases"] for e in entries]),
+        "distinct_offsets": np.concatenate(([0], np.cumsum(distinct_counts))).astype(np.int64),
+        "distinct": np.concatenate([e["distinct"] for e in entries]),
+    }
+
+
+class Catalog:
+    """
+    The resolved catalog, as flat arrays. Each scheme appears twice (light, then dark); each of these is an "entry".
+    * names: (S,) scheme names
+    * entry_scheme, entry_type: (E,) the scheme index and SchemeType value of each entry
+    * family_offsets: (E + 1,) entry e has families family_offsets[e] to family_offsets[e + 1]
+    * roles, role_index: (F,) the role of each family (an index into ROLES) and its number within that role
+    * rgb: (F, 6, 3) uint8 base colour and variants 1 to 5 of each family; lab: the same in LAB, as float32
+    * bounds: (F, 2, 3) uint8 the light and dark colours each family's variants were generated towards
+    * lowercase: (F,) uint8 a bit for each of the 8 colours of a family (rgb, then bounds) that was written in lower case
+    * aliases: (E, 8) the family (relative to the entry) used for each of ALIASES
+    * distinct_offsets, distinct: the distinct accents of each entry, as family indices relative to the entry
+    """
+
+    def __init__(self, arrays: dict):
+        self._arrays = arrays
+        for key, value in arrays.items():
+            setattr(self, key, value)
+        self._entry_lookup = None
+        self._family_entry = None
+        self._embeddings = None
+        self._sorted_embeddings = None
+
+    def __len__(self):
+        return len(self.entry_scheme)
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.entry(name)
+        except ValueError:
+            return False
+        return True
+
+    def entry(self, name: str, scheme_type: str | SchemeType = "light") -> int:
+        if self._entry_lookup is None:
+            self._entry_lookup = {str(n): i for i, n in enumerate(self.names)}
+        if isinstance(scheme_type, str):
+            scheme_type = SchemeType[scheme_type.upper()]
+        if name not in self._entry_lookup:
+            raise ValueError(f"Scheme {name} not found")
+        return 2 * self._entry_lookup[name] + (0 if scheme_type == SchemeType.LIGHT else 1)
+
+    def families(self, entry: int) -> slice:
+        return slice(int(self.family_offsets[entry]), int(self.family_offsets[entry + 1]))
+
+    def scheme(self, name: str, scheme_type: str | SchemeType = "light") -> ColorScheme:
+        # A frozen ColorScheme built directly from the arrays, identical (by content) to the resolved scheme, without
+        # resolving anything. Only the colours of the one scheme are turned into Python objects.
+        entry = self.entry(name, scheme_type)
+        families = self.families(entry)
+        roles = self.roles[families]
+        counts = tuple(int((roles == ROLES.index(r)).sum()) for r in ("accent", "surface", "auto-surface"))
+        distinct = self.distinct[self.distinct_offsets[entry] : self.distinct_offsets[entry + 1]]
+        return _unpack_scheme(
+            int(self.entry_type[entry]),
+            counts,
+            np.concatenate((self.rgb[families], self.bounds[families]), axis=1).tobytes(),
+            tuple(sorted(zip(ALIASES, self.aliases[entry].tolist()))),
+            tuple(distinct.tolist()),
+            # family i's byte holds the bits of colours 8i to 8i + 7, as _pack_colors numbers them
+            int.from_bytes(self.lowercase[families].tobytes(), "little"),
+            None,
+            True,
+        )
+
+    @property
+    def family_entry(self) -> np.ndarray:
+        # (F,) the entry that each family belongs to
+        if self._family_entry is None:
+            self._family_entry = np.repeat(
+                np.arange(len(self), dtype=np.int32), np.diff(self.family_offsets)
+            )
+        return self._family_entry
+
+    def role_name(self, family: int, variant: int = 0) -> str:
+        # names match those used by ColorScheme.to_css, e.g. "accent3" or "auto-surface2-4"
+        role = ROLES[self.roles[family]]
+        name = role if role in ("foreground", "background") else f"{role}{self.role_index[family] + 1}"
+        return name if variant == 0 else f"{name}-{variant}"
+
+    def describe(self, entry: int) -> Tuple[str, str]:
+        return str(self.names[self.entry_scheme[entry]]), TYPES[int(self.entry_type[entry])]
+
+    def find(
+        self,
+        color,
+        top: int = 10,
+        variants: bool = False,
+        accents_only: bool = False,
+        scheme_type: str = None,
+    ) -> List[dict]:
+        # The `top` entries with a colour closest to `color` (a hex string), best match first, each as a dict with
+        # scheme, type, role, hex and distance (CIEDE2000). Only the closest colour in each entry is reported.
+        target = rgb_to_lab_array(hex_to_rgb_array([color]) / 255)[0]
+        lab = self.lab if variants else self.lab[:, :1]
+        distances = delta_e_array(lab, target)
+        if accents_only:
+            distances[self.roles != ROLES.index("accent")] = np.inf
+        if scheme_type is not None:
+            wanted = SchemeType[scheme_type.upper()].value
+            distances[self.entry_type[self.family_entry] != wanted] = np.inf
+        flat = distances.ravel()
+        width = distances.shape[1]
+        # the best colour in each entry; entries are contiguous, so reduceat over the family offsets finds them
+        best = np.minimum.reduceat(flat, self.family_offsets[:-1] * width)
+        ranked = np.argsort(best, kind="stable")[:top]
+        results = []
+        for entry in ranked:
+            if not np.isfinite(best[entry]):
+                break
+            families = self.families(entry)
+            within = flat[families.start * width : families.stop * width]
+            position = int(np.argmin(within))
+            family, variant = families.start + position // width, position % width
+            name, type_name = self.describe(entry)
+            results.append(
+                {
+                    "scheme": name,
+                    "type": type_name,
+                    "role": self.role_name(family, variant),
+                    "hex": bytes(self.rgb[family, variant]).hex().upper(),
+                    "distance": float(best[entry]),
+                }
+            )
+        return results
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        # (E, 10, 3) LAB of the foreground, background and each of ALIASES, so every entry has the same shape and
+        # the same colour in the same slot. Cheap to compute, so derived from the arrays rather than cached on disk.
+        if self._embeddings is None:
+            offsets = self.family_offsets[:-1, None]
+            families = np.concatenate((offsets, offsets + 1, offsets + self.aliases), axis=1)
+            self._embeddings = self.lab[families, 0].astype(np.float64)
+        return self._embeddings
+
+    @property
+    def sorted_embeddings(self) -> np.ndarray:
+        # embeddings with the alias colours sorted (by L*, then a*, then b*), so that distances between them don't depend
+        # on which colour fills which alias, just as set_distance doesn't
+        if self._sorted_embeddings is None:
+            aliases = self.embeddings[:, 2:]
+            order = np.lexsort((aliases[..., 2], aliases[..., 1], aliases[..., 0]), axis=-1)
+            self._sorted_embeddings = np.concatenate(
+                (self.embeddings[:, :2], np.take_along_axis(aliases, order[..., None], axis=1)), axis=1
+            )
+        return self._sorted_embeddings
+
+    def similar(
+        self,
+        name: str,
+        scheme_type: str = "light",
+        top: int = 5,
+        candidates: int = None,
+    ) -> List[dict]:
+        # The `top` schemes (of the same type) most similar to `name`, each as a dict with scheme, type and
+        # distance. Candidates are the nearest entries by Euclidean distance between sorted embeddings, which are then
+        # reranked by set_distance.
+        query = self.entry(name, scheme_type)
+        wanted = self.entry_type[query]
+        flat = self.sorted_embeddings.reshape(len(self), -1)
+        distances = ((flat - flat[query]) ** 2).sum(axis=1)
+        distances[(self.entry_type != wanted) | (self.entry_scheme == self.entry_scheme[query])] = np.inf
+        if candidates is None:
+            candidates = max(4 * top, 32)
+        candidates = min(candidates, int(np.isfinite(distances).sum()))
+        if candidates <= 0:
+            return []
+        shortlist = np.sort(np.argpartition(distances, candidates - 1)[:candidates])
+        reranked = set_distance(self.embeddings[query], self.embeddings[shortlist])
+        order = np.argsort(reranked, kind="stable")[:top]
+        return [
+            dict(zip(("scheme", "type"), self.describe(shortlist[i])), distance=float(reranked[i]))
+            for i in order
+        ]
+
+    def duplicates(self, tolerance: float = 2.0, scheme_type: str = "light") -> List[dict]:
+        # Clusters of schemes whose colours are all within `tolerance` (CIEDE2000) of one another, as dicts with
+        # "schemes" (names, sorted) and "distance" (the largest verified distance within the cluster).
+        # Candidate pairs come from locality-sensitive hashing, so this runs in roughly linear time; every candidate is
+        # then verified exactly with hausdorff_distance.
+        entries = np.flatnonzero(self.entry_type == SchemeType[scheme_type.upper()].value)
+        colors = self._color_sets(entries)
+        pairs = _candidate_pairs(colors, tolerance)
+        if len(pairs) == 0:
+            return []
+        pairs = pairs[_within(colors[pairs[:, 0]], colors[pairs[:, 1]], tolerance)]
+        distances = hausdorff_distance(colors[pairs[:, 0]], colors[pairs[:, 1]])
+
+        # union-find over the verified pairs
+        parent = list(range(len(entries)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in pairs:
+            parent[root(a)] = root(b)
+        clusters = {}
+        for (a, b), distance in zip(pairs, distances):
+            cluster = clusters.setdefault(root(a), {"members": set(), "distance": 0.0})
+            cluster["members"].update((a, b))
+            cluster["distance"] = max(cluster["distance"], float(distance))
+        return sorted(
+            (
+                {
+                    "schemes": sorted(self.describe(entries[i])[0] for i in c["members"]),
+                    "distance": c["distance"],
+                }
+                for c in clusters.values()
+            ),
+            key=lambda c: c["schemes"],
+        )
+
+    def _color_sets(self, entries: np.ndarray) -> np.ndarray:
+        # (len(entries), max colours, 3) LAB of the base colours of each entry (excluding auto surfaces, which are
+        # derived from the rest), padded with NaN. The foreground and background are always the first two.
+        counts = np.array(
+            [
+                int((self.roles[self.families(e)] != ROLES.index("auto-surface")).sum())
+                for e in entries
+            ]
+        )
+        colors = np.full((len(entries), counts.max(), 3), np.nan)
+        for i, (e, n) in enumerate(zip(entries, counts)):
+            start = self.family_offsets[e]
+            colors[i, :n] = self.lab[start : start + n, 0]
+        return colors
+
+
+def set_distance(embedding: np.ndarray, others: np.ndarray) -> np.ndarray:
+    # Distance between the embedding of one entry (10, 3) and each of `others` (N, 10, 3): the mean CIEDE2000 over
+    # the foreground, the background and a greedy matching of the alias colours. Matching the aliases as a set means
+    # that e.g. a scheme whose "orange" is another's "yellow" still counts as close.
+    fg_bg = delta_e_array(others[:, :2], embedding[:2]).sum(axis=1)
+    costs = delta_e_array(others[:, None, 2:], embedding[None, 2:, None])
+    n = costs.shape[1]
+    matched = np.zeros(len(others))
+    rows = np.arange(len(others))
+    for _ in range(n):
+        # take the cheapest remaining pair in every matrix at once, then remove its row and column
+        best = costs.reshape(len(others), -1).argmin(axis=1)
+        i, j = np.divmod(best, n)
+        matched += costs[rows, i, j]
+        costs[rows, i, :] = np.inf
+        costs[rows, :, j] = np.inf
+    return (fg_bg + matched) / (n + 2)
+
+
+def hausdorff_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # For each pair of NaN-padded colour sets (N, M, 3), the largest CIEDE2000 from any colour in either set to the
+    # closest colour in the other, or to the matching foreground/background, whichever is larger. Two sets are within
+    # a tolerance exactly when every colour has a counterpart within it.
+    distances = delta_e_array(a[:, :, None], b[:, None, :])
+    distances[np.isnan(distances)] = np.inf
+    valid_a, valid_b = ~np.isnan(a[..., 0]), ~np.isnan(b[..., 0])
+    a_to_b = np.where(valid_a, distances.min(axis=2), 0).max(axis=1)
+    b_to_a = np.where(valid_b, distances.min(axis=1), 0).max(axis=1)
+    fg_bg = delta_e_array(a[:, :2], b[:, :2]).max(axis=1)
+    return np.maximum(np.maximum(a_to_b, b_to_a), fg_bg)
+
+
+def _within(a: np.ndarray, b: np.ndarray, tolerance: float) -> np.ndarray:
+    # Whether hausdorff_distance(a, b) <= tolerance for each pair, checking one colour at a time so that most pairs
+    # are rejected after computing only a few distances
+    keep = delta_e_array(a[:, :2], b[:, :2]).max(axis=1) <= tolerance
+    for k in range(2, a.shape[1]):
+        for x, y in ((a, b), (b, a)):
+            pending = np.flatnonzero(keep & ~np.isnan(x[:, k, 0]))
+            distances = delta_e_array(y[pending], x[pending, k, None])
+            closest = np.where(np.isnan(distances), np.inf, distances).min(axis=1)
+            keep[pending[closest > tolerance]] = False
+    return keep
+
+
+# MinHash parameters: BANDS bands of ROWS hashes each. Sets with Jaccard similarity s become candidates with
+# probability 1 - (1 - s^ROWS)^BANDS (about 0.8 at s = 0.3, and over 0.99 at s = 0.5).
+BANDS, ROWS = 16, 2
+_PRIME = (1 << 61) - 1
+# An upper bound on CIE76 / CIEDE2000 for two sRGB colours. CIEDE2000 divides chroma differences by up to about 7 for
+# the most saturated colours (and the largest ratio found by sampling pairs across the gamut is about 7.6), so colours
+# within a CIEDE2000 tolerance t are always within 8t of each other in LAB.
+_DE76_PER_DE00 = 8.0
+
+
+def _candidate_pairs(colors: np.ndarray, tolerance: float, seed: int = 0) -> np.ndarray:
+    # (P, 2) pairs of set indices (i < j) whose quantised colours collide in at least one MinHash band.
+    # LAB is quantised into cubes twice the largest LAB distance between colours within the tolerance across (see
+    # _DE76_PER_DE00), on two grids offset by half a cube, so that two colours within the tolerance share a cube on at
+    # least one grid unless they straddle a corner.
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, BANDS * ROWS, dtype=np.int64)
+    b = rng.integers(0, 1 << 31, BANDS * ROWS, dtype=np.int64)
+    size = max(2 * tolerance * _DE76_PER_DE00, 1e-6)
+    valid = ~np.isnan(colors[..., 0])
+    owner = np.broadcast_to(np.arange(len(colors))[:, None], valid.shape)[valid]
+    found = []
+    for offset in (0, size / 2):
+        cells = np.floor((colors[valid] + offset) / size).astype(np.int64)
+        # number the occupied cubes from 0, so that keys are small and non-negative however fine the grid (keys below
+        # 2^31 keep the products below within int64)
+        cells -= cells.min(axis=0)
+        _, keys = np.unique(cells, axis=0, return_inverse=True)
+        hashes = (keys.reshape(-1).astype(np.int64)[:, None] * a + b) % _PRIME
+        # minimum of each hash over each set (owner is sorted, so sets are contiguous)
+        starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        signatures = np.minimum.reduceat(hashes, starts, axis=0)
+        for band in signatures.reshape(len(signatures), BANDS, ROWS).transpose(1, 0, 2):
+            # sets whose hashes in the band are all equal share a bucket, found by sorting on every hash of the band
+            order = np.lexsort(band.T[::-1])
+            band = band[order]
+            bounds = np.flatnonzero(np.r_[True, (band[1:] != band[:-1]).any(axis=1), True])
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if stop - start > 1:
+                    members = order[start:stop]
+                    i, j = np.triu_indices(len(members), 1)
+                    found.append(np.stack((members[i], members[j]), axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(found), axis=1)
+    # deduplicate pairs found in several bands, encoded as single integers
+    encoded = np.unique(pairs[:, 0] * len(colors) + pairs[:, 1])
+    return np.stack(np.divmod(encoded, len(colors)), axis=1)
+
+
+def _save(filepath: Path, arrays: dict):
+    try:
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so that concurrent readers never see a partial file
+        temporary = filepath.with_name(f"{filepath.stem}.{os.getpid()}.tmp.npz")
+        np.savez(temporary, **arrays)
+        os.replace(temporary, filepath)
+    except OSError:
+        # the cache is only an optimisation
+        pass
+
+
+def _load(filepath: Path) -> dict:
+    with np.load(filepath) as data:
+        return {k: data[k] for k in data.files}
+
+
+_catalog = None
+
+
+@_instr.timed("catalog")
+def load_catalog(rebuild: bool = False, jobs: Optional[int] = None) -> Catalog:
+    # The resolved catalog, from the cache if it matches the current catalog, otherwise built (and cached)
+    global _catalog
+    from .pygmentation import all_schemes
+
+    key = catalog_key(all_schemes)
+    if _catalog is not None and not rebuild and str(_catalog.key) == key:
+        _instr.cache("catalog", True)
+        return _catalog
+
+    filepath = cache_dir() / f"catalog-{key}.npz"
+    _instr.cache("catalog", filepath.exists() and not rebuild)
+    if filepath.exists() and not rebuild:
+        _catalog = Catalog(_load(filepath))
+        return _catalog
+
+    _catalog = Catalog(build_catalog(jobs=jobs))
+    _save(filepath, _catalog._arrays)
+    return _catalog
+
+
+# Per-entry features, one column per feature. Each is computed for every entry at once from the catalog arrays.
+FEATURES = {
+    "contrast": "WCAG contrast ratio between the foreground and background (1 to 21)",
+    "fg-bg-delta-e": "ΔE between the foreground and background",
+    "accents": "number of accents",
+    "surfaces": "number of surfaces",
+    "min-accent-delta-e": "smallest ΔE between any two accents",
+    "mean-accent-delta-e": "mean ΔE between pairs of accents",
+    "min-accent-contrast": "smallest ΔE between an accent and the background",
+    "hue-coverage": "fraction of the 12 hue bins (30° each) containing at least one accent",
+    "mean-lightness": "mean L* of the accents",
+    "mean-chroma": "mean chroma of the accents",
+    "background-lightness": "L* of the background",
+}
+HUE_BINS = 12
+# accents with a chroma below this are treated as neutral, and don't count towards any hue bin
+NEUTRAL_CHROMA = 10
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    # WCAG relative luminance of (..., 3) uint8 colours
+    c = rgb / 255
+    c = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    return c @ np.array([0.2126, 0.7152, 0.0722])
+
+
+def build_features(catalog: Catalog) -> dict:
+    E = len(catalog)
+    offsets = catalog.family_offsets[:-1]
+    base_rgb = catalog.rgb[:, 0]
+    base_lab = catalog.lab[:, 0].astype(np.float64)
+    fg, bg = offsets, offsets + 1
+
+    fg_luminance, bg_luminance = relative_luminance(base_rgb[fg]), relative_luminance(base_rgb[bg])
+    contrast = (np.maximum(fg_luminance, bg_luminance) + 0.05) / (np.minimum(fg_luminance, bg_luminance) + 0.05)
+
+    # accents, padded with NaN into an (E, max accents, 3) array
+    is_accent = catalog.roles == ROLES.index("accent")
+    accent_entry = catalog.family_entry[is_accent]
+    accent_count = np.bincount(accent_entry, minlength=E)
+    accents = np.full((E, max(accent_count.max(), 1), 3), np.nan)
+    accents[accent_entry, catalog.role_index[is_accent]] = base_lab[is_accent]
+    valid = ~np.isnan(accents[..., 0])
+
+    pairwise = delta_e_array(accents[:, :, None], accents[:, None, :])
+    pairs = valid[:, :, None] & valid[:, None, :] & np.triu(np.ones(pairwise.shape[1:], dtype=bool), 1)
+    pair_count = pairs.sum(axis=(1, 2))
+    with np.errstate(invalid="ignore"):
+        min_pair = np.where(pair_count > 0, np.where(pairs, pairwise, np.inf).min(axis=(1, 2)), np.nan)
+        mean_pair = np.where(pairs, pairwise, 0).sum(axis=(1, 2)) / pair_count
+    against_background = delta_e_array(accents, base_lab[bg][:, None])
+
+    chroma = np.hypot(accents[..., 1], accents[..., 2])
+    hue = np.nan_to_num(np.degrees(np.arctan2(accents[..., 2], accents[..., 1])) % 360)
+    coloured = valid & (chroma >= NEUTRAL_CHROMA)
+    hue_bin = np.where(coloured, (hue // (360 / HUE_BINS)).astype(np.int64) % HUE_BINS, HUE_BINS)
+    # count per (entry, bin), with the extra bin collecting neutral and padding slots
+    histogram = np.zeros((E, HUE_BINS + 1), dtype=np.int32)
+    np.add.at(histogram, (np.repeat(np.arange(E), hue_bin.shape[1]), hue_bin.ravel()), 1)
+    histogram = histogram[:, :HUE_BINS]
+
+    return {
+        "key": catalog.key,
+        "hue-histogram": histogram,
+        "contrast": contrast,
+        "fg-bg-delta-e": delta_e_array(base_lab[fg], base_lab[bg]),
+        "accents": accent_count,
+        "surfaces": np.bincount(
+            catalog.family_entry[catalog.roles == ROLES.index("surface")], minlength=E
+        ),
+        "min-accent-delta-e": min_pair,
+        "mean-accent-delta-e": mean_pair,
+        "min-accent-contrast": np.where(valid, against_background, np.inf).min(axis=1),
+        "hue-coverage": (histogram > 0).sum(axis=1) / HUE_BINS,
+        "mean-lightness": np.nanmean(accents[..., 0], axis=1),
+        "mean-chroma": np.nanmean(np.where(valid, chroma, np.nan), axis=1),
+        "background-lightness": base_lab[bg, 0],
+    }
+
+
+class FeatureTable:
+    # Columnar per-entry features (rows line up with the catalog's entries), queried with vectorised filters
+
+    def __init__(self, catalog: Catalog, columns: dict):
+        self.catalog = catalog
+        self.columns = columns
+
+    def __getitem__(self, feature: str) -> np.ndarray:
+        if feature not in self.columns:
+            raise ValueError(f"Unknown feature {feature}, must be one of {', '.join(FEATURES)}")
+        return self.columns[feature]
+
+    def query(
+        self,
+        where: List[Tuple[str, str, float]] = (),
+        sort: str = None,
+        descending: bool = True,
+        scheme_type: str = None,
+    ) -> List[int]:
+        # Entries matching every (feature, operator, value) condition in `where`, ordered by `sort` if given
+        # (otherwise by catalog order). Operators are <, <=, >, >=, == and !=.
+        mask = np.ones(len(self.catalog), dtype=bool)
+        if scheme_type is not None:
+            mask &= self.catalog.entry_type == SchemeType[scheme_type.upper()].value
+        for feature, operator, value in where:
+            if operator not in _OPERATORS:
+                raise ValueError(f"Unknown operator {operator}, must be one of {', '.join(_OPERATORS)}")
+            with np.errstate(invalid="ignore"):
+                mask &= _OPERATORS[operator](self[feature], value)
+        entries = np.flatnonzero(mask)
+        if sort is not None:
+            values = self[sort][entries]
+            order = np.argsort(-values if descending else values, kind="stable")
+            entries = entries[order]
+        return entries.tolist()
+
+
+_OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def parse_condition(condition: str) -> Tuple[str, str, float]:
+    # "contrast>=7" -> ("contrast", ">=", 7.0)
+    match = re.fullmatch(r"\s*([a-z\-]+)\s*(<=|>=|==|!=|<|>)\s*([-+0-9.eE]+)\s*", condition)
+    if match is None:
+        raise ValueError(f"Could not parse condition `{condition}`, expected e.g. `contrast>=7`")
+    return match[1], match[2], float(match[3])
+
+
+_features = None
+
+
+@_instr.timed("catalog")
+def load_features(rebuild: bool = False, jobs: Optional[int] = None) -> FeatureTable:
+    # The feature table for the current catalog, from the cache if possible
+    global _features
+    catalog = load_catalog(rebuild, jobs)
+    key = str(catalog.key)
+    if _features is not None and not rebuild and _features.catalog is catalog:
+        _instr.cache("features", True)
+        return _features
+
+    filepath = cache_dir() / f"features-{key}.npz"
+    _instr.cache("features", filepath.exists() and not rebuild)
+    if filepath.exists() and not rebuild:
+        columns = _load(filepath)
+    else:
+        columns = build_features(catalog)
+        _save(filepath, columns)
+    _features = FeatureTable(catalog, columns)
+    return _features
+
+
+# Exporting the catalog as columnar arrays, for analysis outside pygmentation. Unlike the flat arrays of Catalog, each
+# entry gets the same number of families (padded), so that colours can be indexed as [entry, family, variant, channel]:
+# * names: (S,) scheme names; entry_scheme, entry_type: (E,) as in Catalog
+# * rgb: (E, F, 6, 3) uint8 base colour and variants 1 to 5 of each family (padded with 0)
+# * lab: (E, F, 6, 3) float32, the same in LAB (padded with NaN)
+# * roles: (E, F) int8 role of each family, an index into role_names (-1 for padding); role_index: (E, F) its number
+#   within that role
+# * role_offsets: (E, 6) families role_offsets[e, r] to role_offsets[e, r + 1] of entry e have role r, so that e.g. the
+#   accents of entry e are rgb[e, role_offsets[e, 2] : role_offsets[e, 3]]; role_offsets[e, 5] is the number of families
+# * aliases: (E, 8) the family used for each of alias_names; distinct: (E, D) the distinct accents (padded with -1)
+# The file is an uncompressed .npz, so open_export can memory-map every array rather than reading it.
+
+
+def export_arrays(catalog: Catalog, names: List[str] = None, scheme_types: List[str] = ("light", "dark")) -> dict:
+    # The export arrays for the entries of `catalog` with one of `names` (default: all) and `scheme_types`
+    selected = np.isin(catalog.entry_type, [SchemeType[t.upper()].value for t in scheme_types])
+    if names is not None:
+        selected &= np.isin(catalog.names[catalog.entry_scheme], names)
+    entries = np.flatnonzero(selected)
+    schemes, entry_scheme = np.unique(catalog.entry_scheme[entries], return_inverse=True)
+
+    counts = np.diff(catalog.family_offsets)[entries]
+    n_families = int(counts.max(initial=0))
+    # (entry, position) of every family of the selected entries, scattered into the padded arrays in one go
+    family_entry = np.repeat(np.arange(len(entries)), counts)
+    starts = catalog.family_offsets[entries]
+    positions = np.arange(len(family_entry)) - np.repeat(np.cumsum(counts) - counts, counts)
+    families = np.repeat(starts, counts) + positions
+
+    rgb = np.zeros((len(entries), n_families, 6, 3), dtype=np.uint8)
+    rgb[family_entry, positions] = catalog.rgb[families]
+    lab = np.full((len(entries), n_families, 6, 3), np.nan, dtype=np.float32)
+    lab[family_entry, positions] = catalog.lab[families]
+    roles = np.full((len(entries), n_families), -1, dtype=np.int8)
+    roles[family_entry, positions] = catalog.roles[families]
+    role_index = np.zeros((len(entries), n_families), dtype=np.uint16)
+    role_index[family_entry, positions] = catalog.role_index[families]
+
+    # families are ordered by role, so the start of each role is the number of families with an earlier role
+    role_counts = np.zeros((len(entries), len(ROLES)), dtype=np.int32)
+    np.add.at(role_counts, (family_entry, catalog.roles[families]), 1)
+    role_offsets = np.zeros((len(entries), len(ROLES) + 1), dtype=np.int32)
+    np.cumsum(role_counts, axis=1, out=role_offsets[:, 1:])
+
+    distinct_counts = np.diff(catalog.distinct_offsets)[entries]
+    distinct_entry = np.repeat(np.arange(len(entries)), distinct_counts)
+    distinct_positions = np.arange(len(distinct_entry)) - np.repeat(
+        np.cumsum(distinct_counts) - distinct_counts, distinct_counts
+    )
+    distinct = np.full((len(entries), int(distinct_counts.max(initial=0))), -1, dtype=np.int32)
+    distinct[distinct_entry, distinct_positions] = catalog.distinct[
+        np.repeat(catalog.distinct_offsets[entries], distinct_counts) + distinct_positions
+    ]
+
+    return {
+        "names": catalog.names[schemes],
+        "entry_scheme": entry_scheme.astype(np.int32),
+        "entry_type": catalog.entry_type[entries],
+        "role_names": np.array(ROLES),
+        "alias_names": np.array(ALIASES),
+        "rgb": rgb,
+        "lab": lab,
+        "roles": roles,
+        "role_index": role_index,
+        "role_offsets": role_offsets,
+        "aliases": catalog.aliases[entries],
+        "distinct": distinct,
+    }
+
+
+@_instr.timed("export")
+def export_catalog(
+    filepath: str | Path,
+    names: List[str] = None,
+    scheme_types: List[str] = ("light", "dark"),
+    rebuild: bool = False,
+    jobs: Optional[int] = None,
+) -> Path:
+    # Writes the export arrays to `filepath` (an .npz file). The catalog is taken from the cache, or resolved in `jobs`
+    # processes if it isn't cached yet (see load_catalog).
+    filepath = Path(filepath)
+    arrays = export_arrays(load_catalog(rebuild, jobs), names, scheme_types)
+    with _instr.phase("io"):
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        temporary = filepath.with_name(f"{filepath.stem}.{os.getpid()}.tmp.npz")
+        np.savez(temporary, **arrays)
+        os.replace(temporary, filepath)
+    return filepath
+
+
+def open_export(filepath: str | Path, mmap_mode: Optional[str] = "r") -> dict:
+    # The arrays of a file written by export_catalog. np.load can't memory-map the members of an .npz, but as they are
+    # stored uncompressed each one is a .npy file at some offset within the archive, which can be mapped directly.
+    # With mmap_mode=None, the arrays are read into memory instead.
+    import zipfile
+
+    if mmap_mode is None:
+        return _load(Path(filepath))
+    arrays = {}
+    with zipfile.ZipFile(filepath) as archive, open(filepath, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} in {filepath} is compressed, so it can't be memory-mapped")
+            # the data follows the 30 byte local file header, the file name and the extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[info.filename.removesuffix(".npy")] = np.memmap(
+                f,
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+# Sharing the catalog between processes. The arrays are copied once into a single shared memory block, laid out as an
+# 8-byte header length, a JSON header giving the dtype, shape and offset of each array, then the arrays themselves.
+# Other processes map the block and use the arrays in place, so they never load or resolve the catalog themselves.
+
+SHARED_CATALOG_VARIABLE = "PYGMENTATION_SHARED_CATALOG"
+_ALIGNMENT = 64
+_shared = None
+# held while resource_tracker.register is patched out in attach_catalog, as the patch affects every thread
+_register_lock = threading.Lock()
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+class SharedCatalog:
+    # The publishing side of a shared catalog. Keep this alive for as long as workers need the catalog, then call
+    # unlink() (or use it as a context manager) to free the memory.
+
+    def __init__(self, catalog: Catalog, name: str = None):
+        from multiprocessing.shared_memory import SharedMemory
+
+        arrays = {k: np.ascontiguousarray(v) for k, v in catalog._arrays.items()}
+        layout = {}
+        size = 0
+        for key, array in arrays.items():
+            size = _aligned(size)
+            layout[key] = (array.dtype.str, array.shape, size)
+            size += array.nbytes
+        header = json.dumps(layout).encode()
+        start = _aligned(8 + len(header))
+
+        self.catalog = catalog
+        self._memory = SharedMemory(name=name, create=True, size=start + max(size, 1))
+        buffer = self._memory.buf
+        buffer[:8] = len(header).to_bytes(8, "little")
+        buffer[8 : 8 + len(header)] = header
+        for key, array in arrays.items():
+            view = np.ndarray(array.shape, array.dtype, buffer=buffer, offset=start + layout[key][2])
+            view[...] = array
+            del view
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def close(self):
+        self._withdraw()
+        self._memory.close()
+
+    def unlink(self):
+        # frees the shared memory once every process has finished with it
+        self._withdraw()
+        self._memory.close()
+        self._memory.unlink()
+
+    def _withdraw(self):
+        # Stops this process, and any process started from now on, from using the catalog, unless another catalog has
+        # been published since
+        global _shared
+        if os.environ.get(SHARED_CATALOG_VARIABLE, self.name) != self.name:
+            return
+        os.environ.pop(SHARED_CATALOG_VARIABLE, None)
+        if _shared is self.catalog:
+            _shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+
+def publish_catalog(name: str = None, rebuild: bool = False, jobs: Optional[int] = None) -> SharedCatalog:
+    # Copies the resolved catalog into shared memory, and makes it the catalog used by resolve_scheme in this process
+    # and in any process started afterwards (through the PYGMENTATION_SHARED_CATALOG environment variable).
+    global _shared
+    shared = SharedCatalog(load_catalog(rebuild, jobs), name)
+    os.environ[SHARED_CATALOG_VARIABLE] = shared.name
+    _shared = shared.catalog
+    return shared
+
+
+def attach_catalog(name: str = None) -> Catalog:
+    # The catalog published under `name` (default: $PYGMENTATION_SHARED_CATALOG), using the shared memory directly
+    # rather than copying it. The arrays are read-only.
+    global _shared
+    from multiprocessing.shared_memory import SharedMemory
+
+    if name is None:
+        name = os.environ[SHARED_CATALOG_VARIABLE]
+    try:
+        memory = SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching also registers the block with the resource tracker, which would destroy it
+        # when this process exits. Unregistering afterwards doesn't work either, as worker processes share the
+        # publisher's tracker, so registration is skipped instead.
+        from multiprocessing import resource_tracker
+
+        with _register_lock:
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                memory = SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+    buffer = memory.buf
+    length = int.from_bytes(bytes(buffer[:8]), "little")
+    layout = json.loads(bytes(buffer[8 : 8 + length]))
+    start = _aligned(8 + length)
+    arrays = {}
+    for key, (dtype, shape, offset) in layout.items():
+        array = np.ndarray(tuple(shape), np.dtype(dtype), buffer=buffer, offset=start + offset)
+        array.flags.writeable = False
+        arrays[key] = array
+    catalog = Catalog(arrays)
+    # the arrays are views of the shared memory, which must stay mapped for as long as they are in use
+    catalog._memory = memory
+    _shared = catalog
+    return catalog
+
+
+def shared_catalog() -> Optional[Catalog]:
+    # The shared catalog published by (or attached to) this process, attaching on first use if one was published by a
+    # parent process. None if no catalog has been shared.
+    if _shared is None and SHARED_CATALOG_VARIABLE in os.environ:
+        attach_catalog()
+    return _shared
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from io import StringIO
+import json
 
 # ToDo:
 # - Allow for colour dict to specify separate accent or surface colours, as well as specific colours to use as red, orange, etc. (without adding duplicate colours)
@@ -7,12 +8,18 @@ from io import StringIO
 # - ColorScheme should take a dictionary instead of colors, foreground, background, etc. as separate arguments.
 
 from typing import List, Optional, Tuple
+from functools import lru_cache
 import math
+import os
+import threading
+from types import MappingProxyType
 import numpy as np
 from abc import ABC, abstractmethod
 
 from enum import Enum
 
+from . import instrumentation as _instr
+
 # We need to be careful with Enums because by default equality only works with the exact same enum. We want to be able to check with Enums *or* integers, especially in match/case blocks.
 
 
@@ -142,6 +149,9 @@ class ColorModel(ABC):
         pass
 
     def convert_to(self, new_model: str | type[ColorModel]):
+        if _instr.enabled:
+            target = new_model if isinstance(new_model, str) else new_model.__name__
+            _instr.conversion(type(self).__name__.lower(), target.lower())
         if isinstance(new_model, str):
             new_model = new_model.lower()
             if new_model == "rgb":
@@ -204,6 +214,8 @@ class RGB(ColorModel):
 
     @classmethod
     def from_hex(cls, hex: str):
+        if _instr.enabled:
+            _instr.conversion("hex", "rgb")
         return cls(tuple(int(hex.lstrip("#")[i : i + 2], 16) for i in (0, 2, 4)))
 
 
@@ -430,6 +442,211 @@ class LAB(ColorModel):
         return self._c
 
 
+# Vectorised versions of the conversions above, for working with many colours at once.
+# Arrays have a trailing axis of length 3, and the maths matches the single-colour conversions.
+
+_RGB_TO_XYZ = np.array(
+    [
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ]
+)
+
+_XYZ_TO_RGB = np.array(
+    [
+        [3.2406, -1.5372, -0.4986],
+        [-0.9689, 1.8758, 0.0415],
+        [0.0557, -0.2040, 1.0570],
+    ]
+)
+
+
+def hex_to_rgb_array(hexes: List[str]) -> np.ndarray:
+    # hex strings (with or without '#') to an (N, 3) uint8 array. Like RGB.from_hex, only the first 6 digits are read
+    packed = bytes.fromhex("".join(h.lstrip("#")[:6] for h in hexes))
+    if _instr.enabled:
+        _instr.conversion("hex", "rgb", len(packed) // 3)
+    return np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3)
+
+
+def rgb_array_to_hex(rgb: np.ndarray) -> List[str]:
+    # (N, 3) uint8 array to a list of hex strings, without the '#'
+    packed = np.ascontiguousarray(rgb, dtype=np.uint8).tobytes().hex().upper()
+    if _instr.enabled:
+        _instr.conversion("rgb", "hex", len(packed) // 6)
+    return [packed[i : i + 6] for i in range(0, len(packed), 6)]
+
+
+def rgb_to_lab_array(rgb: np.ndarray) -> np.ndarray:
+    # rgb floats in [0, 1] to LAB, via XYZ
+    rgb = np.asarray(rgb, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("rgb", "lab", rgb.size // 3)
+    linear = np.where(
+        rgb <= 0.04045, rgb / 12.92, ((np.maximum(rgb, 0) + 0.055) / 1.055) ** 2.4
+    )
+    xyz = linear @ _RGB_TO_XYZ.T
+    xyz = xyz * 100 / np.array([95.0489, 100, 108.8840])
+    delta = 6 / 29
+    f = np.where(xyz > delta**3, np.cbrt(xyz), xyz / (3 * delta**2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def lab_to_rgb_array(lab: np.ndarray) -> np.ndarray:
+    # LAB to rgb floats, via XYZ. Out of gamut colours are clipped to [0, 1]
+    lab = np.asarray(lab, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("lab", "rgb", lab.size // 3)
+    y = (lab[..., 0] + 16) / 116
+    fxyz = np.stack((lab[..., 1] / 500 + y, y, y - lab[..., 2] / 200), axis=-1)
+    xyz = np.where(fxyz > 6 / 29, fxyz**3, (fxyz - 4 / 29) / 7.787)
+    xyz = xyz * np.array([0.95047, 1, 1.08883])
+    linear = np.maximum(xyz @ _XYZ_TO_RGB.T, 0)
+    rgb = np.where(
+        linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055
+    )
+    return np.clip(rgb, 0, 1)
+
+
+def _hue_array(rgb: np.ndarray, cmax: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    # hue in degrees, as in HSL.from_full_rgb and HSV.from_full_rgb (0 for greys)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h = np.where(
+            cmax == r,
+            ((g - b) / delta) % 6,
+            np.where(cmax == g, (b - r) / delta + 2, (r - g) / delta + 4),
+        )
+    return np.where(delta == 0, 0, 60 * h)
+
+
+def _rgb_from_hue_array(h: np.ndarray, c: np.ndarray, m: np.ndarray) -> np.ndarray:
+    # rgb from hue, chroma and the offset m, as in HSL.to_full_rgb and HSV.to_full_rgb
+    h = h % 360
+    x = c * (1 - np.abs((h / 60) % 2 - 1))
+    zero = np.zeros_like(c)
+    sector = np.minimum((h // 60).astype(int), 5)
+    r = np.choose(sector, (c, x, zero, zero, x, c))
+    g = np.choose(sector, (x, c, c, x, zero, zero))
+    b = np.choose(sector, (zero, zero, x, c, c, x))
+    return np.stack((r, g, b), axis=-1) + m[..., None]
+
+
+def rgb_to_hsl_array(rgb: np.ndarray) -> np.ndarray:
+    # rgb floats in [0, 1] to HSL, with hue in degrees and saturation and lightness in [0, 1]
+    rgb = np.asarray(rgb, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("rgb", "hsl", rgb.size // 3)
+    cmax, cmin = rgb.max(axis=-1), rgb.min(axis=-1)
+    delta = cmax - cmin
+    l = (cmax + cmin) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(delta == 0, 0, delta / (1 - np.abs(2 * l - 1)))
+    return np.stack((_hue_array(rgb, cmax, delta), s, l), axis=-1)
+
+
+def hsl_to_rgb_array(hsl: np.ndarray) -> np.ndarray:
+    hsl = np.asarray(hsl, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("hsl", "rgb", hsl.size // 3)
+    h, s, l = hsl[..., 0], hsl[..., 1], hsl[..., 2]
+    c = (1 - np.abs(2 * l - 1)) * s
+    return _rgb_from_hue_array(h, c, l - c / 2)
+
+
+def rgb_to_hsv_array(rgb: np.ndarray) -> np.ndarray:
+    # rgb floats in [0, 1] to HSV, with hue in degrees and saturation and value in [0, 1]
+    rgb = np.asarray(rgb, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("rgb", "hsv", rgb.size // 3)
+    cmax, cmin = rgb.max(axis=-1), rgb.min(axis=-1)
+    delta = cmax - cmin
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(cmax == 0, 0, delta / cmax)
+    return np.stack((_hue_array(rgb, cmax, delta), s, cmax), axis=-1)
+
+
+def hsv_to_rgb_array(hsv: np.ndarray) -> np.ndarray:
+    hsv = np.asarray(hsv, dtype=float)
+    if _instr.enabled:
+        _instr.conversion("hsv", "rgb", hsv.size // 3)
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    c = v * s
+    return _rgb_from_hue_array(h, c, v - c)
+
+
+def delta_e_array(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    # CIEDE2000 distance between arrays of LAB colours, broadcasting as usual. Matches Color.distance_to
+    lab1 = np.asarray(lab1, dtype=float)
+    lab2 = np.asarray(lab2, dtype=float)
+    l1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    l2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+    if _instr.enabled:
+        _instr.count("delta_e", np.broadcast(l1, l2).size)
+
+    avgL = (l1 + l2) / 2
+    c1 = np.hypot(a1, b1)
+    c2 = np.hypot(a2, b2)
+    avgC = (c1 + c2) / 2
+    g = (1 - np.sqrt(avgC**7 / (avgC**7 + 25**7))) / 2
+
+    a1p = a1 * (1 + g)
+    a2p = a2 * (1 + g)
+    c1p = np.hypot(a1p, b1)
+    c2p = np.hypot(a2p, b2)
+    avgCp = (c1p + c2p) / 2
+
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    avgHp = np.where(np.abs(h1p - h2p) > 180, (h1p + h2p + 360) / 2, (h1p + h2p) / 2)
+
+    t = (
+        1
+        - 0.17 * np.cos(np.radians(avgHp - 30))
+        + 0.24 * np.cos(np.radians(2 * avgHp))
+        + 0.32 * np.cos(np.radians(3 * avgHp + 6))
+        - 0.2 * np.cos(np.radians(4 * avgHp - 63))
+    )
+
+    deltaHp = h2p - h1p
+    deltaHp = np.where(
+        np.abs(deltaHp) > 180,
+        np.where(h2p <= h1p, deltaHp + 360, deltaHp - 360),
+        deltaHp,
+    )
+    deltaLp = l2 - l1
+    deltaCp = c2p - c1p
+    deltaHp = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(deltaHp) / 2)
+
+    sL = 1 + ((0.015 * (avgL - 50) ** 2) / np.sqrt(20 + (avgL - 50) ** 2))
+    sC = 1 + 0.045 * avgCp
+    sH = 1 + 0.015 * avgCp * t
+
+    deltaRho = 30 * np.exp(-(((avgHp - 275) / 25) ** 2))
+    rc = 2 * np.sqrt((avgCp**7) / (avgCp**7 + 25**7))
+    rt = -rc * np.sin(2 * np.radians(deltaRho))
+
+    return np.sqrt(
+        np.maximum(
+            (deltaLp / sL) ** 2
+            + (deltaCp / sC) ** 2
+            + (deltaHp / sH) ** 2
+            + rt * (deltaCp / sC) * (deltaHp / sH),
+            0,
+        )
+    )
+
+
+def color_lab_array(colors: List[Color]) -> np.ndarray:
+    # (N, 3) LAB array for a list of Color objects
+    return rgb_to_lab_array(hex_to_rgb_array([c.hex for c in colors]) / 255)
+
+
 class Color:
     """
     A class to represent a color, with methods to convert between color spaces.
@@ -441,6 +658,9 @@ class Color:
     * lab: a tuple of 3 floats, l: 0-100, a and b unbounded
     """
 
+    # frozen colours can't be modified (see freeze)
+    _frozen = False
+
     def __init__(self, hex: str, name: str = None):
         if hex[0] == "#":
             hex = hex[1:]
@@ -448,7 +668,22 @@ class Color:
         self._name = name
         self.clear_cache()
 
+    def freeze(self) -> Color:
+        # Makes the colour read-only, so it can be shared between threads. The colour models are still converted
+        # lazily: two threads converting at once both compute and store the same value, so no lock is needed.
+        self._frozen = True
+        return self
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    def _check_frozen(self):
+        if self._frozen:
+            raise AttributeError(f"Cannot modify frozen colour #{self._hex}")
+
     def clear_cache(self):
+        self._check_frozen()
         self._rgb = None
         self._hsl = None
         self._hsv = None
@@ -473,6 +708,7 @@ class Color:
 
     @hex.setter
     def hex(self, value: str):
+        self._check_frozen()
         self._hex = value
         self.clear_cache()
 
@@ -482,6 +718,7 @@ class Color:
 
     @name.setter
     def name(self, value: str):
+        self._check_frozen()
         self._name = value
 
     @property
@@ -492,6 +729,7 @@ class Color:
 
     @rgb.setter
     def rgb(self, value: tuple | RGB):
+        self._check_frozen()
         if isinstance(value, tuple) or isinstance(value, list):
             value = RGB(*value)
         self._hex = value.convert_to("hex")
@@ -505,6 +743,7 @@ class Color:
 
     @hsl.setter
     def hsl(self, value: tuple | HSL):
+        self._check_frozen()
         if isinstance(value, tuple) or isinstance(value, list):
             value = HSL(*value)
         self._hex = value.convert_to("hex")
@@ -518,6 +757,7 @@ class Color:
 
     @hsv.setter
     def hsv(self, value: tuple | HSV):
+        self._check_frozen()
         if isinstance(value, tuple) or isinstance(value, list):
             value = HSV(*value)
         self._hex = value.convert_to("hex")
@@ -531,6 +771,7 @@ class Color:
 
     @xyz.setter
     def xyz(self, value: tuple | XYZ):
+        self._check_frozen()
         if isinstance(value, tuple) or isinstance(value, list):
             value = XYZ(*value)
         self._hex = value.convert_to("hex")
@@ -544,6 +785,7 @@ class Color:
 
     @lab.setter
     def lab(self, value: tuple | LAB):
+        self._check_frozen()
         if isinstance(value, tuple) or isinstance(value, list):
             value = LAB(*value)
         self._hex = value.convert_to("hex")
@@ -749,6 +991,8 @@ class Color:
         def rad_to_deg(rad):
             return rad * 180 / math.pi
 
+        if _instr.enabled:
+            _instr.count("delta_e")
         lab1 = self.lab
         lab2 = other.lab
 
@@ -828,6 +1072,27 @@ class Color:
     def __hash__(self):
         return hash(self.hex)
 
+    def __reduce__(self):
+        # only the hex code and name are pickled; the colour models are recomputed when needed
+        return (_unpack_color, (self._hex, self._name, self._frozen))
+
+
+def _unpack_color(hex: str, name: str, frozen: bool) -> Color:
+    color = Color(hex, name)
+    return color.freeze() if frozen else color
+
+
+def _pack_colors(colors: List[Color]) -> Tuple[bytes, int]:
+    # Colours as 3 bytes each, and a mask with bit i set if colour i was given in lower case, so that hex codes round
+    # trip exactly
+    packed = hex_to_rgb_array([c.hex for c in colors]).tobytes()
+    return packed, sum(1 << i for i, c in enumerate(colors) if c.hex.islower())
+
+
+def _unpack_colors(packed: bytes, lowercase: int) -> List[Color]:
+    hexes = rgb_array_to_hex(np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3))
+    return [Color(h.lower() if lowercase >> i & 1 else h) for i, h in enumerate(hexes)]
+
 
 class SchemeType(EnumEx):
     EMPTY = 0
@@ -837,6 +1102,8 @@ class SchemeType(EnumEx):
 
 class ColorFamily:
 
+    _frozen = False
+
     def __init__(
         self,
         base: Color | str,
@@ -875,6 +1142,9 @@ class ColorFamily:
         self._scheme_type = scheme_type
         self._name = name
 
+        if _instr.enabled:
+            _instr.count("families")
+        started = _instr.start()
         use_dark = False  # If True we'll use the light color as a target when lightening, otherwise we'll only change hsl.l
         use_light = False  # If True we'll use the dark color as a target when darkening, otherwise we'll only change hsl.l
 
@@ -933,9 +1203,41 @@ class ColorFamily:
                     )
             else:
                 self.variants.append(self._base)
+        _instr.stop("variants", started)
 
         self._default = self._base
 
+    @classmethod
+    def _from_colors(cls, colors: List[Color], scheme_type: SchemeType, name=None) -> ColorFamily:
+        # Rebuilds a family from its base, 5 variants, light and dark colours, without recomputing the variants
+        family = cls.__new__(cls)
+        family._base, family._light, family._dark = colors[0], colors[6], colors[7]
+        family.variants = list(colors[1:6])
+        family._scheme_type = scheme_type
+        family._name = name
+        family._default = family._base
+        return family
+
+    def _colors(self) -> List[Color]:
+        # the colours needed to rebuild the family with _from_colors
+        return [self._base, *self.variants, self._light, self._dark]
+
+    def freeze(self) -> ColorFamily:
+        # Freezes every colour in the family, and makes the variants a tuple so that they can't be replaced
+        for color in self._colors():
+            color.freeze()
+        self.variants = tuple(self.variants)
+        self._frozen = True
+        return self
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    def __reduce__(self):
+        # pickled as its 8 colours packed into bytes, rebuilt without recomputing the variants
+        return (_unpack_family, (self._scheme_type.value, *_pack_colors(self._colors()), self._name, self._frozen))
+
     def __getitem__(self, index):
         if index == 0:
             return self._base
@@ -949,6 +1251,10 @@ class ColorFamily:
     def default(self):
         return self._default
 
+    @property
+    def name(self):
+        return self._name
+
     @property
     def _1(self):
         return self.variants[0]
@@ -1109,6 +1415,11 @@ def clamp(val, min_val, max_val):
     return max(min(val, max_val), min_val)
 
 
+def _unpack_family(scheme_type, packed: bytes, lowercase: int, name, frozen: bool) -> ColorFamily:
+    family = ColorFamily._from_colors(_unpack_colors(packed, lowercase), SchemeType(scheme_type), name)
+    return family.freeze() if frozen else family
+
+
 def generate_auto_surfaces(foreground: ColorFamily, background: ColorFamily, scheme_type: SchemeType) -> List[ColorFamily]:
     # dark_scheme = scheme_type == SchemeType.DARK
     # dark = background if dark_scheme else foreground
@@ -1183,6 +1494,136 @@ def generate_auto_surfaces(foreground: ColorFamily, background: ColorFamily, sch
     new_colors.sort(key=lambda c: c.base.l, reverse=scheme_type == SchemeType.DARK)
     return new_colors
 
+
+def _lab_positions(lab: np.ndarray) -> np.ndarray:
+    # positions in [0, 1] for each anchor, spaced by the LAB distance between neighbouring anchors
+    steps = np.linalg.norm(np.diff(lab, axis=0), axis=1)
+    if steps.sum() == 0:
+        return np.linspace(0, 1, len(lab))
+    return np.concatenate(([0], np.cumsum(steps))) / steps.sum()
+
+
+@lru_cache(maxsize=256)
+def _lab_lut(anchors: Tuple[str, ...], N: int, pivot: int = None) -> np.ndarray:
+    # Interpolates between the anchor colours (hex strings) in LAB space, giving an (N, 3) array of rgb floats.
+    # Anchors are spaced by their LAB distance from one another, so that each step is roughly the same perceptual size.
+    # If pivot is given, that anchor is placed exactly in the middle (for diverging colormaps).
+    lab = rgb_to_lab_array(hex_to_rgb_array(anchors) / 255)
+    if pivot is None:
+        positions = _lab_positions(lab)
+    else:
+        positions = np.concatenate(
+            (
+                _lab_positions(lab[: pivot + 1]) / 2,
+                0.5 + _lab_positions(lab[pivot:])[1:] / 2,
+            )
+        )
+    x = np.linspace(0, 1, N)
+    interpolated = np.stack(
+        [np.interp(x, positions, lab[:, i]) for i in range(3)], axis=-1
+    )
+    lut = lab_to_rgb_array(interpolated)
+    lut.setflags(write=False)
+    return lut
+
+
+def _as_lab(colors, space: str = None) -> np.ndarray:
+    # Accepts a Color, a hex string, a list of either, or an array of LAB (space="lab") or 0-255 RGB (space="rgb")
+    # values. uint8 arrays are assumed to be RGB unless told otherwise.
+    if isinstance(colors, (Color, str)):
+        colors = [colors]
+    if isinstance(colors, np.ndarray):
+        if space is None:
+            space = "rgb" if colors.dtype == np.uint8 else "lab"
+        if space.lower() == "rgb":
+            return rgb_to_lab_array(colors / 255)
+        if space.lower() == "lab":
+            return colors.astype(float)
+        raise ValueError(f"Unknown colour space '{space}'. Must be 'rgb' or 'lab'")
+    return color_lab_array([Color(c) if isinstance(c, str) else c for c in colors])
+
+
+class ColorIndex:
+    """
+    An index of colours in LAB space, for finding the closest colours to many query colours at once.
+    Each query is first narrowed down to the `candidates` closest colours by straight-line (CIE76) distance,
+    which is computed for a whole batch at once as a matrix product, and then the candidates are ranked by CIEDE2000.
+    With `candidates=None`, every colour is a candidate and the results are exact.
+    * lab: an (N, 3) array of LAB colours
+    * labels: one label per colour, returned by `nearest` (default: the index of the colour)
+    """
+
+    def __init__(self, lab: np.ndarray, labels: list = None, candidates: Optional[int] = 32):
+        self._lab = np.ascontiguousarray(lab, dtype=float).reshape(-1, 3)
+        self._norms = (self._lab**2).sum(axis=1)
+        self._labels = list(labels) if labels is not None else list(range(len(self._lab)))
+        self._candidates = candidates
+
+    @classmethod
+    def from_colors(cls, colors: List[Color], labels: list = None, candidates: Optional[int] = 32):
+        return cls(_as_lab(colors), labels if labels is not None else list(colors), candidates)
+
+    @classmethod
+    def from_schemes(cls, schemes, variants: bool = False, candidates: Optional[int] = 32):
+        # One index over many schemes, from (name, ColorScheme) pairs.
+        # Labels are (name, family, variant) tuples, where variant is 0 for the base colour.
+        colors = []
+        labels = []
+        for name, scheme in schemes:
+            for family in scheme.colors:
+                for i in range(6 if variants else 1):
+                    colors.append(family[i])
+                    labels.append((name, family, i))
+        return cls(_as_lab(colors), labels, candidates)
+
+    def __len__(self):
+        return len(self._lab)
+
+    @property
+    def labels(self):
+        return self._labels
+
+    def query(self, colors, k: int = 1, space: str = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns the indices of, and CIEDE2000 distances to, the k closest colours for each query colour,
+        # as two (M, k) arrays, closest first. Ties go to the colour that was added to the index first.
+        lab = _as_lab(colors, space).reshape(-1, 3)
+        n = len(self._lab)
+        k = min(k, n)
+        m = n if self._candidates is None else min(max(self._candidates, k), n)
+        indices = np.empty((len(lab), k), dtype=np.intp)
+        distances = np.empty((len(lab), k))
+        # keep the (chunk, n) distance matrix to a few million entries
+        chunk_size = max(1, (1 << 22) // n)
+        for start in range(0, len(lab), chunk_size):
+            chunk = lab[start : start + chunk_size]
+            if m < n:
+                squared = (
+                    (chunk**2).sum(axis=1)[:, None]
+                    - 2 * chunk @ self._lab.T
+                    + self._norms[None, :]
+                )
+                candidates = np.sort(np.argpartition(squared, m - 1, axis=1)[:, :m], axis=1)
+            else:
+                candidates = np.broadcast_to(np.arange(n), (len(chunk), n))
+            exact = delta_e_array(chunk[:, None, :], self._lab[candidates])
+            best = np.argsort(exact, axis=1, kind="stable")[:, :k]
+            indices[start : start + len(chunk)] = np.take_along_axis(candidates, best, axis=1)
+            distances[start : start + len(chunk)] = np.take_along_axis(exact, best, axis=1)
+        return indices, distances
+
+    def nearest(self, colors, space: str = None) -> list:
+        # The label of the closest colour to each query colour
+        indices, _ = self.query(colors, 1, space)
+        return [self._labels[i] for i in indices[:, 0]]
+
+
+def _nearest_codes(index: ColorIndex, codes: np.ndarray) -> np.ndarray:
+    # The index of the closest colour in `index` to each 24-bit colour code (0xRRGGBB)
+    rgb = np.stack(((codes >> 16) & 0xFF, (codes >> 8) & 0xFF, codes & 0xFF), axis=-1).astype(np.uint8)
+    indices, _ = index.query(rgb, 1, space="rgb")
+    return indices[:, 0]
+
+
 class ColorScheme:
 
     similarity_vals = {"light": {"s": 1, "l": 0.37}, "dark": {"s": 0.67, "l": 0.5}}
@@ -1218,6 +1659,10 @@ class ColorScheme:
         self._colors = None
         self._presets = {}
         self._distinct = None
+        self._categorical = {}
+        self._indexes = {}
+        # guards the caches that are still filled lazily once the scheme is frozen
+        self._lock = threading.Lock()
 
         if isinstance(scheme_type, str):
             if scheme_type.lower() == "light":
@@ -1301,6 +1746,7 @@ class ColorScheme:
         else:
             surfaces = None
 
+        started = _instr.start()
         # start by getting foreground and background.
         if "foreground" in scheme and scheme["foreground"] is not None:
             foreground = Color(scheme["foreground"])
@@ -1344,6 +1790,7 @@ class ColorScheme:
                     self._surfaces.append(color)
                 else:
                     self._accents.append(color)
+        _instr.stop("classification", started)
 
         for i, color in enumerate(self._surfaces):
             self._surfaces[i] = ColorFamily(
@@ -1361,6 +1808,7 @@ class ColorScheme:
             )
 
         # Handle presets
+        started = _instr.start()
         for name in [
             "red",
             "orange",
@@ -1387,6 +1835,7 @@ class ColorScheme:
                         ColorFamily(c_hex, foreground, background, self._scheme_type)
                     )
                     self._presets[name] = self._accents[-1]
+        _instr.stop("aliases", started)
 
         # TODO: set defaults for accents if the base is not appropriate
 
@@ -1440,6 +1889,81 @@ class ColorScheme:
             background, foreground, background, self._scheme_type
         )
 
+    # Frozen schemes
+
+    _frozen = False
+    _ALIASES = ("red", "orange", "yellow", "green", "cyan", "blue", "purple", "magenta")
+
+    def freeze(self) -> ColorScheme:
+        # Computes every lazy field (colours, aliases and distinct colours) and freezes every colour, so that the
+        # scheme can be cached and shared between threads. Frozen schemes are hashable and compare equal by content.
+        # Returns the scheme itself.
+        if self._frozen or self._scheme_type == SchemeType.EMPTY:
+            return self
+        self.colors
+        for name in self._ALIASES:
+            getattr(self, name)
+        self.distinct
+        for family in self._families():
+            family.freeze()
+        self._seal()
+        self._key = self._content()[:5]
+        self._frozen = True
+        return self
+
+    def _seal(self):
+        # replaces the lists and dicts of a frozen scheme with tuples and read-only mappings, so that nothing can change
+        # a scheme that is shared between threads or used as a cache key
+        self._accents = tuple(self._accents)
+        self._surfaces = tuple(self._surfaces)
+        self._auto_surfaces = tuple(self._auto_surfaces)
+        self._colors = (self._foreground, self._background, *self._accents, *self._surfaces)
+        self._presets = MappingProxyType(dict(self._presets))
+        self._distinct = tuple(self._distinct)
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    def _families(self) -> List[ColorFamily]:
+        return [self._foreground, self._background, *self._accents, *self._surfaces, *self._auto_surfaces]
+
+    def _content(self) -> tuple:
+        # Everything needed to rebuild the scheme, with the colours packed 3 bytes each (8 per family: the base, the 5
+        # variants, and the light and dark colours). Aliases and distinct colours are stored as family indices.
+        families = self._families()
+        index = {id(f): i for i, f in enumerate(families)}
+        packed, lowercase = _pack_colors([c for f in families for c in f._colors()])
+        names = tuple(f.name for f in families)
+        return (
+            self._scheme_type.value,
+            (len(self._accents), len(self._surfaces), len(self._auto_surfaces)),
+            packed,
+            tuple(sorted((name, index[id(f)]) for name, f in self._presets.items())),
+            None if self._distinct is None else tuple(index[id(f)] for f in self._distinct),
+            lowercase,
+            names if any(n is not None for n in names) else None,
+            self._frozen,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, ColorScheme):
+            return NotImplemented
+        if self is other:
+            return True
+        return self._frozen and other._frozen and self._key == other._key
+
+    def __hash__(self):
+        # by content once frozen, otherwise by identity (as the contents can still change)
+        if self._frozen:
+            return hash(self._key)
+        return object.__hash__(self)
+
+    def __reduce__(self):
+        if self._scheme_type == SchemeType.EMPTY:
+            return (ColorScheme._empty, ())
+        return (_unpack_scheme, self._content())
+
     @property
     def accents(self):
         return self._accents
@@ -1463,9 +1987,7 @@ class ColorScheme:
     @property
     def colors(self):
         if self._colors is None:
-            self._colors = (
-                [self._foreground, self._background] + self._accents + self._surfaces
-            )
+            self._colors = [self._foreground, self._background, *self._accents, *self._surfaces]
         return self._colors
 
     def __getitem__(self, index):
@@ -1507,12 +2029,120 @@ class ColorScheme:
     ) -> ColorFamily:
         if isinstance(color, str):
             color = Color(color)
+        if _instr.enabled:
+            _instr.count("closest_color")
 
         # use Color.distance_to() to find the closest color
+        # (for many colours at once, get_closest_colors is much faster)
         if accents_only:
             return min(self.accents, key=lambda c: c.base.distance_to(color))
         return min(self.colors, key=lambda c: c.base.distance_to(color))
 
+    def get_closest_colors(
+        self, colors, accents_only: bool = False, variants: bool = False, space: str = None
+    ) -> list:
+        # Batch version of get_closest_color, for a list of colours or an array of LAB or 0-255 RGB values.
+        # If variants is True, the variants are searched as well, and the closest Color is returned instead of its ColorFamily.
+        if _instr.enabled:
+            _instr.count("closest_color", 1 if isinstance(colors, (str, Color)) else len(colors))
+        labels = self.color_index(variants=variants, accents_only=accents_only).nearest(colors, space)
+        if variants:
+            return [family[i] for family, i in labels]
+        return [family for family, _ in labels]
+
+    def color_index(self, variants: bool = False, accents_only: bool = False) -> ColorIndex:
+        # A ColorIndex over the base colours (and optionally the variants) of the scheme, built once and cached.
+        # Labels are (family, variant) pairs, where variant is 0 for the base colour.
+        key = (variants, accents_only)
+        with self._lock:
+            _instr.cache("color_index", key in self._indexes)
+            if key not in self._indexes:
+                families = self.accents if accents_only else self.colors
+                colors = []
+                labels = []
+                for family in families:
+                    for i in range(6 if variants else 1):
+                        colors.append(family[i])
+                        labels.append((family, i))
+                # without variants, schemes are small enough that every colour can be checked exactly,
+                # which keeps the results identical to get_closest_color
+                self._indexes[key] = ColorIndex.from_colors(
+                    colors, labels, candidates=32 if variants else None
+                )
+            return self._indexes[key]
+
+    @_instr.timed("recolor")
+    def recolor_array(
+        self,
+        image: np.ndarray,
+        variants: bool = True,
+        accents_only: bool = False,
+        out: np.ndarray = None,
+        chunk_rows: int = None,
+        jobs: int = None,
+    ) -> np.ndarray:
+        # Maps every pixel of an (H, W, 3) or (H, W, 4) image to the closest colour of the scheme by CIEDE2000, as
+        # get_closest_colors does (including the variants unless variants=False). Alpha is left as it is.
+        # uint8 images give uint8 results; float images (0 to 1) give float results.
+        # The image is processed `chunk_rows` rows at a time (by default, about a million pixels), spread over `jobs`
+        # threads (default: one per CPU), so that apart from `out` the memory used doesn't grow with the image size.
+        # Each distinct colour is only looked up once: small images look up their distinct colours directly, and
+        # larger ones fill in a lookup table of every 24-bit colour as new colours are found.
+        # `out` may be the image itself, to recolour it in place.
+        image = np.asarray(image)
+        if image.ndim != 3 or image.shape[2] not in (3, 4):
+            raise ValueError(f"Image must have shape (H, W, 3) or (H, W, 4), not {image.shape}")
+        if out is None:
+            out = np.empty_like(image)
+        elif out.shape != image.shape:
+            raise ValueError(f"out has shape {out.shape}, but the image has shape {image.shape}")
+        index = self.color_index(variants=variants, accents_only=accents_only)
+        palette = hex_to_rgb_array([family[i].hex for family, i in index.labels])
+        if image.dtype != np.uint8:
+            palette = palette / 255
+
+        height, width = image.shape[:2]
+        if chunk_rows is None:
+            chunk_rows = max(1, (1 << 20) // max(width, 1))
+        # the lookup table takes 32MB, so small images look up their distinct colours with np.unique instead
+        lut = np.full(1 << 24, -1, dtype=np.int16) if height * width > (1 << 20) else None
+
+        def recolor_rows(start: int):
+            rows = image[start : start + chunk_rows]
+            if rows.dtype != np.uint8:
+                rows = np.round(np.clip(rows, 0, 1) * 255).astype(np.uint8)
+            rgb = rows[..., :3].reshape(-1, 3).astype(np.uint32)
+            codes = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+            if lut is None:
+                unique, inverse = np.unique(codes, return_inverse=True)
+                labels = _nearest_codes(index, unique)[inverse]
+            else:
+                labels = lut[codes]
+                missing = labels < 0
+                if missing.any():
+                    # other threads may look up the same colours at the same time, but they'll write the same labels
+                    unique = np.unique(codes[missing])
+                    lut[unique] = _nearest_codes(index, unique)
+                    labels = lut[codes]
+            out[start : start + chunk_rows, :, :3] = palette[labels].reshape(rows.shape[:2] + (3,))
+            if image.shape[2] == 4 and out is not image:
+                out[start : start + chunk_rows, :, 3] = image[start : start + chunk_rows, :, 3]
+
+        starts = range(0, height, chunk_rows)
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        if jobs <= 1 or len(starts) <= 1:
+            for start in starts:
+                recolor_rows(start)
+        else:
+            # numpy releases the GIL for most of the work, so threads are enough
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(min(jobs, len(starts))) as pool:
+                for _ in pool.map(recolor_rows, starts):
+                    pass
+        return out
+
     # hues:
     # * red: 0
     # * orange: 30
@@ -1523,157 +2153,50 @@ class ColorScheme:
     # * purple: 270
     # * magenta: 300
 
+    def _alias(self, name: str, hue: float) -> ColorFamily:
+        # the accent closest to a colour of the given hue, at the saturation and lightness of similarity_vals, chosen on
+        # first use unless the scheme names it. Frozen schemes have every alias already, so nothing is written to them.
+        preset = self._presets.get(name)
+        if preset is None:
+            started = _instr.start()
+            values = ColorScheme.similarity_vals[self._scheme_type.name.lower()]
+            preset = self.get_closest_color(Color.from_hsl((hue, values["s"], values["l"])), accents_only=True)
+            if not self._frozen:
+                self._presets[name] = preset
+            _instr.stop("aliases", started)
+        return preset
+
     @property
     def red(self):
-        if "red" not in self._presets:
-            self._presets["red"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        0,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["red"]
+        return self._alias("red", 0)
 
     @property
     def orange(self):
-        if "orange" not in self._presets:
-            self._presets["orange"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        30,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["orange"]
+        return self._alias("orange", 30)
 
     @property
     def yellow(self):
-        if "yellow" not in self._presets:
-            self._presets["yellow"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        50,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["yellow"]
+        return self._alias("yellow", 50)
 
     @property
     def green(self):
-        if "green" not in self._presets:
-            self._presets["green"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        120,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["green"]
+        return self._alias("green", 120)
 
     @property
     def cyan(self):
-        if "cyan" not in self._presets:
-            self._presets["cyan"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        180,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["cyan"]
+        return self._alias("cyan", 180)
 
     @property
     def blue(self):
-        if "blue" not in self._presets:
-            self._presets["blue"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        220,  # Err towards cyan instead of purple
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["blue"]
+        return self._alias("blue", 220)  # Err towards cyan instead of purple
 
     @property
     def purple(self):
-        if "purple" not in self._presets:
-            self._presets["purple"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        270,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["purple"]
+        return self._alias("purple", 270)
 
     @property
     def magenta(self):
-        if "magenta" not in self._presets:
-            self._presets["magenta"] = self.get_closest_color(
-                Color.from_hsl(
-                    (
-                        300,
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "s"
-                        ],
-                        ColorScheme.similarity_vals[self._scheme_type.name.lower()][
-                            "l"
-                        ],
-                    )
-                ),
-                accents_only=True,
-            )
-        return self._presets["magenta"]
+        return self._alias("magenta", 300)
 
     @property
     def info(self):
@@ -1697,6 +2220,7 @@ class ColorScheme:
     @property
     def distinct(self):
         if self._distinct is None:
+            started = _instr.start()
             # we need to work out an optimal set of colors such that no two colors are too similar
             # We'll only take colours from self._accents, as surfaces will be intentionally similar
             # we can do this by using a greedy algorithm
@@ -1733,9 +2257,57 @@ class ColorScheme:
             distinct_colors = [c for c in self._accents if c in distinct_colors]
 
             self._distinct = distinct_colors
+            _instr.stop("distinct", started)
 
         return self._distinct
 
+    def _categorical_order(self, min_contrast: float) -> List[Color]:
+        # Orders every accent colour and variant so that each prefix is as spread out as possible (greedy max-min
+        # dispersion, a.k.a. farthest-point sampling), starting from the distinct colours so that the first few
+        # match the default matplotlib cycler.
+        pool = []
+        seen = set()
+        for family in self._accents:
+            for i in range(6):
+                if family[i].hex not in seen:
+                    seen.add(family[i].hex)
+                    pool.append(family[i])
+        lab = color_lab_array(pool)
+
+        # colours too close to the background won't be visible, so drop them (unless that would leave nothing)
+        contrast = delta_e_array(lab, color_lab_array([self.background.base]))
+        visible = contrast >= min_contrast
+        if visible.any():
+            pool = [c for c, keep in zip(pool, visible) if keep]
+            lab = lab[visible]
+
+        distances = delta_e_array(lab[:, None, :], lab[None, :, :])
+        index = {c.hex: i for i, c in enumerate(pool)}
+        order = [index[c.base.hex] for c in self.distinct if c.base.hex in index]
+        if len(order) == 0:
+            order = [int(np.argmax(contrast[visible] if visible.any() else contrast))]
+
+        nearest = distances[order].min(axis=0)
+        nearest[order] = -1
+        while len(order) < len(pool):
+            next_index = int(np.argmax(nearest))
+            order.append(next_index)
+            nearest = np.minimum(nearest, distances[next_index])
+            nearest[order] = -1
+        return [pool[i] for i in order]
+
+    def categorical(self, n: int, min_contrast: float = 20) -> List[Color]:
+        # Returns n colours for categorical data, chosen from every accent colour and variant to be as far apart from
+        # one another as possible (by CIEDE2000), while staying at least `min_contrast` away from the background.
+        # Results are memoised, and categorical(n) is always the start of categorical(n + 1).
+        # If n is larger than the number of available colours, the colours are repeated.
+        with self._lock:
+            _instr.cache("categorical", min_contrast in self._categorical)
+            if min_contrast not in self._categorical:
+                self._categorical[min_contrast] = self._categorical_order(min_contrast)
+            order = self._categorical[min_contrast]
+        return [order[i % len(order)] for i in range(n)]
+
     def _get_internal_color_index(self, color, css=False):
         if isinstance(color, Color):
             for i, c in enumerate(self._accents):
@@ -1778,6 +2350,7 @@ class ColorScheme:
                     return i, "Surface"
             return None, None
 
+    @_instr.timed("export")
     def to_latex(self):
         out_string = []
         out_string += self.foreground.to_latex("ForegroundColour").splitlines()
@@ -1835,6 +2408,7 @@ class ColorScheme:
     def _empty():
         return ColorScheme({}, scheme_type=SchemeType.EMPTY)
 
+    @_instr.timed("export")
     def to_css(self):
         out_string = []
         out_string += [":root {"]
@@ -1897,6 +2471,7 @@ class ColorScheme:
         out_string += ["}"]
         return "\n".join(out_string)
 
+    @_instr.timed("export")
     def to_textual(self):
         out_string = []
         out_string += self.foreground.to_textual("foreground").splitlines()
@@ -1945,6 +2520,7 @@ class ColorScheme:
 
         return "\n".join(out_string)
         
+    @_instr.timed("export")
     def to_less(self) -> str:
         out_string = []
         out_string += self.foreground.to_less("foreground").splitlines()
@@ -1992,6 +2568,7 @@ class ColorScheme:
 
         return "\n".join(out_string)
 
+    @_instr.timed("export")
     def to_javascript(self):
         # return the scheme as a json object
         out_string = StringIO()
@@ -2033,6 +2610,131 @@ class ColorScheme:
             out_string.write(f"colours.{name} = colours.{t}{i+1};\n")
         return out_string.getvalue()
 
+    def _roles(self) -> List[Tuple[ColorFamily, str]]:
+        # every family with its role, named as in to_css
+        roles = [(self.foreground, "foreground"), (self.background, "background")]
+        roles += [(family, f"accent{i+1}") for i, family in enumerate(self.accents)]
+        roles += [(family, f"surface{i+1}") for i, family in enumerate(self.surfaces)]
+        roles += [(family, f"auto-surface{i+1}") for i, family in enumerate(self.auto_surfaces)]
+        return roles
+
+    @_instr.timed("export")
+    def to_json(self, name: str = None, indent: int = None) -> str:
+        # Everything about the resolved scheme, as JSON: every family (its base colour, 5 variants, and the light and
+        # dark colours it was built from) by role, and the aliases and distinct colours as roles. The result can be
+        # loaded again by from_json without recomputing anything. With indent=None it is a single line, as for NDJSON.
+        for alias in self._ALIASES:
+            getattr(self, alias)
+        roles = self._roles()
+        role = {id(family): name for family, name in roles}
+
+        def family_json(family: ColorFamily) -> dict:
+            colors = ["#" + c.hex for c in family._colors()]
+            data = {"base": colors[0], "variants": colors[1:6], "light": colors[6], "dark": colors[7]}
+            if family.name is not None:
+                data["name"] = family.name
+            return data
+
+        data = {} if name is None else {"name": name}
+        data["type"] = self._scheme_type.name.lower()
+        data["foreground"] = family_json(self.foreground)
+        data["background"] = family_json(self.background)
+        data["accents"] = [family_json(f) for f in self.accents]
+        data["surfaces"] = [family_json(f) for f in self.surfaces]
+        data["auto_surfaces"] = [family_json(f) for f in self.auto_surfaces]
+        data["aliases"] = {alias: role[id(self._presets[alias])] for alias in self._ALIASES}
+        data["distinct"] = [role[id(f)] for f in self.distinct]
+        return json.dumps(data, indent=indent)
+
+    @classmethod
+    def from_json(cls, data: str | dict) -> ColorScheme:
+        # Rebuilds a scheme written by to_json (as a string, or already parsed), without recomputing any variants,
+        # aliases or distinct colours
+        if isinstance(data, str):
+            data = json.loads(data)
+        scheme_type = SchemeType[data["type"].upper()]
+        groups = [[data["foreground"], data["background"]], data["accents"], data["surfaces"], data["auto_surfaces"]]
+        families = [
+            ColorFamily._from_colors(
+                [Color(h.lstrip("#")) for h in (f["base"], *f["variants"], f["light"], f["dark"])],
+                scheme_type,
+                f.get("name"),
+            )
+            for group in groups
+            for f in group
+        ]
+        counts = tuple(len(group) for group in groups[1:])
+        scheme = _assemble_scheme(scheme_type, families, counts)
+        index = {name: i for i, (_, name) in enumerate(scheme._roles())}
+        scheme._presets = {alias: families[index[role]] for alias, role in data["aliases"].items()}
+        scheme._distinct = [families[index[role]] for role in data["distinct"]]
+        return scheme
+
+    def _family(self, color) -> ColorFamily:
+        if isinstance(color, ColorFamily):
+            return color
+        return self[color]
+
+    def _sequential_anchors(self, family: ColorFamily) -> List[Color]:
+        # the background, followed by the family's colours in order of increasing contrast with the background
+        shades = sorted(
+            [family[i] for i in range(6)],
+            key=lambda c: c.distance_to(self.background.base),
+        )
+        return [self.background.base] + shades
+
+    @_instr.timed("export")
+    def to_colormap(self, kind: str = "sequential", colors=None, N: int = 256, name: str = None):
+        # Returns a matplotlib colormap built from the scheme:
+        # * "sequential": from the background through the variants of one colour (default: the first distinct colour)
+        # * "diverging": from one colour, through the background, to another (default: blue and red)
+        # * "qualitative": the distinct colours, with no interpolation
+        # Colours can be given as aliases (e.g. "blue"), indices, or ColorFamily objects.
+        try:
+            from matplotlib.colors import ListedColormap
+        except ImportError:
+            raise ImportError(
+                "The 'matplotlib' package is required for this function. Please install it using 'pip install matplotlib'."
+            )
+
+        def label(color):
+            if isinstance(color, ColorFamily):
+                return color.hex
+            return str(color)
+
+        if kind == "qualitative":
+            if name is None:
+                name = "pyg_qualitative"
+            return ListedColormap([c.base.css for c in self.distinct], name=name)
+
+        if kind == "sequential":
+            if colors is None:
+                colors = self.distinct[0]
+            elif isinstance(colors, (list, tuple)):
+                colors = colors[0]
+            anchors = self._sequential_anchors(self._family(colors))
+            pivot = None
+            if name is None:
+                name = f"pyg_sequential_{label(colors)}"
+        elif kind == "diverging":
+            if colors is None:
+                colors = ("blue", "red")
+            low, high = colors
+            low_anchors = self._sequential_anchors(self._family(low))
+            high_anchors = self._sequential_anchors(self._family(high))
+            anchors = low_anchors[::-1] + high_anchors[1:]
+            pivot = len(low_anchors) - 1
+            if name is None:
+                name = f"pyg_diverging_{label(low)}_{label(high)}"
+        else:
+            raise ValueError(
+                f"Unknown colormap kind '{kind}'. Must be one of 'sequential', 'diverging' or 'qualitative'"
+            )
+
+        lut = _lab_lut(tuple(c.hex for c in anchors), N, pivot)
+        return ListedColormap(lut, name=name)
+
+    @_instr.timed("export")
     def to_rich_swatch(self):
         from rich.text import Text
 
@@ -2055,3 +2757,45 @@ class ColorScheme:
         ]:
             text += Text("\u2588\u2588", style=getattr(self, color).base.css)
         return text
+
+
+def _assemble_scheme(scheme_type: SchemeType, families: List[ColorFamily], counts: Tuple[int, int, int]) -> ColorScheme:
+    # A ColorScheme made directly from its families (the foreground, background, accents, surfaces and auto surfaces,
+    # with `counts` giving the number of accents, surfaces and auto surfaces), with no aliases or distinct colours yet
+    n_accents, n_surfaces, n_auto = counts
+    scheme = ColorScheme.__new__(ColorScheme)
+    scheme._scheme_type = scheme_type
+    scheme._colors = None
+    scheme._categorical = {}
+    scheme._indexes = {}
+    scheme._lock = threading.Lock()
+    scheme._foreground, scheme._background = families[0], families[1]
+    scheme._accents = families[2 : 2 + n_accents]
+    scheme._surfaces = families[2 + n_accents : 2 + n_accents + n_surfaces]
+    scheme._auto_surfaces = families[2 + n_accents + n_surfaces :]
+    scheme._presets = {}
+    scheme._distinct = None
+    return scheme
+
+
+def _unpack_scheme(scheme_type, counts, packed, presets, distinct, lowercase, names, frozen) -> ColorScheme:
+    # Rebuilds a ColorScheme from ColorScheme._content, without recomputing any variants
+    scheme_type = SchemeType(scheme_type)
+    colors = _unpack_colors(packed, lowercase)
+    if names is None:
+        names = [None] * (len(colors) // 8)
+    families = [
+        ColorFamily._from_colors(colors[i : i + 8], scheme_type, name)
+        for i, name in zip(range(0, len(colors), 8), names)
+    ]
+    scheme = _assemble_scheme(scheme_type, families, counts)
+    scheme._presets = {name: families[i] for name, i in presets}
+    scheme._distinct = None if distinct is None else [families[i] for i in distinct]
+    if frozen:
+        # everything lazy was already computed before pickling, so only the colours need freezing
+        for family in families:
+            family.freeze()
+        scheme._seal()
+        scheme._key = (scheme_type.value, counts, packed, presets, distinct)
+        scheme._frozen = True
+    return scheme
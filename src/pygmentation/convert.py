@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+# Converting many colours between the colour spaces shown by `pygmentation show --code-type` (hex, rgb, hsl, hsv and
+# Lab), with the same formatting. Colours are converted in batches through the vectorised conversions in
+# color_scheme, so no Color objects are made, and streams are converted a batch at a time, so they can be any length.
+#
+# Values are in the units that show_code_map uses: 0 to 255 for rgb, degrees and percentages for hsl and hsv, and
+# L*, a*, b* for Lab. Hex codes are written without a '#'.
+#
+# Colours can also be read (but not written) as ANSI truecolor escape sequences: the first SGR `38;2;R;G;B` (foreground)
+# or `48;2;R;G;B` (background) on each line, e.g. "\x1b[38;2;94;129;172m", is read as rgb.
+
+import itertools
+import json
+import math
+import re
+from typing import List, TextIO
+
+import numpy as np
+
+from .color_scheme import (
+    hex_to_rgb_array,
+    hsl_to_rgb_array,
+    hsv_to_rgb_array,
+    lab_to_rgb_array,
+    rgb_array_to_hex,
+    rgb_to_hsl_array,
+    rgb_to_hsv_array,
+    rgb_to_lab_array,
+)
+
+SPACES = ("hex", "rgb", "hsl", "hsv", "Lab")
+INPUT_SPACES = SPACES + ("ansi",)
+BATCH_SIZE = 1 << 16
+
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# the first truecolor SGR parameters on a line, with or without the ESC[ before them
+_ANSI = re.compile(r"^.*?(?<![\d:])[34]8;2;(\d{1,3});(\d{1,3});(\d{1,3})(?![\d:])", re.MULTILINE)
+# the text format of each space, as in show_code_map, and the scale of each component in it
+_FORMATS = {
+    "rgb": ("{}, {}, {}", (255, 255, 255)),
+    "hsl": ("{}, {}%, {}%", (1, 100, 100)),
+    "hsv": ("{}, {}%, {}%", (1, 100, 100)),
+    "Lab": ("{}, {}, {}", (1, 1, 1)),
+}
+# what a blank line is converted as, in each space that doesn't read any three numbers
+_BLANK = {"hex": "000", "ansi": "38;2;0;0;0"}
+# the bounds of each component, as checked by RGB, HSL, HSV and LAB (hue wraps around, so isn't checked)
+_BOUNDS = {
+    "rgb": ((0, 0, 0), (255, 255, 255)),
+    "ansi": ((0, 0, 0), (255, 255, 255)),
+    "hsl": ((-np.inf, 0, 0), (np.inf, 100, 100)),
+    "hsv": ((-np.inf, 0, 0), (np.inf, 100, 100)),
+    "Lab": ((0, -np.inf, -np.inf), (np.inf, np.inf, np.inf)),
+}
+
+
+def to_rgb(values: np.ndarray, space: str) -> np.ndarray:
+    # (N, 3) values in `space` (as uint8 RGB for hex) to rgb floats in [0, 1]
+    if space in ("hex", "rgb", "ansi"):
+        return np.asarray(values) / 255
+    values = np.asarray(values, dtype=float) / _FORMATS[space][1]
+    if space == "hsl":
+        return hsl_to_rgb_array(values)
+    if space == "hsv":
+        return hsv_to_rgb_array(values)
+    return lab_to_rgb_array(values)
+
+
+def from_rgb(rgb: np.ndarray, space: str) -> np.ndarray:
+    # rgb floats in [0, 1] to (N, 3) values in `space` (as uint8 RGB for hex)
+    if space == "hex":
+        return np.rint(np.clip(rgb, 0, 1) * 255).astype(np.uint8)
+    if space == "rgb":
+        return rgb * 255
+    if space == "hsl":
+        values = rgb_to_hsl_array(rgb)
+    elif space == "hsv":
+        values = rgb_to_hsv_array(rgb)
+    else:
+        values = rgb_to_lab_array(rgb)
+    return values * _FORMATS[space][1]
+
+
+def convert_array(values: np.ndarray, source: str, target: str) -> np.ndarray:
+    # Converts an (N, 3) array of colours from one space to another (hex as uint8 RGB)
+    if source == target:
+        return np.asarray(values)
+    return from_rgb(to_rgb(values, source), target)
+
+
+def _check_space(space: str, spaces=SPACES):
+    if space not in spaces:
+        raise ValueError(f"Unknown colour space '{space}'; must be one of {', '.join(spaces)}")
+
+
+def _bad_line(lines: List[str], valid, first_line: int) -> ValueError:
+    # the error for the first line that isn't valid, found by checking each line (only once a batch has failed)
+    for i, line in enumerate(lines):
+        if not valid(line):
+            return ValueError(f"Line {first_line + i}: could not read '{line}' as a colour")
+    return ValueError(f"Lines {first_line} to {first_line + len(lines) - 1}: could not read the colours")
+
+
+def _valid_hex(line: str) -> bool:
+    return re.fullmatch(r"#?(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})", line.strip()) is not None
+
+
+def parse(lines: List[str], space: str, first_line: int = 1) -> np.ndarray:
+    # (N, 3) values from lines of text: hex codes (with or without '#', 3, 6 or 8 digits; alpha is dropped) as uint8
+    # RGB, ANSI truecolor escape sequences for ansi, otherwise any three numbers, e.g. "rgb(94, 129, 172)", "94 129 172"
+    # or "210, 34%, 52%"
+    if space == "hex":
+        digits = [line.strip().lstrip("#") for line in lines]
+        if any(len(d) != 6 for d in digits):
+            if not all(len(d) in (3, 6, 8) for d in digits):
+                raise _bad_line(lines, _valid_hex, first_line)
+            digits = [d if len(d) != 3 else "".join(c * 2 for c in d) for d in digits]
+        try:
+            return hex_to_rgb_array(digits)
+        except ValueError:
+            raise _bad_line(lines, _valid_hex, first_line) from None
+    if space == "ansi":
+        numbers = _ANSI.findall("\n".join(lines))
+        if len(numbers) != len(lines):
+            raise _bad_line(lines, lambda line: _ANSI.match(line) is not None, first_line)
+    else:
+        numbers = _NUMBER.findall("\n".join(lines))
+        if len(numbers) != 3 * len(lines):
+            raise _bad_line(lines, lambda line: len(_NUMBER.findall(line)) == 3, first_line)
+    values = np.array(numbers, dtype=float).reshape(-1, 3)
+    low, high = _BOUNDS[space]
+    outside = np.flatnonzero(((values < low) | (values > high)).any(axis=1))
+    if len(outside) > 0:
+        i = outside[0]
+        raise ValueError(f"Line {first_line + i}: '{lines[i]}' is out of bounds for {space}")
+    return values
+
+
+def format_values(values: np.ndarray, space: str, ndjson: bool = False) -> List[str]:
+    # Each colour as text, as show_code_map would write it (or as a JSON string or list of numbers, if ndjson)
+    if space == "hex":
+        hexes = rgb_array_to_hex(values)
+        return [f'"{h}"' for h in hexes] if ndjson else hexes
+    columns = np.rint(values).astype(int).T.tolist()
+    template = "[{}, {}, {}]" if ndjson else _FORMATS[space][0]
+    return list(map(template.format, *columns))
+
+
+def convert_lines(lines: List[str], source: str, target: str, ndjson: bool = False, first_line: int = 1) -> List[str]:
+    # Converts one colour per line. Blank lines stay blank. With ndjson, each line is a JSON string (parsed as a line of
+    # text would be) or a list of three numbers, and each result is a JSON string (hex) or list of numbers.
+    _check_space(source, INPUT_SPACES)
+    _check_space(target)
+    if ndjson:
+        lines = [_json_line(line, first_line + i) for i, line in enumerate(lines)]
+    blank = [i for i, line in enumerate(lines) if not line.strip()]
+    if blank:
+        # converted as black, and blanked again afterwards, so that line numbers in errors stay right
+        lines = list(lines)
+        for i in blank:
+            lines[i] = _BLANK.get(source, "0 0 0")
+    results = format_values(convert_array(parse(lines, source, first_line), source, target), target, ndjson)
+    for i in blank:
+        results[i] = ""
+    return results
+
+
+def _json_line(line: str, number: int) -> str:
+    # a line of ndjson as the line of text it stands for: a string as it is, and a list of three numbers as the numbers.
+    # Each line is parsed on its own, so that a line holding more than one value can't shift the lines after it.
+    if not line.strip():
+        return ""
+    try:
+        value = json.loads(line)
+    except json.JSONDecodeError:
+        value = None
+    if isinstance(value, str) and "\n" not in value:
+        return value
+    if (
+        isinstance(value, list)
+        and len(value) == 3
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in value)
+    ):
+        return ", ".join(map(str, value))
+    raise ValueError(f"Line {number}: could not read '{line}' as a colour")
+
+
+def convert_stream(
+    source: TextIO,
+    destination: TextIO,
+    source_space: str,
+    target_space: str,
+    ndjson: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    # Converts one colour per line from `source` to `destination`, `batch_size` lines at a time. Returns the number of
+    # lines converted.
+    converted = 0
+    while True:
+        lines = list(itertools.islice(source, batch_size))
+        if not lines:
+            return converted
+        lines = [line.rstrip("\r\n") for line in lines]
+        results = convert_lines(lines, source_space, target_space, ndjson, converted + 1)
+        destination.write("\n".join(results) + "\n")
+        converted += len(lines)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+# Opt-in counters and timings, to see where time goes in an application using pygmentation (which colour conversions
+# it does, how often it searches for the closest colour, which caches it misses, and how long each phase of building
+# and exporting schemes takes).
+#
+# Instrumentation is off by default. It is turned on with enable() or by setting PYGMENTATION_STATS=1, and the results
+# are read with stats(). While it is off, each hook is a check of `enabled` and nothing else.
+#
+# Phases:
+# * catalog: loading the catalog (color_schemes.json, and the catalog index and feature table)
+# * resolution: building a ColorScheme for a named scheme
+# * classification: choosing the foreground, background, accents and surfaces of a scheme
+# * variants: generating the variants of a colour family
+# * aliases: choosing the colour for each alias (red, orange, ...)
+# * distinct: choosing the distinct colours of a scheme
+# * export: the to_* exporters of ColorScheme, and to_mplstyle
+# * recolor: recolouring images with ColorScheme.recolor_array, and figures with apply_to_figure
+# * rewrite: rewriting the colours of SVG and CSS files (rewrite.rewrite_stream)
+# * render: drawing schemes in the terminal (or to SVG)
+# * io: reading and writing files
+# Other phases can be timed with phase(). Each phase has its total time ("seconds"), which includes any phases nested
+# within it, and its time excluding them ("self_seconds"), so that the self times of all phases add up to the time spent
+# in any of them.
+
+import functools
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+
+enabled = os.environ.get("PYGMENTATION_STATS", "") not in ("", "0")
+
+PHASES = ("catalog", "resolution", "classification", "variants", "aliases", "distinct", "export", "recolor", "rewrite", "render", "io")
+
+_lock = threading.Lock()
+_conversions = Counter()
+_counts = Counter()
+_caches = {}
+_phases = {}
+# per thread, the phases in progress, as [start time, time in nested phases]
+_active = threading.local()
+_callbacks: List[Callable[[str, float], None]] = []
+
+
+def enable(on: bool = True):
+    global enabled
+    enabled = on
+
+
+def disable():
+    enable(False)
+
+
+def reset():
+    with _lock:
+        _conversions.clear()
+        _counts.clear()
+        _caches.clear()
+        _phases.clear()
+
+
+def stats() -> dict:
+    # A snapshot of everything counted since instrumentation was enabled (or last reset)
+    with _lock:
+        return {
+            "enabled": enabled,
+            "conversions": dict(_conversions),
+            "delta_e": _counts["delta_e"],
+            "families": _counts["families"],
+            "closest_color": _counts["closest_color"],
+            "caches": {name: {"hits": hits, "misses": misses} for name, (hits, misses) in _caches.items()},
+            "phases": {
+                name: {"calls": calls, "seconds": seconds, "self_seconds": self_seconds}
+                for name, (calls, seconds, self_seconds) in _phases.items()
+            },
+        }
+
+
+def add_timing_callback(callback: Callable[[str, float], None]):
+    # callback(phase, seconds) is called at the end of every timed phase, while instrumentation is enabled
+    _callbacks.append(callback)
+
+
+def remove_timing_callback(callback: Callable[[str, float], None]):
+    _callbacks.remove(callback)
+
+
+# Hooks. Callers check `enabled` first where the hook is in a hot path.
+
+
+def conversion(source: str, target: str, n: int = 1):
+    if not enabled:
+        return
+    with _lock:
+        _conversions[f"{source}->{target}"] += n
+
+
+def count(name: str, n: int = 1):
+    if not enabled:
+        return
+    with _lock:
+        _counts[name] += n
+
+
+def cache(name: str, hit: bool):
+    if not enabled:
+        return
+    with _lock:
+        hits, misses = _caches.get(name, (0, 0))
+        _caches[name] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+
+def _stack() -> list:
+    stack = getattr(_active, "stack", None)
+    if stack is None:
+        stack = _active.stack = []
+    return stack
+
+
+def start() -> Optional[float]:
+    # the start of a phase, to be passed to stop(). None if instrumentation is disabled.
+    if not enabled:
+        return None
+    started = time.perf_counter()
+    _stack().append([started, 0.0])
+    return started
+
+
+def stop(name: str, started: Optional[float]):
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    stack = _stack()
+    nested = 0.0
+    # phases left unfinished by an exception are dropped along the way
+    while stack:
+        entry = stack.pop()
+        if entry[0] == started:
+            nested = entry[1]
+            break
+    if stack:
+        stack[-1][1] += seconds
+    with _lock:
+        calls, total, self_total = _phases.get(name, (0, 0.0, 0.0))
+        _phases[name] = (calls + 1, total + seconds, self_total + seconds - nested)
+    for callback in list(_callbacks):
+        callback(name, seconds)
+
+
+class _Phase:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = start()
+        return self
+
+    def __exit__(self, *exc):
+        stop(self.name, self.started)
+        return False
+
+
+_null_phase = nullcontext()
+
+
+def phase(name: str):
+    # A context manager timing the code within it as the phase `name`
+    return _Phase(name) if enabled else _null_phase
+
+
+def timed(name: str):
+    # A decorator timing each call of the function as the phase `name`
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            started = start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stop(name, started)
+
+        return wrapper
+
+    return decorator
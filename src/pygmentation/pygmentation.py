@@ -1,6 +1,11 @@
-from typing import List
-from .color_scheme import ColorScheme, Color, ColorFamily, SchemeType, EnumEx
+from typing import List, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .color_scheme import ColorScheme, Color, ColorFamily, SchemeType, EnumEx, hex_to_rgb_array, _nearest_codes
+from . import instrumentation as _instr
 import json
+import re
+import numpy as np
 from pathlib import Path
 from .scheme import schemes_json as schemes_json
 
@@ -19,62 +24,131 @@ class DocType(EnumEx):
 # this.Scheme = None
 # this.schemes_json = Path(__file__).parent / "color_schemes.json"
 Scheme = None
+# The scheme active in the current thread or asyncio task. set_scheme and init set this as well as Scheme, and
+# using_scheme sets it for the duration of a block. Threads that have never set it fall back to Scheme.
+_active_scheme: ContextVar[ColorScheme] = ContextVar("pygmentation_scheme")
 schemes_json = Path(__file__).parent / "color_schemes.json"
-with open(schemes_json, "r") as f:
-    all_schemes = json.load(f)
+
+
+# The catalog (all_schemes) is only read from color_schemes.json when it is first used, so that importing pygmentation
+# (e.g. in worker processes using a shared catalog) doesn't pay for it. Within this module it is accessed with
+# _schemes(); from outside, as the module attribute all_schemes. Once loaded, it can be modified in place.
+def _load_schemes() -> dict:
+    global all_schemes
+    with _instr.phase("catalog"):
+        with open(schemes_json, "r") as f:
+            all_schemes = json.load(f)
+    return all_schemes
+
+
+def _schemes() -> dict:
+    try:
+        return all_schemes
+    except NameError:
+        return _load_schemes()
+
+
+# bumped by catalog_changed, so that caches built from the catalog (e.g. the name index) know to rebuild
+_catalog_version = 0
+
+
+def catalog_changed():
+    # Call after modifying all_schemes in place. Adding or removing schemes is noticed without this, but replacing or
+    # renaming one (keeping the number of schemes the same) is not.
+    global _catalog_version
+    _catalog_version += 1
+
+
+def __getattr__(name):
+    if name == "all_schemes":
+        return _load_schemes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def get_available_schemes():
     # returns a list of the names of all available schemes
-    return list(all_schemes.keys())
+    return list(_schemes().keys())
+
+
+def _scheme_dict(scheme: str, scheme_type: SchemeType) -> dict:
+    if not scheme in _schemes():
+        raise ValueError(f"Scheme {scheme} not found")
+    scheme_dict = _schemes()[scheme]
+    if scheme_type.name.lower() in scheme_dict:
+        return scheme_dict[scheme_type.name.lower()]
+    # copy so that swapping foreground and background doesn't modify the catalog itself
+    scheme_dict = dict(scheme_dict)
+    # make sure that foreground and background lightnesses are appropriate for the scheme_type
+    if scheme_type == SchemeType.LIGHT:
+        # foreground should be dark, background should be light
+        if Color(scheme_dict["foreground"]).is_lighter_than(
+            Color(scheme_dict["background"])
+        ):
+            scheme_dict["foreground"], scheme_dict["background"] = (
+                scheme_dict["background"],
+                scheme_dict["foreground"],
+            )
+    elif scheme_type == SchemeType.DARK:
+        # foreground should be light, background should be dark
+        if Color(scheme_dict["foreground"]).is_darker_than(
+            Color(scheme_dict["background"])
+        ):
+            scheme_dict["foreground"], scheme_dict["background"] = (
+                scheme_dict["background"],
+                scheme_dict["foreground"],
+            )
+    return scheme_dict
+
+
+@_instr.timed("resolution")
+def resolve_scheme(
+    scheme: str = "twilight", scheme_type: str | SchemeType = "light"
+) -> ColorScheme:
+    # Builds the ColorScheme for a named scheme without changing the active scheme.
+    # If a catalog has been shared between processes (see catalog.publish_catalog), the scheme is a frozen view of it,
+    # which can't be modified (ColorScheme.from_json(scheme.to_json()) gives a modifiable copy).
+    if isinstance(scheme_type, str):
+        scheme_type = SchemeType[scheme_type.upper()]
+    from .catalog import shared_catalog
+
+    shared = shared_catalog()
+    if shared is not None and scheme in shared:
+        return shared.scheme(scheme, scheme_type)
+    return ColorScheme(_scheme_dict(scheme, scheme_type), scheme_type)
 
 
 def set_scheme(
     scheme: str = "twilight", scheme_type: str | SchemeType = "light"
 ) -> Scheme:
-    global Scheme, schemes_json, all_schemes
+    global Scheme
     # this = sys.modules[__name__]
 
-    if isinstance(scheme_type, str):
-        scheme_type = SchemeType[scheme_type.upper()]
-
-    if not scheme in all_schemes:
-        raise ValueError(f"Scheme {scheme} not found")
-    scheme_dict = all_schemes[scheme]
-    if scheme_type.name.lower() in scheme_dict:
-        scheme_dict = scheme_dict[scheme_type.name.lower()]
-    else:
-        # make sure that foreground and background lightnesses are appropriate for the scheme_type
-        if scheme_type == SchemeType.LIGHT:
-            # foreground should be dark, background should be light
-            if Color(scheme_dict["foreground"]).is_lighter_than(
-                Color(scheme_dict["background"])
-            ):
-                scheme_dict["foreground"], scheme_dict["background"] = (
-                    scheme_dict["background"],
-                    scheme_dict["foreground"],
-                )
-        elif scheme_type == SchemeType.DARK:
-            # foreground should be light, background should be dark
-            if Color(scheme_dict["foreground"]).is_darker_than(
-                Color(scheme_dict["background"])
-            ):
-                scheme_dict["foreground"], scheme_dict["background"] = (
-                    scheme_dict["background"],
-                    scheme_dict["foreground"],
-                )
     # this.Scheme = ColorScheme(
-    Scheme = ColorScheme(scheme_dict, scheme_type)
+    Scheme = resolve_scheme(scheme, scheme_type)
+    _active_scheme.set(Scheme)
+    _refresh_colormaps()
 
     return Scheme
 
 
-def init(
-    scheme: str = "twilight",
-    scheme_type: str | SchemeType = "light",
-    doc_type: str | DocType = "report",
-    transparent: bool = False,
+@contextmanager
+def using_scheme(
+    scheme: str | ColorScheme = "twilight", scheme_type: str | SchemeType = "light"
 ):
+    # Make a scheme (a name, or an already resolved ColorScheme) the active scheme for the current thread or asyncio
+    # task only, e.g. `with using_scheme("nord", "dark") as scheme: ...`. Other threads and tasks are unaffected, so
+    # many schemes can be in use at once. The pyg_* colormaps registered with matplotlib are shared by the whole
+    # process, so they are not changed.
+    if not isinstance(scheme, ColorScheme):
+        scheme = resolve_scheme(scheme, scheme_type)
+    token = _active_scheme.set(scheme)
+    try:
+        yield scheme
+    finally:
+        _active_scheme.reset(token)
+
+
+def _import_matplotlib():
     try:
         from cycler import cycler
     except ImportError:
@@ -87,11 +161,13 @@ def init(
         raise ImportError(
             "The 'matplotlib' package is required for this function. Please install it using 'pip install matplotlib'. If you only wanted to use the colour scheme functionality, you can use the 'set_scheme' function instead."
         )
+    return cycler, plt
 
-    if isinstance(doc_type, str):
-        doc_type = DocType[doc_type.upper()]
 
-    scheme = set_scheme(scheme, scheme_type)
+def _build_rcparams(
+    scheme: ColorScheme, doc_type: DocType, transparent: bool = False
+) -> dict:
+    cycler, _ = _import_matplotlib()
 
     # Get a matplotlib cycler object for the color scheme, from Scheme.distinct[:].base, then Scheme.distinct[:].lightest, then Scheme.distinct[:].darkest
     # color_cycler = cycler(color =
@@ -102,12 +178,12 @@ def init(
     # )
 
     color_cycler = cycler(
-        color=[c.base.css for c in Scheme.distinct]
-        + [c.base.css for c in Scheme.distinct]
-        + [c.base.css for c in Scheme.distinct],
-        linestyle=["-"] * len(Scheme.distinct)
-        + ["--"] * len(Scheme.distinct)
-        + [":"] * len(Scheme.distinct),
+        color=[c.base.css for c in scheme.distinct]
+        + [c.base.css for c in scheme.distinct]
+        + [c.base.css for c in scheme.distinct],
+        linestyle=["-"] * len(scheme.distinct)
+        + ["--"] * len(scheme.distinct)
+        + [":"] * len(scheme.distinct),
     )
     """
     Always:
@@ -168,40 +244,40 @@ def init(
         "text.usetex": True,
         "font.family": "serif",
         "font.serif": "Computer Modern Roman",
-        "text.color": Scheme.foreground.css,
+        "text.color": scheme.foreground.css,
         "font.size": 12 if doc_type == DocType.REPORT else 16,
         "figure.facecolor": (
-            Scheme.background.base.css
+            scheme.background.base.css
             if doc_type == DocType.PRESENTATION and not transparent
             else "none"
         ),
-        "axes.facecolor": Scheme.background.base.css if not transparent else "none",
-        "legend.facecolor": Scheme.background._5.css,
-        "legend.edgecolor": Scheme.foreground.css,
+        "axes.facecolor": scheme.background.base.css if not transparent else "none",
+        "legend.facecolor": scheme.background._5.css,
+        "legend.edgecolor": scheme.foreground.css,
         "legend.framealpha": 0.5,
         "legend.fancybox": True,
         "axes.prop_cycle": color_cycler,
         "axes.edgecolor": (
-            Scheme.foreground.css
+            scheme.foreground.css
             if doc_type == DocType.REPORT
-            else Scheme.distinct[0].css
+            else scheme.distinct[0].css
         ),
         "axes.labelcolor": (
-            Scheme.foreground.css
+            scheme.foreground.css
             if doc_type == DocType.REPORT
-            else Scheme.distinct[0].css
+            else scheme.distinct[0].css
         ),
         "axes.spines.top": True if doc_type == DocType.REPORT else False,
         "axes.spines.right": True if doc_type == DocType.REPORT else False,
         "xtick.color": (
-            Scheme.foreground.css
+            scheme.foreground.css
             if doc_type == DocType.REPORT
-            else Scheme.distinct[0].css
+            else scheme.distinct[0].css
         ),
         "ytick.color": (
-            Scheme.foreground.css
+            scheme.foreground.css
             if doc_type == DocType.REPORT
-            else Scheme.distinct[0].css
+            else scheme.distinct[0].css
         ),
         "figure.figsize": (6.4, 4.8) if doc_type == DocType.REPORT else (8, 4.5),
         "figure.dpi": 300,
@@ -214,12 +290,498 @@ def init(
         # add some packages to the preamble
         "text.latex.preamble": r"""\usepackage{amsmath, amssymb}""",
     }
-    plt.rcParams.update(new_params)
     return new_params
 
 
+# resolved schemes and their rcParams, keyed by (scheme, scheme_type, doc_type, transparent)
+_style_bundles = {}
+
+
+def _style_bundle(
+    scheme: str = "twilight",
+    scheme_type: str | SchemeType = "light",
+    doc_type: str | DocType = "report",
+    transparent: bool = False,
+):
+    if isinstance(scheme_type, str):
+        scheme_type = SchemeType[scheme_type.upper()]
+    if isinstance(doc_type, str):
+        doc_type = DocType[doc_type.upper()]
+    key = (scheme, scheme_type.name, doc_type.name, bool(transparent))
+    bundle = _style_bundles.get(key)
+    _instr.cache("style", bundle is not None)
+    if bundle is None:
+        _, plt = _import_matplotlib()
+        resolved = resolve_scheme(scheme, scheme_type)
+        new_params = _build_rcparams(resolved, doc_type, transparent)
+        # validate once here, so that switching styles later can skip matplotlib's per-key validation
+        validated = {k: plt.rcParams.validate[k](v) for k, v in new_params.items()}
+        bundle = (resolved, new_params, validated)
+        _style_bundles[key] = bundle
+    return bundle
+
+
+def clear_style_cache():
+    _style_bundles.clear()
+
+
+def _apply_rcparams(plt, params: dict) -> None:
+    # Applies rcParams that have already been validated (by _style_bundle). RcParams._update_raw skips matplotlib's
+    # per-key validation, which is most of the cost of switching styles; matplotlib versions without it fall back to
+    # rcParams.update, which validates every value again (the same result, just slower).
+    update_raw = getattr(plt.rcParams, "_update_raw", None)
+    if update_raw is not None:
+        update_raw(params)
+    else:
+        plt.rcParams.update(params)
+
+
+def _current_rcparams(plt, keys) -> dict:
+    # the current values of some rcParams, without the deprecation and backend handling of rcParams[key]
+    get = getattr(plt.rcParams, "_get", None)
+    if get is None:
+        get = plt.rcParams.__getitem__
+    return {k: get(k) for k in keys}
+
+
+def get_style(
+    scheme: str = "twilight",
+    scheme_type: str | SchemeType = "light",
+    doc_type: str | DocType = "report",
+    transparent: bool = False,
+) -> dict:
+    # Returns the rcParams that init() would apply, without applying them
+    return dict(_style_bundle(scheme, scheme_type, doc_type, transparent)[1])
+
+
+def init(
+    scheme: str = "twilight",
+    scheme_type: str | SchemeType = "light",
+    doc_type: str | DocType = "report",
+    transparent: bool = False,
+):
+    global Scheme
+    _, plt = _import_matplotlib()
+
+    Scheme, new_params, validated = _style_bundle(
+        scheme, scheme_type, doc_type, transparent
+    )
+    _active_scheme.set(Scheme)
+    _apply_rcparams(plt, validated)
+    _refresh_colormaps()
+    return dict(new_params)
+
+
+@contextmanager
+def style(
+    scheme: str = "twilight",
+    scheme_type: str | SchemeType = "light",
+    doc_type: str | DocType = "report",
+    transparent: bool = False,
+):
+    # Temporarily apply a style, e.g. `with style("nord", "dark", "presentation"): ...`
+    # Restores the previous rcParams and active scheme on exit, so blocks can be nested freely.
+    # rcParams are shared by the whole process, but the active scheme is only changed for the current thread or task.
+    _, plt = _import_matplotlib()
+
+    resolved, _, validated = _style_bundle(scheme, scheme_type, doc_type, transparent)
+    previous_params = _current_rcparams(plt, validated)
+    _apply_rcparams(plt, validated)
+    token = _active_scheme.set(resolved)
+    _refresh_colormaps()
+    try:
+        yield resolved
+    finally:
+        _apply_rcparams(plt, previous_params)
+        _active_scheme.reset(token)
+        _refresh_colormaps()
+
+
+def _mplstyle_value(value) -> str:
+    # '#' starts a comment in matplotlib style files, so colours are written without it
+    if isinstance(value, str):
+        return value[1:] if value.startswith("#") else value
+    if isinstance(value, (tuple, list)):
+        return ", ".join(_mplstyle_value(v) for v in value)
+    if hasattr(value, "by_key"):
+        return " + ".join(
+            f"cycler({key!r}, {[_mplstyle_value(v) for v in values]!r})"
+            for key, values in value.by_key().items()
+        )
+    return str(value)
+
+
+def _mplstyle(new_params: dict, title: str) -> str:
+    out_string = [f"# {title}", "# Generated by pygmentation", ""]
+    for key, value in new_params.items():
+        out_string.append(f"{key}: {_mplstyle_value(value)}")
+    return "\n".join(out_string) + "\n"
+
+
+@_instr.timed("export")
+def to_mplstyle(
+    scheme: str = "twilight",
+    scheme_type: str | SchemeType = "light",
+    doc_type: str | DocType = "report",
+    transparent: bool = False,
+) -> str:
+    # Returns the style that init() would apply as the contents of a .mplstyle file
+    return _mplstyle(
+        _style_bundle(scheme, scheme_type, doc_type, transparent)[1],
+        f"{scheme} ({scheme_type}, {doc_type})",
+    )
+
+
+def mplstyle_name(
+    scheme: str, scheme_type: str, doc_type: str, transparent: bool = False
+) -> str:
+    return f"{scheme}-{scheme_type}-{doc_type}" + ("-transparent" if transparent else "")
+
+
+def write_mplstyles(
+    directory: str | Path = None,
+    schemes: List[str] = None,
+    scheme_types: List[str] = ("light", "dark"),
+    doc_types: List[str] = ("report", "presentation"),
+    transparent: bool = False,
+) -> List[Path]:
+    # Writes one .mplstyle file per scheme, type and document type.
+    # By default these go into matplotlib's user style library, so that they can be loaded with e.g.
+    # `plt.style.use("nord-dark-report")` without importing pygmentation at all.
+    if directory is None:
+        import matplotlib
+
+        directory = Path(matplotlib.get_configdir()) / "stylelib"
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if schemes is None:
+        schemes = get_available_schemes()
+
+    written = []
+    for scheme in schemes:
+        for scheme_type in scheme_types:
+            # resolve once, and share between the document types
+            resolved = resolve_scheme(scheme, scheme_type)
+            for doc_type in doc_types:
+                new_params = _build_rcparams(
+                    resolved, DocType[doc_type.upper()], transparent
+                )
+                filepath = directory / (
+                    mplstyle_name(scheme, scheme_type, doc_type, transparent)
+                    + ".mplstyle"
+                )
+                _write_text(filepath, _mplstyle(new_params, f"{scheme} ({scheme_type}, {doc_type})"))
+                written.append(filepath)
+    return written
+
+
+def dump_schemes(
+    file=None,
+    schemes: List[str] = None,
+    scheme_types: List[str] = ("light", "dark"),
+    format: str = "ndjson",
+) -> int:
+    # Writes every resolved scheme (see ColorScheme.to_json) to `file` (a path or an open file; default stdout), as
+    # NDJSON (one scheme per line) or as a JSON array. Each scheme is written as soon as it is resolved, so the output
+    # can be read while it is still being produced. Returns the number of schemes written.
+    if format not in ("ndjson", "json"):
+        raise ValueError(f"Format must be 'ndjson' or 'json', not '{format}'")
+    if schemes is None:
+        schemes = get_available_schemes()
+    if file is None:
+        return _dump_schemes(sys.stdout, schemes, scheme_types, format)
+    if isinstance(file, (str, Path)):
+        with open(file, "w") as f:
+            return _dump_schemes(f, schemes, scheme_types, format)
+    return _dump_schemes(file, schemes, scheme_types, format)
+
+
+def _dump_schemes(file, schemes: List[str], scheme_types: List[str], format: str) -> int:
+    written = 0
+    if format == "json":
+        file.write("[")
+    for scheme in schemes:
+        for scheme_type in scheme_types:
+            line = resolve_scheme(scheme, scheme_type).to_json(scheme)
+            if format == "json":
+                line = ("\n" if written == 0 else ",\n") + line
+            else:
+                line += "\n"
+            file.write(line)
+            file.flush()
+            written += 1
+    if format == "json":
+        file.write("\n]\n")
+    return written
+
+
+def load_schemes(file):
+    # Reads schemes written by dump_schemes (NDJSON or a JSON array) from a path or an open file, yielding
+    # (name, scheme) pairs. The schemes are rebuilt with ColorScheme.from_json, without recomputing anything.
+    if isinstance(file, (str, Path)):
+        with open(file) as f:
+            yield from load_schemes(f)
+        return
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+    if first == "[":
+        records = json.loads(first + file.read())
+    else:
+        records = (json.loads(line) for line in _prepend(first, file) if line.strip())
+    for record in records:
+        yield record.get("name"), ColorScheme.from_json(record)
+
+
+def _prepend(first: str, file):
+    # the lines of `file`, with `first` (already read from it) put back at the start
+    lines = iter(file)
+    yield first + next(lines, "")
+    yield from lines
+
+
 def get_scheme() -> ColorScheme:
-    return Scheme
+    # the active scheme for the current thread or task (see using_scheme), otherwise the last one set
+    return _active_scheme.get(Scheme)
+
+
+# The "pyg_*" colormaps registered with matplotlib. The default ones are registered whenever a style or scheme is
+# applied, so that e.g. `cmap="pyg_sequential"` works straight away; others are added by get_colormap.
+_DEFAULT_COLORMAPS = ("pyg_sequential", "pyg_diverging", "pyg_qualitative")
+_colormap_names = set(_DEFAULT_COLORMAPS)
+
+
+def _colormap_args(name: str, scheme: ColorScheme):
+    # The kind and colours encoded in a colormap name, as arguments for to_colormap. Colours can be aliases or names
+    # (e.g. "blue"), indices (e.g. "0"), or hex codes (e.g. "5E81AC", as to_colormap names maps for ColorFamily
+    # objects), which are matched to the closest colour of the scheme.
+    kind, *colors = name.split("_")[1:]
+    if kind == "diverging" and len(colors) not in (0, 2):
+        raise ValueError(
+            f"Diverging colormap names must give two colours, e.g. 'pyg_diverging_blue_red', not '{name}'"
+        )
+    families = []
+    for color in colors:
+        if color.isdigit():
+            families.append(scheme[int(color)])
+            continue
+        try:
+            families.append(scheme[color])
+        except KeyError:
+            if re.fullmatch(r"[0-9a-fA-F]{6}", color) is None:
+                raise ValueError(f"Unknown colour '{color}' in colormap name '{name}'") from None
+            families.append(scheme.get_closest_color(color))
+    return kind, families if families else None
+
+
+def _colormap_from_name(name: str, scheme: ColorScheme = None):
+    if scheme is None:
+        scheme = get_scheme()
+    kind, colors = _colormap_args(name, scheme)
+    return scheme.to_colormap(kind, colors, name=name)
+
+
+_SchemeColormap = None
+
+
+def _scheme_colormap(name: str, scheme: ColorScheme):
+    # A colormap for one scheme whose lookup table is only built (by to_colormap) when matplotlib first uses it, so that
+    # registering the pyg_* colormaps each time the scheme changes costs almost nothing.
+    global _SchemeColormap
+    if _SchemeColormap is None:
+        from matplotlib.colors import Colormap
+
+        class _SchemeColormap(Colormap):
+            def __init__(self, name: str, scheme: ColorScheme):
+                kind = name.split("_")[1]
+                super().__init__(name, len(scheme.distinct) if kind == "qualitative" else 256)
+                self._scheme = scheme
+
+            def _build(self):
+                return _colormap_from_name(self.name, self._scheme)
+
+            def _init(self):
+                lut = np.zeros((self.N + 3, 4))
+                lut[:-3] = self._build()(np.arange(self.N))
+                self._lut = lut
+                self._isinit = True
+                self._set_extremes()
+
+            def reversed(self, name=None):
+                return self._build().reversed(name)
+
+            def resampled(self, lutsize):
+                return self._build().resampled(lutsize)
+
+    return _SchemeColormap(name, scheme)
+
+
+def get_colormap(name: str):
+    # Looks up a matplotlib colormap by name. Names of the form "pyg_<kind>[_<colour>[_<colour>]]", e.g.
+    # "pyg_sequential_blue" or "pyg_diverging_blue_red", are built from the current scheme and registered with
+    # matplotlib on first lookup. After that they can be passed to matplotlib directly, e.g. `cmap="pyg_sequential_blue"`,
+    # and are kept up to date when the scheme changes. pyg_sequential, pyg_diverging and pyg_qualitative are registered
+    # whenever a style or scheme is applied, so they never need looking up first.
+    import matplotlib
+
+    if name.startswith("pyg_") and (name not in _colormap_names or name not in matplotlib.colormaps):
+        scheme = get_scheme()
+        # checked now, rather than when the colormap is first drawn
+        _colormap_args(name, scheme)
+        _register_colormaps([name], scheme)
+        _colormap_names.add(name)
+    return matplotlib.colormaps[name]
+
+
+def _register_colormaps(names, scheme: ColorScheme):
+    import warnings
+    import matplotlib
+
+    with warnings.catch_warnings():
+        # matplotlib warns about overwriting registered colormaps, which is exactly what we want to do here
+        warnings.simplefilter("ignore", UserWarning)
+        for name in names:
+            matplotlib.colormaps.register(_scheme_colormap(name, scheme), name=name, force=True)
+
+
+def _refresh_colormaps():
+    # Replaces the registered pyg_* colormaps with ones for the current scheme. Their lookup tables are built the next
+    # time they are used. set_scheme doesn't import matplotlib just for this: if matplotlib is imported later, the
+    # colormaps are registered by init, style or get_colormap.
+    if "matplotlib" not in sys.modules or get_scheme() is None:
+        return
+    _register_colormaps(sorted(_colormap_names), get_scheme())
+
+
+def _figure_colors(fig) -> list:
+    # Every colour of a figure that can be rethemed, as (setter, RGBA array) pairs. Artists whose colours come from a
+    # colormap (scatter plots with c=values, images, ...) are left alone, as their colours encode data.
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.collections import Collection
+    from matplotlib.colors import to_rgba, to_rgba_array
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+    from matplotlib.text import Text
+
+    colors = []
+
+    def add(setter, color):
+        # single colours are skipped if they are fully transparent, so that "none" stays "none"
+        rgba = np.array([to_rgba(color)])
+        if rgba[0, 3] > 0:
+            colors.append((lambda rgba: setter(tuple(rgba[0].tolist())), rgba))
+
+    for artist in fig.findobj():
+        if isinstance(artist, ScalarMappable) and artist.get_array() is not None:
+            continue
+        if isinstance(artist, Collection):
+            for getter, setter in (
+                (artist.get_facecolor, artist.set_facecolor),
+                (artist.get_edgecolor, artist.set_edgecolor),
+            ):
+                rgba = to_rgba_array(getter())
+                if len(rgba) > 0:
+                    colors.append((setter, rgba))
+        elif isinstance(artist, Line2D):
+            add(artist.set_color, artist.get_color())
+            add(artist.set_markerfacecolor, artist.get_markerfacecolor())
+            add(artist.set_markeredgecolor, artist.get_markeredgecolor())
+        elif isinstance(artist, Patch):
+            add(artist.set_facecolor, artist.get_facecolor())
+            add(artist.set_edgecolor, artist.get_edgecolor())
+        elif isinstance(artist, Text):
+            add(artist.set_color, artist.get_color())
+            bbox = artist.get_bbox_patch()
+            if bbox is not None:
+                add(bbox.set_facecolor, bbox.get_facecolor())
+                add(bbox.set_edgecolor, bbox.get_edgecolor())
+    return colors
+
+
+class _FigureColorMap:
+    # Maps RGBA arrays to the closest colours of a scheme, keeping alpha. Each 24-bit colour is only looked up once per
+    # map, however many artists and figures it is used for.
+    def __init__(self, scheme: ColorScheme, variants: bool = True, accents_only: bool = False):
+        self._index = scheme.color_index(variants=variants, accents_only=accents_only)
+        self._palette = hex_to_rgb_array([family[i].hex for family, i in self._index.labels]) / 255
+        self._codes = {}
+
+    def __call__(self, rgba: np.ndarray) -> np.ndarray:
+        # matplotlib has already checked that the values are between 0 and 1
+        rgb = (rgba[:, :3] * 255 + 0.5).astype(np.uint32)
+        codes = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+        if len(codes) > 1 << 16:
+            # for large collections, marking the colours present is much faster than sorting them
+            seen = np.zeros(1 << 24, dtype=bool)
+            seen[codes] = True
+            unique = np.flatnonzero(seen)
+            inverse = np.searchsorted(unique, codes)
+        else:
+            unique, inverse = np.unique(codes, return_inverse=True)
+        unique = unique.tolist()
+        missing = [code for code in unique if code not in self._codes]
+        if missing:
+            found = _nearest_codes(self._index, np.array(missing, dtype=np.int64))
+            self._codes.update(zip(missing, found.tolist()))
+        indices = np.array([self._codes[code] for code in unique], dtype=np.intp)
+        result = np.empty_like(rgba)
+        result[:, :3] = self._palette[indices[inverse.reshape(-1)]]
+        result[:, 3] = rgba[:, 3]
+        return result
+
+
+def _apply_color_map(fig, color_map: _FigureColorMap):
+    colors = _figure_colors(fig)
+    if not colors:
+        return
+    # all of the figure's colours are mapped together, so that each distinct colour is only handled once
+    mapped = color_map(np.concatenate([rgba for _, rgba in colors]))
+    start = 0
+    for setter, rgba in colors:
+        setter(mapped[start : start + len(rgba)])
+        start += len(rgba)
+    fig.stale = True
+
+
+def _figure_scheme(scheme: str | ColorScheme, scheme_type: str | SchemeType) -> ColorScheme:
+    if scheme is None:
+        scheme = get_scheme()
+        if scheme is None:
+            raise ValueError("No scheme has been set; pass a scheme, or call set_scheme or init first")
+    elif not isinstance(scheme, ColorScheme):
+        scheme = resolve_scheme(scheme, scheme_type)
+    return scheme
+
+
+@_instr.timed("recolor")
+def apply_to_figure(
+    fig,
+    scheme: str | ColorScheme = None,
+    scheme_type: str | SchemeType = "light",
+    variants: bool = True,
+    accents_only: bool = False,
+):
+    # Rethemes an existing matplotlib figure, e.g. one made before init() was called, by replacing the face, edge and
+    # text colours of its artists with the closest colours of a scheme (by default the active one), as
+    # get_closest_colors would. Alpha is kept. Colours from colormaps are left alone. Returns the figure.
+    _apply_color_map(fig, _FigureColorMap(_figure_scheme(scheme, scheme_type), variants, accents_only))
+    return fig
+
+
+@_instr.timed("recolor")
+def apply_to_figures(
+    figures,
+    scheme: str | ColorScheme = None,
+    scheme_type: str | SchemeType = "light",
+    variants: bool = True,
+    accents_only: bool = False,
+) -> list:
+    # apply_to_figure for many figures, looking up each colour only once across all of them
+    color_map = _FigureColorMap(_figure_scheme(scheme, scheme_type), variants, accents_only)
+    figures = list(figures)
+    for fig in figures:
+        _apply_color_map(fig, color_map)
+    return figures
 
 
 def _set_color(rgb, g=None, b=None):
@@ -245,6 +807,96 @@ def _reset_color():
     return ansi_escape + "0m"
 
 
+# escape sequences are cached per hex code, so each colour is only formatted once no matter how many times it is drawn
+_ansi_cache = {}
+
+
+def _ansi(color: Color, background: bool = False) -> str:
+    key = (color.hex, background)
+    code = _ansi_cache.get(key)
+    if code is None:
+        code = _set_background(color.rgb) if background else _set_color(color.rgb)
+        _ansi_cache[key] = code
+    return code
+
+
+@_instr.timed("render")
+def show_scheme_ansi(
+    scheme=None, name=None, show_codes=False, code_type="hex", file=None
+):
+    # Renders the same layout as show_scheme, but writes raw truecolor escape sequences instead of going through rich.
+    # The whole panel is built as a single string and written to the output in one go.
+    if name is None:
+        name = "Colour Scheme"
+    if scheme is None:
+        scheme = get_scheme()
+    if file is None:
+        file = sys.stdout
+    if code_type is None:
+        code_type = "hex"
+
+    rows = [("Foreground", None, scheme.foreground), ("Background", None, scheme.background), None]
+    for i, col in enumerate(scheme.accents):
+        rows.append((f"Accent {i+1}", _get_preset(scheme, col), col))
+    if len(scheme.surfaces) > 0:
+        rows.append(None)
+        for i, col in enumerate(scheme.surfaces):
+            rows.append((f"Surface {i+1}", None, col))
+    rows.append(None)
+    for i, col in enumerate(scheme.auto_surfaces):
+        rows.append((f"Auto Surface {i+1}", None, col))
+
+    cell = 5
+    if show_codes:
+        cell = max(
+            [cell]
+            + [
+                len(show_code_map[code_type](row[2][i]))
+                for row in rows
+                if row is not None
+                for i in range(6)
+            ]
+        )
+    label = max(len(row[0]) + 1 for row in rows if row is not None)
+    width = label + 3 + 6 * (cell + 1) + 2
+
+    bg = _ansi(scheme.background.base, background=True)
+    fg = _ansi(scheme.foreground.base)
+    accent = _ansi(scheme.accents[0].base)
+    reset = _reset_color()
+    block = "█" * cell
+
+    out = []
+
+    def line(content, visible):
+        out.append(bg + fg + "  " + content + " " * (width - 2 - visible) + reset + "\n")
+
+    line("", 0)
+    line(name.center(width - 4), width - 4)
+    line("", 0)
+    for row in rows:
+        if row is None:
+            line("", 0)
+            continue
+        row_name, alias, colour = row
+        squares = [_ansi(colour[i]) + block for i in range(6)]
+        squares = squares[0] + "  " + " ".join(squares[1:]) + fg
+        visible = label + 1 + 6 * cell + 6
+        line(f"{row_name + ':':>{label}} " + squares, visible)
+        alias_text = f"({alias.capitalize()})" if alias is not None else ""
+        line(
+            accent + f"{alias_text:>{label}} " + squares,
+            visible,
+        )
+        if show_codes:
+            codes = [f"{show_code_map[code_type](colour[i]):^{cell}}" for i in range(6)]
+            line(" " * (label + 1) + codes[0] + "  " + " ".join(codes[1:]), visible)
+    line("", 0)
+
+    file.write("".join(out))
+    file.flush()
+
+
 def _get_preset(scheme, color):
     for p in [
         "red",
@@ -278,10 +930,11 @@ show_code_map = {
     "rgb": lambda c: f"{c.r:.0f}, {c.g:.0f}, {c.b:.0f}",
     "hsl": lambda c: f"{c.h:.0f}, {c.s * 100:.0f}%, {c.l * 100:.0f}%",
     "hsv": lambda c: f"{c.h_hsv:.0f}, {c.s_hsv * 100:.0f}%, {c.v * 100:.0f}%",
-    "Lab": lambda c: f"{c.l_lab:.0f}, {c.a:.0f}, {c.b:.0f}",
+    "Lab": lambda c: f"{c.l_lab:.0f}, {c.a:.0f}, {c.b_lab:.0f}",
 }
 
 
+@_instr.timed("render")
 def show_scheme(
     scheme=None, name=None, save=False, filepath=None, show_codes=False, code_type="hex"
 ):
@@ -296,7 +949,7 @@ def show_scheme(
     if name is None:
         name = "Colour Scheme"
     if scheme is None:
-        scheme = Scheme
+        scheme = get_scheme()
     console = Console(record=save)
     width = console.size.width
     if width >= 112 and not (show_codes and code_type != "hex"):
@@ -381,9 +1034,11 @@ def show_scheme(
         if filepath is None:
             filepath = Path(f"{name}.svg".replace(" ", "_"))
 
-        console.save_svg(filepath)
+        with _instr.phase("io"):
+            console.save_svg(filepath)
 
 
+@_instr.timed("render")
 def show_scheme_wide(
     scheme=None, name=None, save=False, filepath=None, show_codes=False, code_type="hex"
 ):
@@ -398,7 +1053,7 @@ def show_scheme_wide(
     if name is None:
         name = "Colour Scheme"
     if scheme is None:
-        scheme = Scheme
+        scheme = get_scheme()
 
     def add_row(left, right=None):
         l_name = Text().append(f'{left["name"]}:\n', style=foreground_style)
@@ -575,24 +1230,108 @@ def show_scheme_wide(
         if filepath is None:
             filepath = Path(f"{name}.svg".replace(" ", "_"))
 
-        console.save_svg(filepath)
-
-
-from rich.console import Console
-from rich.prompt import IntPrompt
-import difflib
-import re
-
+        with _instr.phase("io"):
+            console.save_svg(filepath)
+
+
+class NameIndex:
+    # N-gram index over scheme names, for ranked fuzzy matching. Each name is split into words (on "_", "-", "." and
+    # spaces) so that a query matching a whole word or the start of a name (e.g. "catppuccin" for
+    # "catppuccin_mocha") ranks above names that merely share trigrams with it.
+
+    def __init__(self, names: List[str]):
+        self.names = list(names)
+        self._words = [set(self._split(n)) for n in self.names]
+        postings = {}
+        sizes = []
+        for i, name in enumerate(self.names):
+            grams = self._grams(name)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sizes = np.array(sizes, dtype=np.float64)
+
+    @staticmethod
+    def _normalise(name: str) -> str:
+        return name.lower().strip()
+
+    @classmethod
+    def _split(cls, name: str) -> List[str]:
+        return [w for w in re.split(r"[_\-. ]+", cls._normalise(name)) if w]
+
+    @classmethod
+    def _grams(cls, name: str) -> set:
+        # trigrams and bigrams, padded so that the start of the name counts for more; bigrams keep short names with
+        # a transposed letter (e.g. "nrod") close to the original
+        padded = f"  {cls._normalise(name)} "
+        return {padded[i : i + n] for n in (2, 3) for i in range(len(padded) - n + 1)}
+
+    def search(self, query: str, limit: int = 5, cutoff: float = 0.3) -> List[Tuple[str, float]]:
+        # Up to `limit` (name, score) pairs, best first. Scores are the Dice coefficient of the n-gram sets (0 to
+        # 1), plus 1 if the query is the start of the name or one of its words, or 2 for an exact match.
+        grams = self._grams(query)
+        found = [self._postings[g] for g in grams if g in self._postings]
+        if not found:
+            return []
+        shared = np.bincount(np.concatenate(found), minlength=len(self.names))
+        candidates = np.flatnonzero(shared)
+        scores = 2 * shared[candidates] / (len(grams) + self._sizes[candidates])
+        normalised = self._normalise(query)
+        words = self._split(query)
+        # a name starting with the query, or containing all of its words, shares all but a handful of its n-grams
+        # (those at the ends of words), so only those names need checking
+        for k in np.flatnonzero(shared[candidates] >= len(grams) - 2 * len(words) - 2):
+            i = candidates[k]
+            name = self._normalise(self.names[i])
+            if name == normalised:
+                scores[k] += 2
+            elif name.startswith(normalised) or (words and set(words) <= self._words[i]):
+                scores[k] += 1
+        keep = scores >= cutoff
+        candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [(self.names[candidates[i]], float(scores[i])) for i in order]
+
+
+_name_index = None
+_name_index_key = None
+
+
+def get_name_index() -> NameIndex:
+    # the index for the current catalog, rebuilt only if schemes have been added or removed (or catalog_changed has been
+    # called), which is checked without going through every name
+    global _name_index, _name_index_key
+    schemes = _schemes()
+    key = (id(schemes), len(schemes), _catalog_version)
+    if _name_index is None or _name_index_key != key:
+        _name_index = NameIndex(schemes)
+        _name_index_key = key
+    return _name_index
+
+
+def find_schemes(query: str, limit: int = 5, cutoff: float = 0.3) -> List[str]:
+    # the names of the schemes best matching `query`, best first (an exact match is always first)
+    return [name for name, _ in get_name_index().search(query, limit, cutoff)]
+
+
+def handle_unknown_scheme(scheme_name: str, interactive: bool = True) -> str:
+    # Suggest schemes similar to an unknown scheme name. Interactively, the user chooses one of the closest matches;
+    # otherwise, the best match is used without asking.
+    from rich.console import Console
 
-def handle_unknown_scheme(scheme_name: str) -> str:
-    console = Console()
-    similar = difflib.get_close_matches(scheme_name, get_available_schemes())
+    console = Console(stderr=not interactive)
+    similar = find_schemes(scheme_name)
     if len(similar) == 0:
         console.print(
             f"Unknown scheme: {scheme_name}. I could not find any similar schemes."
         )
         quit(1)
 
+    if not interactive:
+        console.print(f"Unknown scheme: {scheme_name}. Using {similar[0]}.")
+        return similar[0]
+
     similar.append("None of the above (quit)")
     index = multiple_choice_prompt(
         f"Unknown scheme: {scheme_name}. Did you mean:", similar
@@ -603,6 +1342,9 @@ def handle_unknown_scheme(scheme_name: str) -> str:
 
 
 def multiple_choice_prompt(prompt: str, choices: List[str], default: int = 1) -> str:
+    from rich.console import Console
+    from rich.prompt import IntPrompt
+
     console = Console()
     console.print(prompt)
     for i, choice in enumerate(choices):
@@ -614,13 +1356,14 @@ def multiple_choice_prompt(prompt: str, choices: List[str], default: int = 1) ->
     return response
 
 
-def show(scheme_name: str, variant: str, show_codes: bool = False, code_type: str = "hex") -> None:
+def show(scheme_name: str, variant: str, show_codes: bool = False, code_type: str = "hex", renderer: str = "rich") -> None:
+    show_function = show_scheme_ansi if renderer == "ansi" else show_scheme
     if variant in ["light", "both"]:
         set_scheme(scheme_name)
-        show_scheme(name=f"{scheme_name} (light)", show_codes = show_codes, code_type = code_type)
+        show_function(name=f"{scheme_name} (light)", show_codes = show_codes, code_type = code_type)
     if variant in ["dark", "both"]:
         set_scheme(scheme_name, "dark")
-        show_scheme(name=f"{scheme_name} (dark)", show_codes = show_codes, code_type = code_type)
+        show_function(name=f"{scheme_name} (dark)", show_codes = show_codes, code_type = code_type)
 
 
 def save(filename: str, scheme_name: str, variant: str) -> None:
@@ -653,15 +1396,55 @@ def write(filename: str, scheme_name: str, variant: str, filetype: str) -> None:
         light_filepath = filepath.with_name(filepath.stem + "_light" + filepath.suffix)
         dark_filepath = filepath.with_name(filepath.stem + "_dark" + filepath.suffix)
         set_scheme(scheme_name, "light")
-        with open(light_filepath, "w") as f:
-            f.write(getattr(get_scheme(), format_function_map[filetype])())
+        _write_text(light_filepath, getattr(get_scheme(), format_function_map[filetype])())
         set_scheme(scheme_name, "dark")
-        with open(dark_filepath, "w") as f:
-            f.write(getattr(get_scheme(), format_function_map[filetype])())
+        _write_text(dark_filepath, getattr(get_scheme(), format_function_map[filetype])())
         return
     set_scheme(scheme_name, variant)
-    with open(filepath, "w") as f:
-        f.write(getattr(get_scheme(), format_function_map[filetype])())
+    _write_text(filepath, getattr(get_scheme(), format_function_map[filetype])())
+
+
+def _import_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError(
+            "The 'Pillow' package is required for this function. Please install it using 'pip install Pillow'."
+        )
+    return Image
+
+
+def recolor(
+    input_filename: str,
+    output_filename: str,
+    scheme_name: str,
+    variant: str = "light",
+    variants: bool = True,
+    accents_only: bool = False,
+    jobs: int = None,
+) -> None:
+    # Recolours an image to the scheme with ColorScheme.recolor_array, keeping any transparency.
+    # The image is recoloured in place, so only one copy of it is held in memory at a time.
+    Image = _import_pillow()
+    with _instr.phase("io"):
+        image = Image.open(input_filename)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.mode or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    pixels = np.array(image)
+    del image
+    resolve_scheme(scheme_name, variant).recolor_array(
+        pixels, variants=variants, accents_only=accents_only, out=pixels, jobs=jobs
+    )
+    with _instr.phase("io"):
+        Image.fromarray(pixels).save(output_filename)
+
+
+def _write_text(filepath: str | Path, text: str) -> None:
+    with _instr.phase("io"):
+        with open(filepath, "w") as f:
+            f.write(text)
 
 
 def list_schemes(
@@ -670,6 +1453,7 @@ def list_schemes(
     available: List[str],
     print_schemes: bool,
     dark: bool = False,
+    renderer: str = "rich",
 ) -> List[str]:
     matches = [s for s in available if re.fullmatch(pattern, s)]
     if len(matches) == 0:
@@ -680,23 +1464,67 @@ def list_schemes(
             for scheme in matches:
                 print(scheme)
         return matches
-    if print_schemes:
-        from rich.table import Table
-        from rich.text import Text
-        from rich.style import Style
-
-        table = Table(show_lines=True)
-        table.add_column("Name", justify="center")
-        table.add_column("Sample", justify="center")
-        for scheme in matches:
-            set_scheme(scheme, "dark" if dark else "light")
-            table.add_row(
-                Text(
-                    scheme,
-                    style=f"bold {get_scheme().foreground} on {get_scheme().background}",
-                ),
-                get_scheme().to_rich_swatch(),
-            )
-        console = Console()
-        console.print(table)
+    if print_schemes and renderer == "ansi":
+        _list_schemes_ansi(matches, dark)
+    elif print_schemes:
+        _list_schemes_rich(matches, dark)
     return matches
+
+
+@_instr.timed("render")
+def _list_schemes_rich(matches: List[str], dark: bool = False) -> None:
+    from rich.console import Console
+    from rich.table import Table
+    from rich.text import Text
+    from rich.style import Style
+
+    table = Table(show_lines=True)
+    table.add_column("Name", justify="center")
+    table.add_column("Sample", justify="center")
+    for scheme in matches:
+        set_scheme(scheme, "dark" if dark else "light")
+        table.add_row(
+            Text(
+                scheme,
+                style=f"bold {get_scheme().foreground} on {get_scheme().background}",
+            ),
+            get_scheme().to_rich_swatch(),
+        )
+    console = Console()
+    console.print(table)
+
+
+@_instr.timed("render")
+def _list_schemes_ansi(matches: List[str], dark: bool = False, file=None) -> None:
+    if file is None:
+        file = sys.stdout
+    reset = _reset_color()
+    width = max(len(scheme) for scheme in matches) + 2
+    out = []
+    for scheme in matches:
+        set_scheme(scheme, "dark" if dark else "light")
+        current = get_scheme()
+        out.append(
+            "\x1b[1m"
+            + _ansi(current.foreground.base)
+            + _ansi(current.background.base, background=True)
+            + f" {scheme:<{width - 1}}"
+            + reset
+            + " "
+        )
+        for color in [
+            current.foreground,
+            current.background,
+            current.red,
+            current.orange,
+            current.yellow,
+            current.green,
+            current.cyan,
+            current.blue,
+            current.purple,
+            current.magenta,
+        ]:
+            out.append(_ansi(color.base) + "\u2588\u2588")
+        out.append(reset + "\n")
+    file.write("".join(out))
+    file.flush()
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+# Rewriting the hard-coded colours in SVG and CSS files to the closest colours of a scheme.
+#
+# Hex colour literals (#RGB, #RGBA, #RRGGBB and #RRGGBBAA) are found with a regular expression, skipping the ones that
+# aren't colours: url(#id) and href="#id" references, XML character references (&#123;), and ids in CSS selectors.
+# Each distinct colour is looked up once, through the scheme's ColorIndex, and replaced either by the hex code of the
+# closest colour (keeping any alpha) or, in CSS, by the --clr-* variable that ColorScheme.to_css defines for it.
+# Files are streamed through in pieces, so they are never held in memory whole, and many files can be rewritten at
+# once by a pool of processes.
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from . import instrumentation as _instr
+from .color_scheme import ColorFamily, ColorScheme, hex_to_rgb_array
+
+# A hex colour is not in a selector if the next of '{', '}' and ';' is not a '{' (looking no further than the end of
+# the current attribute or the next tag, so that a <style> block later in an SVG doesn't count). '>' doesn't end the
+# search, as it is also the child combinator of CSS selectors (#id > p).
+# The leading (?=[#uhx]) is only there for speed: it lets the regex engine skip straight past every other character.
+_TOKEN = re.compile(
+    r"""(?=[#uhx])(?:(?P<skip>url\([^)]*\)|(?:xlink:)?href\s*=\s*(?:"[^"]*"|'[^']*'))"""
+    r"""|(?<![&\w])#(?P<hex>[0-9a-fA-F]{8}|[0-9a-fA-F]{6}|[0-9a-fA-F]{3,4})(?![\w-])(?![^{};<"']*\{))"""
+)
+# where a stream may be cut into pieces without cutting a token in two, most preferred first
+_BOUNDARIES = ("}", ">", ";")
+_PIECE_SIZE = 1 << 16
+
+FORMATS = {".svg": "svg", ".css": "css", ".scss": "css", ".less": "css"}
+
+
+def _expand(hex: str) -> Tuple[str, str]:
+    # the 6-digit colour and the 2-digit alpha ('' if there is none) of a 3, 4, 6 or 8 digit hex code
+    if len(hex) <= 4:
+        hex = "".join(c * 2 for c in hex)
+    return hex[:6], hex[6:]
+
+
+class ColorSnapper:
+    # Finds the closest colour of a scheme to any number of colours, looking each one up only once.
+    # Labels are (family, variant) pairs as in ColorScheme.color_index, where variant is 0 for the base colour.
+    def __init__(self, scheme: ColorScheme, variants: bool = True, accents_only: bool = False):
+        self.scheme = scheme
+        self._index = scheme.color_index(variants=variants, accents_only=accents_only)
+        self._hexes = [family[i].hex.upper() for family, i in self._index.labels]
+        self._cache = {}
+        # the names given to each family by to_css
+        roles = [(scheme.foreground, "foreground"), (scheme.background, "background")]
+        roles += [(family, f"accent{i + 1}") for i, family in enumerate(scheme.accents)]
+        roles += [(family, f"surface{i + 1}") for i, family in enumerate(scheme.surfaces)]
+        self._roles = {id(family): name for family, name in roles}
+
+    def lookup(self, hexes: Iterable[str]) -> List[int]:
+        # The index (into labels) of the closest colour to each 6-digit hex code
+        hexes = [h.upper() for h in hexes]
+        missing = list({h for h in hexes if h not in self._cache})
+        if missing:
+            indices, _ = self._index.query(hex_to_rgb_array(missing), 1, space="rgb")
+            self._cache.update(zip(missing, indices[:, 0].tolist()))
+        return [self._cache[h] for h in hexes]
+
+    def nearest(self, lab: np.ndarray) -> List[int]:
+        # The index (into labels) of the closest colour to each row of an (N, 3) LAB array, without caching
+        indices, _ = self._index.query(lab, 1, space="lab")
+        return indices[:, 0].tolist()
+
+    @property
+    def labels(self) -> List[Tuple[ColorFamily, int]]:
+        return self._index.labels
+
+    def hex(self, index: int) -> str:
+        return self._hexes[index]
+
+    def role(self, index: int) -> str:
+        # e.g. "accent3" or "accent3-2" (the second variant), as used in the names of to_css variables
+        family, variant = self._index.labels[index]
+        name = self._roles[id(family)]
+        return name if variant == 0 else f"{name}-{variant}"
+
+    def css_var(self, index: int, alpha: str = "") -> str:
+        # the to_css variable for a colour, as an rgba() with the -rgb variable if it isn't opaque
+        if alpha == "" or alpha.lower() == "ff":
+            return f"var(--clr-{self.role(index)})"
+        return f"rgba(var(--clr-{self.role(index)}-rgb), {int(alpha, 16) / 255:.3g})"
+
+
+def rewrite_text(text: str, snapper: ColorSnapper, css_vars: bool = False) -> str:
+    # Replaces every hex colour in `text` with the closest colour of the scheme (or its CSS variable, if css_vars).
+    # Replacements keep the case of the original, and any alpha.
+    if "#" not in text:
+        return text
+    matches = [(m.start(), m.end(), m.group("hex")) for m in _TOKEN.finditer(text) if m.lastgroup == "hex"]
+    if not matches:
+        return text
+    colors = {hex: _expand(hex) for _, _, hex in matches}
+    indices = snapper.lookup(color for color, _ in colors.values())
+    replacements = {}
+    for (hex, (_, alpha)), index in zip(colors.items(), indices):
+        if css_vars:
+            replacements[hex] = snapper.css_var(index, alpha)
+        else:
+            new = snapper.hex(index) + alpha
+            replacements[hex] = "#" + (new.lower() if hex.islower() else new)
+    parts = []
+    position = 0
+    for start, end, hex in matches:
+        parts.append(text[position:start])
+        parts.append(replacements[hex])
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+@_instr.timed("rewrite")
+def rewrite_stream(
+    source: TextIO, destination: TextIO, snapper: ColorSnapper, css_vars: bool = False
+) -> None:
+    # Rewrites `source` into `destination` a piece at a time. Pieces end at a '}', '>' or ';' so that no colour (or
+    # anything that decides whether a colour is rewritten) is cut in two.
+    pending = ""
+    while True:
+        block = source.read(_PIECE_SIZE)
+        if not block:
+            break
+        pending += block
+        cut = -1
+        for boundary in _BOUNDARIES:
+            cut = pending.rfind(boundary)
+            if cut >= 0:
+                break
+        if cut >= 0:
+            destination.write(rewrite_text(pending[: cut + 1], snapper, css_vars))
+            pending = pending[cut + 1 :]
+    destination.write(rewrite_text(pending, snapper, css_vars))
+
+
+def file_format(filepath: str | Path) -> str:
+    return FORMATS.get(Path(filepath).suffix.lower(), "css")
+
+
+def rewrite_file(
+    filepath: str | Path,
+    output: str | Path,
+    snapper: ColorSnapper,
+    css_vars: bool = False,
+) -> None:
+    # Rewrites one file. CSS variables are only used for CSS files, as SVG attributes can't use them. `output` may be
+    # the same file; it is replaced once the rewritten file is complete.
+    css_vars = css_vars and file_format(filepath) == "css"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    temporary = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+    try:
+        with open(filepath, "r", encoding="utf-8", newline="") as source, open(
+            temporary, "w", encoding="utf-8", newline=""
+        ) as destination:
+            rewrite_stream(source, destination, snapper, css_vars)
+        os.replace(temporary, output)
+    finally:
+        if temporary.exists():
+            temporary.unlink()
+
+
+# one snapper per worker process, made by _init_worker
+_worker_snapper: Optional[ColorSnapper] = None
+_worker_css_vars = False
+
+
+def _init_worker(scheme_name: str, scheme_type: str, variants: bool, accents_only: bool, css_vars: bool):
+    global _worker_snapper, _worker_css_vars
+    from .pygmentation import resolve_scheme
+
+    _worker_snapper = ColorSnapper(resolve_scheme(scheme_name, scheme_type), variants, accents_only)
+    _worker_css_vars = css_vars
+
+
+def _rewrite_job(job: Tuple[str, str]) -> str:
+    rewrite_file(job[0], job[1], _worker_snapper, _worker_css_vars)
+    return job[1]
+
+
+def output_paths(filepaths: List[str], output_dir: str | Path = None) -> List[Path]:
+    # Where each file is written: over itself if output_dir is None, otherwise at the same place relative to
+    # output_dir as it was relative to the directory containing all of the files
+    filepaths = [Path(f) for f in filepaths]
+    if output_dir is None:
+        return filepaths
+    absolute = [f.resolve() for f in filepaths]
+    root = Path(os.path.commonpath([f.parent for f in absolute]))
+    return [Path(output_dir) / f.relative_to(root) for f in absolute]
+
+
+def rewrite_files(
+    filepaths: List[str],
+    scheme_name: str,
+    scheme_type: str = "light",
+    output_dir: str | Path = None,
+    css_vars: bool = False,
+    variants: bool = True,
+    accents_only: bool = False,
+    jobs: Optional[int] = None,
+) -> List[Path]:
+    # Rewrites many files, into output_dir or (if it is None) in place, using `jobs` processes (default: one per CPU)
+    outputs = output_paths(filepaths, output_dir)
+    jobs_list = [(str(f), str(o)) for f, o in zip(filepaths, outputs)]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(jobs_list))
+    if jobs <= 1:
+        _init_worker(scheme_name, scheme_type, variants, accents_only, css_vars)
+        return [Path(_rewrite_job(job)) for job in jobs_list]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        jobs,
+        initializer=_init_worker,
+        initargs=(scheme_name, scheme_type, variants, accents_only, css_vars),
+    ) as pool:
+        chunksize = max(1, len(jobs_list) // (jobs * 8))
+        return [Path(o) for o in pool.map(_rewrite_job, jobs_list, chunksize=chunksize)]
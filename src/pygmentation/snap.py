@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+# Snapping a stream of colours (e.g. the truecolor values in a log) to the closest colours of a scheme, one per line.
+#
+# The results for the most recently seen lines are kept in a bounded LRU cache, keyed by the line itself, so that a
+# line that has been seen before costs a dictionary lookup and nothing else. Lines are read in batches; each batch is
+# deduplicated first, and the lines not in the cache are parsed together and looked up in one vectorised CIEDE2000
+# search of the scheme's colours (the base colours and, by default, their variants).
+
+from collections import OrderedDict
+from typing import List, TextIO
+
+from .color_scheme import rgb_to_lab_array
+from .convert import parse, to_rgb
+from .rewrite import ColorSnapper
+
+OUTPUTS = ("both", "role", "hex")
+CACHE_SIZE = 1 << 16
+# roughly the number of bytes read at a time
+BATCH_BYTES = 1 << 20
+
+
+class StreamSnapper:
+    # Snaps lines of colours in `space` (see convert.parse) to a scheme, writing the role of the closest colour (named as
+    # in to_css, e.g. "accent3-2"), its hex code, or both. Remembers the results for the last `cache_size` distinct lines.
+    def __init__(self, snapper: ColorSnapper, space: str = "hex", output: str = "both", cache_size: int = CACHE_SIZE):
+        if output not in OUTPUTS:
+            raise ValueError(f"Output must be one of {', '.join(OUTPUTS)}, not '{output}'")
+        self.snapper = snapper
+        self.space = space
+        self.output = output
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _result(self, index: int) -> str:
+        if self.output == "role":
+            return self.snapper.role(index)
+        if self.output == "hex":
+            return self.snapper.hex(index)
+        return f"{self.snapper.role(index)} {self.snapper.hex(index)}"
+
+    def _snap_missing(self, keys: List[str], lines: List[str], first_line: int) -> List[str]:
+        # the results for lines that aren't cached, each ending in a newline. Blank lines give blank lines.
+        colors = [key.rstrip("\r\n") for key in keys]
+        present = [i for i, color in enumerate(colors) if color.strip()]
+        results = ["\n"] * len(keys)
+        if not present:
+            return results
+        try:
+            values = parse([colors[i] for i in present], self.space)
+        except ValueError:
+            # find the line number of the first bad line in the batch, as parse only knows about the uncached lines
+            for i, line in enumerate(lines):
+                if line.strip():
+                    try:
+                        parse([line.rstrip("\r\n")], self.space)
+                    except ValueError as error:
+                        raise ValueError(str(error).replace("Line 1", f"Line {first_line + i}", 1)) from None
+            raise
+        indices = self.snapper.nearest(rgb_to_lab_array(to_rgb(values, self.space)))
+        for i, index in zip(present, indices):
+            results[i] = self._result(index) + "\n"
+        return results
+
+    def snap_lines(self, lines: List[str], first_line: int = 1) -> List[str]:
+        # The result for each line (with a trailing newline, whether or not the line had one)
+        batch = dict.fromkeys(lines)
+        cache = self._cache
+        missing = []
+        for key in batch:
+            result = cache.get(key)
+            if result is None:
+                missing.append(key)
+            else:
+                cache.move_to_end(key)
+                batch[key] = result
+        if missing:
+            for key, result in zip(missing, self._snap_missing(missing, lines, first_line)):
+                batch[key] = cache[key] = result
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return list(map(batch.__getitem__, lines))
+
+    def snap_stream(self, source: TextIO, destination: TextIO, batch_bytes: int = BATCH_BYTES) -> int:
+        # Snaps every line of `source` to `destination`, a batch at a time. Returns the number of lines.
+        count = 0
+        while True:
+            lines = source.readlines(batch_bytes)
+            if not lines:
+                return count
+            destination.write("".join(self.snap_lines(lines, count + 1)))
+            count += len(lines)
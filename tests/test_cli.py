@@ -0,0 +1,35 @@
+# The commands that read stdin report bad input with the line it was on, and exit with status 1, rather than with a
+# traceback.
+
+import subprocess
+import sys
+
+import pytest
+
+
+def _run(args: list, stdin: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-m", "pygmentation", *args], input=stdin, capture_output=True, text=True
+    )
+
+
+@pytest.mark.parametrize(
+    "args, stdin, message",
+    [
+        (["convert", "--from", "hex", "--to", "rgb"], "5E81AC\nzz\n", "Line 2: could not read 'zz' as a colour"),
+        (["convert", "--from", "rgb", "--to", "hex", "--ndjson"], "[1, 2, 3]\n5\n", "Line 2: could not read '5'"),
+        (["snap", "nord", "dark"], "5E81AC\n\nzz\n", "Line 3: could not read 'zz' as a colour"),
+        (["snap", "nord", "--from", "ansi"], "plain text\n", "Line 1: could not read 'plain text'"),
+    ],
+)
+def test_bad_input_is_reported_without_a_traceback(args, stdin, message):
+    result = _run(args, stdin)
+    assert result.returncode == 1
+    assert message in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_good_input():
+    result = _run(["convert", "--from", "hex", "--to", "rgb"], "5E81AC\n\n#BF616A\n")
+    assert result.returncode == 0
+    assert result.stdout == "94, 129, 172\n\n191, 97, 106\n"
@@ -0,0 +1,73 @@
+# Converting colours between spaces, as `pygmentation convert` does: round trips, NDJSON, ANSI escape sequences, and
+# errors that name the line they came from.
+
+import io
+
+import numpy as np
+import pytest
+
+from pygmentation.convert import SPACES, convert_array, convert_lines, convert_stream
+
+
+def test_hex_to_rgb_and_back():
+    lines = ["5E81AC", "#bf616a", "fff", "#A3BE8C80"]
+    rgb = convert_lines(lines, "hex", "rgb")
+    assert rgb == ["94, 129, 172", "191, 97, 106", "255, 255, 255", "163, 190, 140"]
+    assert convert_lines(rgb, "rgb", "hex") == ["5E81AC", "BF616A", "FFFFFF", "A3BE8C"]
+
+
+@pytest.mark.parametrize("space", SPACES)
+def test_arrays_round_trip_through_every_space(space):
+    rgb = np.random.default_rng(0).integers(0, 256, (500, 3), dtype=np.uint8)
+    there = convert_array(rgb, "hex", space)
+    back = convert_array(there, space, "hex")
+    np.testing.assert_array_equal(back, rgb)
+
+
+def test_ndjson_round_trip():
+    lines = ['"#5E81AC"', "", '"BF616A"']
+    rgb = convert_lines(lines, "hex", "rgb", ndjson=True)
+    assert rgb == ["[94, 129, 172]", "", "[191, 97, 106]"]
+    assert convert_lines(rgb, "rgb", "hex", ndjson=True) == ['"5E81AC"', "", '"BF616A"']
+    # text in a JSON string is read as a line of text would be
+    assert convert_lines(['"rgb(94, 129, 172)"'], "rgb", "hex", ndjson=True) == ['"5E81AC"']
+
+
+@pytest.mark.parametrize("line", ["5", '{"r": 1}', '"5E81AC", "BF616A"', "[1, 2]", "[true, 1, 2]", "NaN", "null", "[1, 2"])
+def test_ndjson_values_that_are_not_colours_are_errors(line):
+    with pytest.raises(ValueError, match="^Line 2: "):
+        convert_lines(["[94, 129, 172]", line, "[1, 2, 3]"], "rgb", "hex", ndjson=True)
+
+
+def test_ansi_escape_sequences():
+    lines = ["\x1b[38;2;94;129;172mtext\x1b[0m", "", "log \x1b[1;48;2;191;97;106m x \x1b[38;2;0;0;0m", "38;2;255;255;255"]
+    assert convert_lines(lines, "ansi", "hex") == ["5E81AC", "", "BF616A", "FFFFFF"]
+    with pytest.raises(ValueError, match="^Line 2: "):
+        convert_lines(["38;2;1;2;3", "138;2;1;2;3"], "ansi", "hex")
+
+
+@pytest.mark.parametrize(
+    "source, lines",
+    [
+        ("hex", ["5E81AC", "BF616A", "zz"]),
+        ("rgb", ["1 2 3", "4 5 6", "7 8"]),
+        ("rgb", ["1 2 3", "4 5 6", "7 8 300"]),
+        ("hsl", ["10 20% 30%", "10, 20, 30", "10 20% 130%"]),
+    ],
+)
+def test_errors_give_the_line(source, lines):
+    with pytest.raises(ValueError, match="^Line 3: "):
+        convert_lines(lines, source, "hex")
+
+
+def test_stream_errors_count_lines_across_batches():
+    source = io.StringIO("".join(f"{i:06X}\n" for i in range(10)) + "nope\n")
+    with pytest.raises(ValueError, match="^Line 11: "):
+        convert_stream(source, io.StringIO(), "hex", "rgb", batch_size=4)
+
+
+def test_stream_matches_lines():
+    lines = [f"{i * 2654435761 % (1 << 24):06X}" for i in range(1000)]
+    destination = io.StringIO()
+    assert convert_stream(io.StringIO("\n".join(lines) + "\n"), destination, "hex", "hsl", batch_size=64) == 1000
+    assert destination.getvalue().splitlines() == convert_lines(lines, "hex", "hsl")
@@ -0,0 +1,38 @@
+# Near-duplicate detection must find pairs of schemes whose colours are within the tolerance by CIEDE2000, including
+# saturated colours, which CIEDE2000 treats as much closer than their straight-line distance in LAB.
+
+import numpy as np
+
+from pygmentation.catalog import _candidate_pairs, _within, hausdorff_distance
+from pygmentation.color_scheme import delta_e_array, hex_to_rgb_array, rgb_to_lab_array
+
+
+def _lab(hexes):
+    return rgb_to_lab_array(hex_to_rgb_array(hexes) / 255)
+
+
+def test_saturated_near_duplicates_are_candidates():
+    original = _lab(["0000FF"])
+    shifted = _lab(["2115F1"])
+    assert delta_e_array(original, shifted)[0] < 2.0
+    assert np.abs(original - shifted).max() > 2 * 2.0
+    # two single-colour schemes, and one that is clearly different
+    colors = np.stack((original, shifted, _lab(["00FF00"])))
+    pairs = _candidate_pairs(colors, 2.0)
+    assert [0, 1] in pairs.tolist()
+    assert _within(colors[[0]], colors[[1]], 2.0).all()
+
+
+def test_candidates_include_every_pair_within_the_tolerance():
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (40, 6, 3), dtype=np.uint8)
+    # push half of the colours to the edge of the gamut, where chroma is highest
+    rgb[:, ::2, rng.integers(0, 3)] = 255
+    shifted = np.clip(rgb.astype(int) + rng.integers(-3, 4, rgb.shape), 0, 255).astype(np.uint8)
+    colors = rgb_to_lab_array(np.concatenate((rgb, shifted)) / 255)
+    tolerance = 3.0
+    n = len(colors)
+    i, j = np.triu_indices(n, 1)
+    expected = {(a, b) for a, b, d in zip(i, j, hausdorff_distance(colors[i], colors[j])) if d <= tolerance}
+    assert expected
+    assert expected <= set(map(tuple, _candidate_pairs(colors, tolerance).tolist()))
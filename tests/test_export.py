@@ -0,0 +1,58 @@
+# Exporting resolved schemes: JSON round trips without recomputing anything, and the catalog arrays (shared or exported
+# to .npz) give the same schemes as resolving them.
+
+import io
+
+import numpy as np
+import pytest
+
+from pygmentation.catalog import export_arrays, export_catalog, load_catalog, open_export
+from pygmentation.color_scheme import ColorScheme
+from pygmentation.pygmentation import dump_schemes, load_schemes, resolve_scheme
+
+SCHEMES = ["nord", "dracula", "gruvbox", "rose_pine", "twilight", "ayu"]
+
+
+@pytest.mark.parametrize("name", SCHEMES)
+@pytest.mark.parametrize("scheme_type", ["light", "dark"])
+def test_json_round_trip(name, scheme_type):
+    scheme = resolve_scheme(name, scheme_type)
+    loaded = ColorScheme.from_json(scheme.to_json(name))
+    assert loaded.to_json(name) == scheme.to_json(name)
+    assert loaded.to_css() == scheme.to_css()
+    assert loaded.freeze() == ColorScheme.from_json(scheme.to_json()).freeze()
+
+
+@pytest.mark.parametrize("format", ["ndjson", "json"])
+def test_dump_and_load(format):
+    file = io.StringIO()
+    assert dump_schemes(file, SCHEMES, ["dark"], format) == len(SCHEMES)
+    file.seek(0)
+    loaded = list(load_schemes(file))
+    assert [name for name, _ in loaded] == SCHEMES
+    for name, scheme in loaded:
+        assert scheme.to_json(name) == resolve_scheme(name, "dark").to_json(name)
+
+
+def test_catalog_schemes_match_resolved_schemes():
+    catalog = load_catalog()
+    for name in SCHEMES:
+        for scheme_type in ("light", "dark"):
+            resolved = resolve_scheme(name, scheme_type)
+            rebuilt = catalog.scheme(name, scheme_type)
+            assert rebuilt.frozen
+            assert rebuilt.to_json(name) == resolved.to_json(name)
+            assert rebuilt.to_css() == resolved.to_css()
+            assert rebuilt.to_latex() == resolved.to_latex()
+
+
+def test_npz_export_matches_the_catalog(tmp_path):
+    catalog = load_catalog()
+    filepath = export_catalog(tmp_path / "catalog.npz", SCHEMES, ["light", "dark"])
+    expected = export_arrays(catalog, SCHEMES)
+    for mmap_mode in ("r", None):
+        arrays = open_export(filepath, mmap_mode)
+        assert arrays.keys() == expected.keys()
+        for key, value in expected.items():
+            np.testing.assert_array_equal(arrays[key], value)
+    assert sorted(expected["names"].tolist()) == sorted(SCHEMES)
@@ -0,0 +1,58 @@
+# Rewriting the hex colours of SVG and CSS files: only colours are rewritten, keeping their case and alpha, and
+# streaming in pieces gives the same result as rewriting the whole text.
+
+import io
+
+import pytest
+
+from pygmentation import rewrite
+from pygmentation.pygmentation import resolve_scheme
+from pygmentation.rewrite import ColorSnapper, rewrite_stream, rewrite_text
+
+
+@pytest.fixture(scope="module")
+def snapper():
+    return ColorSnapper(resolve_scheme("nord", "dark"))
+
+
+def _snap(snapper, hex: str) -> str:
+    return snapper.hex(snapper.lookup([hex])[0])
+
+
+def test_colours_are_rewritten_keeping_case_and_alpha(snapper):
+    red = _snap(snapper, "FF0000")
+    text = ".a { color: #FF0000; background: #ff000080; border-color: #F00; }"
+    assert rewrite_text(text, snapper) == (
+        f".a {{ color: #{red}; background: #{red.lower()}80; border-color: #{red}; }}"
+    )
+
+
+def test_selectors_references_and_entities_are_skipped(snapper):
+    css = "#fff, .a > #abc:hover { fill: url(#abc); color: #abc; }\n#bad, #cafe {}\n"
+    rewritten = rewrite_text(css, snapper)
+    assert rewritten.startswith("#fff, .a > #abc:hover { fill: url(#abc); color: #")
+    assert rewritten.endswith("; }\n#bad, #cafe {}\n")
+    assert f"color: #{_snap(snapper, 'AABBCC').lower()};" in rewritten
+
+    svg = '<a href="#ABCDEF"><use xlink:href="#123456"/><text fill="#123456">&#123; &#x41;</text></a>'
+    rewritten = rewrite_text(svg, snapper)
+    assert 'href="#ABCDEF"' in rewritten and 'xlink:href="#123456"' in rewritten
+    assert "&#123; &#x41;" in rewritten
+    assert f'fill="#{_snap(snapper, "123456")}"' in rewritten
+
+
+def test_css_variables(snapper):
+    index = snapper.lookup(["5E81AC"])[0]
+    rewritten = rewrite_text("a { color: #5E81AC; background: #5E81AC80 }", snapper, css_vars=True)
+    assert rewritten == f"a {{ color: var(--clr-{snapper.role(index)}); background: {snapper.css_var(index, '80')} }}"
+
+
+def test_streaming_matches_rewriting_the_whole_text(snapper, monkeypatch):
+    text = "".join(
+        f'.r{i} {{ color: #{i * 40503 % (1 << 24):06x}; fill: url(#g{i}); }}\n<rect id="x{i}" fill="#{i:03X}"/>\n'
+        for i in range(500)
+    )
+    monkeypatch.setattr(rewrite, "_PIECE_SIZE", 97)
+    destination = io.StringIO()
+    rewrite_stream(io.StringIO(text), destination, snapper)
+    assert destination.getvalue() == rewrite_text(text, snapper)
@@ -0,0 +1,44 @@
+# A shared catalog must stop being used once it has been unlinked, both by the publishing process and by any process
+# started afterwards (which would otherwise try to attach to shared memory that no longer exists).
+
+import multiprocessing
+import os
+
+from pygmentation import catalog
+from pygmentation.pygmentation import resolve_scheme
+
+
+def _resolve(name: str, scheme_type: str):
+    scheme = resolve_scheme(name, scheme_type)
+    return scheme.frozen, scheme.background.base.hex
+
+
+def test_workers_started_after_unlink_resolve_schemes_themselves():
+    context = multiprocessing.get_context("spawn")
+    with catalog.publish_catalog() as shared:
+        assert os.environ[catalog.SHARED_CATALOG_VARIABLE] == shared.name
+        assert resolve_scheme("nord", "dark").frozen
+        with context.Pool(1) as pool:
+            assert pool.apply(_resolve, ("nord", "dark"))[0]
+
+    assert catalog.SHARED_CATALOG_VARIABLE not in os.environ
+    assert catalog.shared_catalog() is None
+    expected = resolve_scheme("nord", "dark")
+    assert not expected.frozen
+    with context.Pool(1) as pool:
+        frozen, background = pool.apply(_resolve, ("nord", "dark"))
+    assert not frozen
+    assert background == expected.background.base.hex
+
+
+def test_unlinking_an_old_catalog_keeps_a_newer_one():
+    old = catalog.publish_catalog()
+    new = catalog.publish_catalog()
+    try:
+        old.unlink()
+        assert os.environ[catalog.SHARED_CATALOG_VARIABLE] == new.name
+        assert catalog.shared_catalog() is new.catalog
+    finally:
+        new.unlink()
+    assert catalog.SHARED_CATALOG_VARIABLE not in os.environ
+    assert catalog.shared_catalog() is None
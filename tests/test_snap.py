@@ -0,0 +1,61 @@
+# Snapping a stream of colours to a scheme: the LRU cache must never change the results, and errors give the line.
+
+import io
+
+import numpy as np
+import pytest
+
+from pygmentation.pygmentation import resolve_scheme
+from pygmentation.rewrite import ColorSnapper
+from pygmentation.snap import StreamSnapper
+
+
+@pytest.fixture(scope="module")
+def snapper():
+    return ColorSnapper(resolve_scheme("nord", "dark"))
+
+
+def _lines(n: int, distinct: int, seed: int = 0) -> list:
+    colors = np.random.default_rng(seed).integers(0, 1 << 24, distinct)
+    return [f"#{colors[i]:06X}\n" for i in np.random.default_rng(seed + 1).integers(0, distinct, n)]
+
+
+def test_cached_results_match_uncached(snapper):
+    lines = _lines(3000, 200) + ["\n"] + _lines(1000, 200)
+    expected = [StreamSnapper(snapper, cache_size=0).snap_lines([line])[0] for line in lines]
+    for cache_size in (0, 1, 16, 1 << 16):
+        streamer = StreamSnapper(snapper, cache_size=cache_size)
+        results = []
+        for start in range(0, len(lines), 256):
+            results += streamer.snap_lines(lines[start : start + 256])
+        assert results == expected
+        assert len(streamer._cache) <= cache_size
+
+
+def test_stream_matches_lines(snapper):
+    lines = _lines(5000, 300)
+    destination = io.StringIO()
+    streamer = StreamSnapper(snapper, output="hex", cache_size=64)
+    assert streamer.snap_stream(io.StringIO("".join(lines)), destination, batch_bytes=1000) == 5000
+    assert destination.getvalue().splitlines(True) == StreamSnapper(snapper, output="hex").snap_lines(lines)
+
+
+def test_outputs(snapper):
+    both, role, hex = (StreamSnapper(snapper, output=o).snap_lines(["#5E81AC\n", "\n"]) for o in ("both", "role", "hex"))
+    assert both[0] == f"{role[0].strip()} {hex[0].strip()}\n"
+    assert both[1] == role[1] == hex[1] == "\n"
+
+
+def test_ansi_input(snapper):
+    hexes = StreamSnapper(snapper, output="hex").snap_lines(["#5E81AC\n", "#BF616A\n"])
+    ansi = StreamSnapper(snapper, space="ansi", output="hex").snap_lines(
+        ["\x1b[38;2;94;129;172mok\x1b[0m\n", "\x1b[48;2;191;97;106m\n"]
+    )
+    assert ansi == hexes
+
+
+def test_errors_give_the_line_of_the_stream(snapper):
+    lines = ["#5E81AC\n"] * 300 + ["#BF616A\n", "nope\n"]
+    streamer = StreamSnapper(snapper)
+    with pytest.raises(ValueError, match="^Line 302: "):
+        streamer.snap_stream(io.StringIO("".join(lines)), io.StringIO(), batch_bytes=100)